@@ -0,0 +1,225 @@
+#read-only query API over the dashboard's aggregates and rows, for the BI and planning tools and the export buttons
+#
+#    GET /api/v1/items?group=chicken_packages&start_date=2022-03-01&end_date=2022-05-31&hour=<hour>&aggregator=Total
+#    GET /api/v1/hours?group=chicken_packages&month=March&month=April&item=<item>&aggregator=Average
+#    GET /api/v1/comparison?group=others&window=<json>&window=<json>&aggregator=Total
+#    GET /api/v1/rows?group=others&start_date=2022-01-01&format=parquet
+#
+#items is the group's products at one hour (section 1), hours is one product at every hour
+#(section 2); month, week and weekday may repeat, a missing hour or item is the first one the filters
+#leave, like the dropdowns. comparison is the comparison chart, each window a JSON object with the
+#name, product, start_date, end_date, month, week and weekday of a comparison column. The answers are
+#the frames the dashboard's charts read, computed by the same engines and kept in the same aggregate
+#store under the same keys, so a query the dashboard already answered costs a lookup. rows are the
+#filtered rows of the melted frame with their date labels, streamed: they are read from the engine
+#config.EXPORT_CHUNK_ROWS at a time and each chunk is encoded and sent before the next is taken, so a
+#worker never holds a whole export. format=json (the default, not for rows), csv, parquet or arrow
+#(an Arrow IPC stream, which an Accept header of application/vnd.apache.arrow.stream also asks for);
+#csv and parquet come as attachments. The ETag is the digest of the dataset version, the normalised
+#query and the format: a client sending it back in If-None-Match gets a 304 without any work until
+#the data changes
+import json
+
+import flask
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cube import AGGREGATORS
+from filters import FilterState
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': ARROW_MIMETYPE,
+}
+#the formats saved as files rather than shown
+ATTACHMENTS = ('csv', 'parquet')
+
+
+def parse_state(args):
+    """The FilterState of a request's group, date range, month, week and weekday arguments."""
+    return FilterState.from_inputs(args.get('group'), args.get('start_date'), args.get('end_date'),
+                                   args.getlist('month'), args.getlist('week'), args.getlist('weekday'))
+
+
+def parse_aggregator(args):
+    aggregator = args.get('aggregator', 'Average')
+    if aggregator not in AGGREGATORS:
+        raise ValueError(f'aggregator must be one of {", ".join(AGGREGATORS)}')
+    return aggregator
+
+
+def parse_query(args, label):
+    """Return the normalised query of a request's arguments: its FilterState, the hour or item and the aggregator."""
+    return parse_state(args), args.get(label) or None, parse_aggregator(args)
+
+
+def parse_windows(group, args):
+    """Return the comparison windows of a request's window arguments as (name, FilterState, product) tuples."""
+    windows = []
+    for value in args.getlist('window'):
+        try:
+            spec = json.loads(value)
+            windows.append((str(spec['name']), FilterState.from_inputs(
+                group, spec.get('start_date'), spec.get('end_date'),
+                spec.get('month'), spec.get('week'), spec.get('weekday')), spec.get('product') or None))
+        except (TypeError, KeyError, json.JSONDecodeError):
+            raise ValueError('every window must be a JSON object with a name')
+    if not windows:
+        raise ValueError('give at least one window')
+    return tuple(windows)
+
+
+def response_format(request, allowed=tuple(FORMATS)):
+    """The format asked for by the format argument, or else by the Accept header."""
+    name = request.args.get('format')
+    if name is None:
+        best = request.accept_mimetypes.best_match([FORMATS[name] for name in allowed])
+        return next((name for name in allowed if FORMATS[name] == best), allowed[0])
+    if name not in allowed:
+        raise ValueError(f'format must be one of {", ".join(allowed)}')
+    return name
+
+
+class _Drain:
+    """A write-only file whose bytes are taken out as they are written, for the streaming writers."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def encode(frames, format_name):
+    """Yield the bytes of frames, written one after the other as a single CSV, Parquet or Arrow IPC file."""
+    if format_name == 'csv':
+        header = True
+        for frame in frames:
+            yield frame.to_csv(index=False, header=header).encode()
+            header = False
+        return
+    drain = _Drain()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            schema = table.schema
+            writer = pq.ParquetWriter(drain, schema) if format_name == 'parquet' else pa.ipc.new_stream(drain, schema)
+        elif table.schema != schema:
+            #an empty chunk or a column of missing values is typed differently
+            table = table.cast(schema)
+        writer.write_table(table)
+        yield drain.take()
+    if writer is not None:
+        writer.close()
+        yield drain.take()
+
+
+def frames_response(frames, format_name, filename):
+    """A streamed response of frames in one of the file formats."""
+    response = flask.Response(encode(frames, format_name), mimetype=FORMATS[format_name])
+    if format_name in ATTACHMENTS:
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}.{format_name}'
+    return response
+
+
+def install(server, store, sections, compare, rows):
+    """Serve the aggregates and rows of the dashboard under /api/v1.
+
+    sections maps each aggregate to (store name, label argument, compute), compute taking the inputs
+    of the section's producer callback and store being the one it produces into. compare(group,
+    windows, aggregator) is the comparison chart's frame and rows(state, hour, item) yields the
+    filtered rows in chunks.
+    """
+    def answer(name, query, compute, format_name, filename, description):
+        #the stored frame, or the one compute() returns, in the format asked for
+        key = store.digest(name, query)
+        etag = f'{key}-{format_name}'
+        if etag in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            found, frame = store.get(key)
+            if not found:
+                try:
+                    frame = compute()
+                except IndexError:
+                    return flask.jsonify({'error': 'no rows pass the filters'}), 404
+                store.set(key, frame)
+            if format_name == 'json':
+                response = flask.jsonify({'version': store.version, 'query': description,
+                                          'rows': frame.to_dict(orient='records')})
+            else:
+                response = frames_response([frame], format_name, filename)
+        return conditional(response, etag)
+
+    def conditional(response, etag):
+        response.set_etag(etag)
+        #cacheable, but checked with the server every time since an ingested batch changes the answer
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def describe(state, **values):
+        return {'group': state.group, 'start_date': state.start_date, 'end_date': state.end_date,
+                'month': state.months, 'week': state.weeks, 'weekday': state.weekdays, **values}
+
+    @server.route('/api/v1/<section>')
+    def query_aggregate(section):
+        if section not in sections:
+            return flask.jsonify({'error': f'no such aggregate, one of {", ".join([*sections, "comparison", "rows"])}'}), 404
+        name, label, compute = sections[section]
+        try:
+            state, value, aggregator = parse_query(flask.request.args, label)
+            format_name = response_format(flask.request)
+        except ValueError as error:
+            return flask.jsonify({'error': str(error)}), 400
+        return answer(name, (state, value, aggregator),
+                      lambda: compute(state.group, state.start_date, state.end_date, state.months, state.weeks,
+                                      state.weekdays, value, aggregator),
+                      format_name, section, describe(state, **{label: value, 'aggregator': aggregator}))
+
+    @server.route('/api/v1/comparison')
+    def query_comparison():
+        args = flask.request.args
+        try:
+            group = parse_state(args).group
+            windows = parse_windows(group, args)
+            aggregator = parse_aggregator(args)
+            format_name = response_format(flask.request)
+        except ValueError as error:
+            return flask.jsonify({'error': str(error)}), 400
+        description = {'group': group, 'aggregator': aggregator,
+                       'windows': [describe(state, name=name, product=product) for name, state, product in windows]}
+        return answer('comparison', (windows, aggregator), lambda: compare(group, windows, aggregator),
+                      format_name, 'comparison', description)
+
+    @server.route('/api/v1/rows')
+    def query_rows():
+        args = flask.request.args
+        try:
+            state = parse_state(args)
+            hour, item = args.getlist('hour'), args.getlist('item')
+            format_name = response_format(flask.request, ('csv', 'parquet', 'arrow'))
+        except ValueError as error:
+            return flask.jsonify({'error': str(error)}), 400
+        etag = f'{store.digest("rows", (state, tuple(sorted(hour)), tuple(sorted(item))))}-{format_name}'
+        if etag in flask.request.if_none_match:
+            return conditional(flask.Response(status=304), etag)
+        return conditional(frames_response(rows(state, hour, item), format_name, 'rows'), etag)
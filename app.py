@@ -1,145 +1,142 @@
 #Import the required libraries
+import logging
+import threading
+import time
+
 import dash
 from dash import html, dcc
 import dash_bootstrap_components as dbc
-from dash.dependencies import Output, Input, State
-import numpy as np
+from dash.dependencies import ClientsideFunction, Output, Input, State
+import flask
 import pandas as pd
-import plotly.express as px
-
-#read the data
-df1 = pd.read_excel('QSR_dataset.xlsx',index_col=0)
-
-#Create new dataframe from the original dataframe with only numerical features to be used for correlation plot
-df_ = df1.select_dtypes(include='number')
-
-#create the Average spent per hour by by dividing the sales column by the ticket column
-df_['AVS Per Hour'] = df_['Sales']/df_['Ticket']
-
-#transform the dataframe using pd.melt()function
-df2 = df1.melt(id_vars=['Date', 'Time', 'Ticket', 'Sales'],
-             var_name='Items', 
-             value_name='Quantity')
-
-#create more features from the current features like days, months weeks and so on
-df2 = df2[['Date','Time','Items','Quantity','Ticket','Sales']]
-df2['Date'] = pd.to_datetime(df2['Date'],dayfirst=True)
-df2['AVS Per Hour'] = df2['Sales'] / df2['Ticket']
-df2['Month'] = df2['Date'].dt.month_name()
-df2['Week Days'] = df2['Date'].dt.day_name()
-df2['Month Weeks'] = (df2['Date'].dt.day-1)//7+1
-df2['Month Weeks'] = df2['Month Weeks'].apply(lambda x: x if x <= 4 else 1)
-df2=df2[['Date','Month','Month Weeks', 'Week Days','Time', 'Items', 'Quantity', 'Ticket', 'Sales', 'AVS Per Hour']]
-df2['Month Weeks'] = np.where(df2['Month Weeks'] == 4, 'Fourth Week',
-                             np.where(df2['Month Weeks'] == 3, 'Third Week',
-                                      np.where(df2['Month Weeks'] == 2, 'Second Week', 'First Week')))
-
-#categorize the features into groups with which to filter the dataset with to make it readable
-cereal_packages = [
-            'Backup Max', 
-            'Backup',  
-            'Mid Meal', 
-            'Backup Max Chripsy PC', 
-            'Monster Meal',
-            'Backup Chrispy Meal', 
-            'Backup Max Cubes', 
-            'Mid Chrispy Meal',  
-            'R & B', 
-            'Fried Rice', 
-            '8PC Meal', 
-            '10PC Meal', 
-            'Backup Cubes Meal',
-            'Pasta', 
-            'Crew Meal', 
-            'Mid',  
-            'Mid Chrispy', 
-            '1/4 Rot Lite Meal', 
-            '4PC Love Meal', 
-            'Lovers Cube Meal', 
-            'Face-up Meal', 
-            'Plain Rice', 
-            'Face-up',  
-            'Jollof Rice', 
-            'Love Meal',
-            'PC Mixed Rice and Drink', 
-            '1/4 Rot Mixed Rice and Drink', 
-            '1/4 Rot Mixed Rice', 
-            'PC Mixed Rice', 
-            'Max Jollof Rice', 
-            'Max Fried Rice', 
-            '1/4 Rot Meal',
-            '1/2 Rot Meal'
-            ]
-
-chicken_packages = [ 
-            '8PC Chripsy', 
-            '1PC',  
-            '1/4 Rot', 
-            '2PC Chrispy',
-            'Rot', 
-            '4PC Chrispy', 
-            '1PC Chrispy', 
-            '8PC Chrispy', 
-            '4PC', 
-            '2PC',  
-            '1PC Rot',  
-            '4PC Rot',  
-            '8PC Rot', 
-            '2PC Rot', 
-            '1/2 Rot',            
-            ]
-
-call_to_order = [ 
-            'Cubes', 
-            '270g Chips', 
-            'Burger', 
-            'SW', 
-            '1/4 Rot Chips', 
-            'Sharwama',  
-            'Max SW Meal',  
-            'Burger Meal',  
-            'Shawama Meal', 
-            'Max SW', 
-            'Express Meal', 
-            'Express Chripsy Meal', 
-            '180g Chips', 
-            'SW Meal', 
-            'Express', 
-            '1/2 Rot Chips', 
-            'Express Chripsy',  
-            'Max Spicy SW',
-            'Spicy SW', 
-            'Max Spicy SW Meal ', 
-            'Spicy SW Meal', 
-            'Mid Chips Meal', 
-            'Mid Chips', 
-            'Mid Chrispy Chips Meal', 
-            '200g Cubes'
-            ]
-
-others = [
-            '50cl Drink', 
-            'Veg Salad',
-            'Chicken Pie', 
-            'Meat Pie', 
-            'Moin Moin', 
-            'Chicken Salad Meal',
-            'Salad',  
-            'Chicken Salad', 
-            'Monster',  
-            '75cl Water', 
-            'R & B Sauce', 
-            'Cheese', 
-            'Coffee', 
-            'Plastic Pack', 
-            '60cl Zero',  
-            '200g Salad', 
-            '200g Veg Salad',  
-            'Ketchup', 
-            '350ml Cup',
-            "250ml Cup", 
-            'Cone',
-            ]
+
+import api
+import background
+from callback_cache import CallbackCache
+import config
+from correlation import INDEX, METHODS, CorrelationExplorer
+from comparison import COLORS, Window, compare, saved_windows, window_filters, window_spec
+from cube import AggregateCube, aggregator_statistic
+from dataset import append_frames, batches_after, dataset_version, labelled_rows, load_dataset, manifest_stat, read_batches, read_manifest
+import figures
+from filters import FilterEngine, FilterState, date_mask
+from forecast import DemandForecast
+import memory
+import metrics
+import profiler
+from partitions import PartitionEngine, sync_partitions
+from wide import WideEngine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+#results of the heavy callbacks, keyed by their normalised inputs and the dataset version
+callback_cache = CallbackCache()
+#the filtered aggregate of each section, computed once per interaction and read by all of its charts
+aggregate_store = CallbackCache(maxsize=config.AGGREGATE_STORE_SIZE, directory=config.AGGREGATE_STORE_DIR)
+
+def load_data():
+    global df1, df_, df2, engine, aggregates, manifest_seen
+    #read the data, from the columnar cache when the workbook has not changed
+    manifest_seen = manifest_stat()
+    if config.STORAGE == 'partitioned':
+        #the melted frame stays on disk, every query reads the month and group partitions it needs
+        version = sync_partitions()
+        df1, df_, df2, _ = load_dataset(frames=('df_',))
+        engine = aggregates = PartitionEngine()
+        publish(version)
+        return
+    df1, df_, df2, version = load_dataset()
+
+    #index the melted frame once so that every callback filters it through the same bitmaps
+    engine = FilterEngine(df2)
+    #and pre-aggregate it so that the aggregator dropdown is a lookup instead of a groupby,
+    #or reduce the columns of the unmelted workbook when the wide engine is configured
+    if config.AGGREGATION_ENGINE == 'wide':
+        aggregates = WideEngine(df1)
+    else:
+        aggregates = AggregateCube(df2)
+    publish(version)
+
+def publish(version):
+    global data_version, calendar, correlations, forecasts
+    data_version = version
+    #cached results computed from any other version of the data are dropped
+    callback_cache.set_version(version)
+    aggregate_store.set_version(version)
+    #and the pages get the calendar of this version
+    calendar = engine.calendar_lookup()
+    calendar['version'] = version
+    #the correlation section bins and correlates the new rows on first use, the forecast is fitted again
+    correlations = None
+    forecasts = None
+
+correlation_lock = threading.Lock()
+
+def correlation_explorer():
+    global correlations
+    with correlation_lock:
+        if correlations is None:
+            correlations = CorrelationExplorer(df_)
+        return correlations
+
+forecast_lock = threading.Lock()
+
+def demand_forecast():
+    global forecasts
+    with forecast_lock:
+        if forecasts is None:
+            forecasts = DemandForecast.fit(engine)
+        return forecasts
+
+#append the batches ingest.py wrote since the data was loaded, the indexes only take in the new rows
+ingest_lock = threading.Lock()
+
+def ingest_batches():
+    global df1, df_, df2, engine, aggregates, manifest_seen
+    if manifest_stat() == manifest_seen:
+        return
+    with ingest_lock:
+        stat = manifest_stat()
+        if stat == manifest_seen:
+            return
+        manifest_seen = stat
+        manifest = read_manifest()
+        batches = batches_after(manifest, data_version) if manifest else []
+        if batches is None:
+            logger.warning('the dataset cache was rebuilt from another workbook, restart the app to load it')
+            return
+        if not batches:
+            return
+        start = time.perf_counter()
+        if config.STORAGE == 'partitioned':
+            #ingest.py usually partitioned the batches already, then this only rereads the state
+            sync_partitions()
+            _, df_, _ = append_frames((None, df_, None), read_batches(config.CACHE_DIR, batches, ('df_',)))
+            engine = aggregates = engine.extended()
+        else:
+            df1, df_, df2 = append_frames((df1, df_, df2), read_batches(config.CACHE_DIR, batches))
+            engine = engine.extended(df2)
+            aggregates = aggregates.extended(df1 if config.AGGREGATION_ENGINE == 'wide' else df2)
+        publish(dataset_version(manifest))
+        logger.info('appended %d ingested batches (%d rows) in %.3fs',
+                    len(batches), sum(batch['rows'] for batch in batches), time.perf_counter() - start)
+
+load_data()
+
+#cache keys: the filter dropdowns in canonical form, the remaining inputs as they are since the titles show them
+def filter_key(group, start_date, end_date, month, week, weekday, *rest):
+    return (FilterState.from_inputs(group, start_date, end_date, month, week, weekday),) + rest
+
+#the stored aggregate's key already stands for the filters, the last six inputs of the charts that read it
+def stored_key(key, *rest):
+    return (key,) + rest[:-6]
+
+#the saved windows by their filters, not by the specs the browser holds
+def comp_key(group,start_date1,end_date1,start_date2,end_date2,month1,month2,week1,week2,day1,day2,product1,product2,aggregator,shown=None,specs=None):
+    return (FilterState.from_inputs(group, start_date1, end_date1, month1, week1, day1),
+            FilterState.from_inputs(group, start_date2, end_date2, month2, week2, day2),
+            product1, product2, aggregator, saved_windows(group, shown, specs))
 
 #instantiate the app
 app = dash.Dash(__name__,
@@ -157,535 +154,538 @@ app = dash.Dash(__name__,
                     {'name':"viewport", 'content':"width=device-width, initial-scale=1.0"}
                 ]
 )
-
-#the app layout
-app.layout = html.Div([
-    html.Header([
-        #navigation bar
-        html.Nav([
-            html.Div([
-                html.I(
-                    className="fa-solid fa-bars fa-xl",
-                    id='toggle-icon_menu'
-                ),
-            ],id='main_header__sidebar_toggle', className='main_header_icon_and_dropdown'),
-            html.Div([
-                    dcc.Dropdown(
-                        id='dataset_group',
-                        options=[
-                            {'label':'Cereal Packs','value':'cereal_packages'},
-                            {'label':'Chicken Packs','value':'chicken_packages'},
-                            {'label':'Call To Order','value':'call_to_order'},
-                            {'label':'Others','value':'others'}
-                        ],
-                        value = 'cereal_packages'
+#the Flask app, for WSGI servers: gunicorn -c gunicorn.conf.py app:server
+server = app.server
+#per-callback timings, when QSR_METRICS=1
+metrics.install(server)
+#profiles of the requests that ask for one, when QSR_PROFILE is set
+profiler.install(server)
+#allocation peaks of a share of the callback requests, when QSR_MEMORY_SAMPLE_RATE is above 0
+memory.install(server)
+
+#the app layout, built for every page load so that it shows the data ingested since the app started
+def serve_layout():
+    return html.Div([
+        #the date dimension read by the clientside dropdown cascades, shipped once with the page
+        dcc.Store(id='calendar_lookup', data=calendar),
+        #asks the server now and then whether batches were ingested, to follow them without a reload
+        dcc.Interval(id='dataset_poll', interval=config.DATASET_POLL_SECONDS * 1000),
+        #keys of the section aggregates held in aggregate_store, the frames never leave the server
+        dcc.Store(id='items_aggregate'),
+        dcc.Store(id='hours_aggregate'),
+        #the comparison windows saved from the two columns, as window specs
+        dcc.Store(id='comp_window_specs', data=[]),
+        html.Header([
+            #navigation bar
+            html.Nav([
+                html.Div([
+                    html.I(
+                        className="fa-solid fa-bars fa-xl",
+                        id='toggle-icon_menu'
                     ),
-                    dcc.Dropdown(
-                        id='data_aggregator',
-                        options=[
-                            {'label':'Minimum','value':'Minimum'},
-                            {'label':'Average','value':'Average'},
-                            {'label':'Maximum','value':'Maximum'},
-                            {'label':'Total','value':'Total'}
-                        ],
-                        value='Average'
-                    )
-            ],id='main_header-dropdown', )
-        ],className='main_header_icon_and_dropdown')
-    ], id='main_header'),
-    html.Section([
-        html.Div(id='overlay'),
-        #the sidebar
-        html.Div([
-            html.Div([
+                ],id='main_header__sidebar_toggle', className='main_header_icon_and_dropdown'),
                 html.Div([
-                     html.H3([
-                         html.Span(['D'],className='dtext'),
-                         'ATA',
-                         html.Span(['R'],className='dtext'),
-                         'EALM'],id='brand_text'),
-                ],id='brand')
-            ],id='sidebar_header'),
+                        dcc.Dropdown(
+                            id='dataset_group',
+                            options=[
+                                {'label':'Cereal Packs','value':'cereal_packages'},
+                                {'label':'Chicken Packs','value':'chicken_packages'},
+                                {'label':'Call To Order','value':'call_to_order'},
+                                {'label':'Others','value':'others'}
+                            ],
+                            value = 'cereal_packages'
+                        ),
+                        dcc.Dropdown(
+                            id='data_aggregator',
+                            options=[
+                                {'label':'Minimum','value':'Minimum'},
+                                {'label':'Average','value':'Average'},
+                                {'label':'Maximum','value':'Maximum'},
+                                {'label':'Total','value':'Total'},
+                                {'label':'Median','value':'Median'},
+                                {'label':'P90','value':'P90'}
+                            ],
+                            value='Average'
+                        )
+                ],id='main_header-dropdown', )
+            ],className='main_header_icon_and_dropdown')
+        ], id='main_header'),
+        html.Section([
+            html.Div(id='overlay'),
+            #the sidebar
             html.Div([
-                dcc.DatePickerRange(
-                    id='date-picker',
-                    display_format='DD-MM-YYYY',
-                    min_date_allowed='24-11-2021',
-                    max_date_allowed='30-04-2023'
-                ),
-            ]),
+                html.Div([
+                    html.Div([
+                         html.H3([
+                             html.Span(['D'],className='dtext'),
+                             'ATA',
+                             html.Span(['R'],className='dtext'),
+                             'EALM'],id='brand_text'),
+                    ],id='brand')
+                ],id='sidebar_header'),
+                html.Div([
+                    dcc.DatePickerRange(
+                        id='date-picker',
+                        display_format='DD-MM-YYYY',
+                        min_date_allowed=calendar['start'],
+                        max_date_allowed=calendar['end']
+                    ),
+                ]),
+                html.Div([
+                    dbc.Tabs([
+                        dbc.Tab([
+                            html.H6('Intoduction'),
+                            html.P("Having been around for sometime now, significant number of people have resorted to them for their daily source of food. Depending on the location, a particular brand of QRS will have a variation in product demand from one store to the other as a result of customers' irrationality. This situation leads to poor planning and management in the individual stores to meet up with daily needs of the customers in the area of what products, what raw materials, how many working team etc, should be available at a given period to meet up with the daily need of the customers as each QRS work to minimize cost and maximize profit."),
+                            html.H6('Statemenrt of Problem'),
+                            html.P("Due to large customer base and limited resources such as staffing, raw materials and the likes,QSR are faced with a challenge in satisfing the needs of different customers in different times of the day. In this project, daily product sales data from an arbitrary QSR store from the time the store was openned are analyzed so as to note how customers come in at different hours of the day, how they spend what items they buy at these hours to enable the store's management in making proper planning."),
+                            html.H6('The Dataset'),
+                            html.P("The Dataset comprises of daily sales in quantity of products, number of tickets and amount of sales for every hour of the day from 24th November, 2021 to 30th April,2023. From the given features, other features were introduced such as Average Spent per hour. Other features are the month, the week, the day of the week the sales took place. This was necessary to see how product sales trend at  period."),
+                            html.H6('Data Intergrity'),
+                            html.P("Some technical challenges affected the data which are as follows:"),
+                            html.Ol([
+                                html.Li("System Failure: Due to system failures, some orders were not tendered at the time of purchase. At these times the orders were tenders at the close of shifts basically when the system has been respored."),
+                                html.Li("Error Tender: Sometimes, due to upskilling of the team or excessive rush at some hours of the day, it is common to record some errors in the process of taking some order. There is room to correct to wrongly taken orders but not in the event that they have tendered and not reported."),
+                                html.Li("Product Skip: Some cashiers may skip some products while taking an order occassionally. In such situations, the skiped products are tendered at the end of day after internal product control."),
+                                html.Li("National Holidays: Some national holidays prohibit the opening of social center to enable citizen execise their rights such as election days."),
+                            ]),
+                            html.P("In the above situation, data have either been misinputted or lost entirely. In the situation where data are misimputed, the extent to which existing data are impacted are examined. The wrongly imputed data are replaced with the mean at that particular time. In the event that the data are entered at rhe end of the day at late hours, the data for that entire day are discarded. On national holidays, there are no data at all."),
+                            html.H6('Analytic Strategy'),
+                            html.P("The strategy employed was to group the dataset by hour of the day and monitor the products that were sold at each hour of sales in minmum, average, maximum and total sales. Then, the dataset is grouped by product and then monitor how each product perform at different hours of the day."),
+                            html.P([
+                                html.Span(['Note:'],id='red'),
+                                "This project is based on randomly generated data due to the authors experience and interest in QRS. It is mainly to be used for eductional purpose. Random names have been used to represent products and as such, any resemblence to real life data is a pure coincidence."
+                            ])
+                        ],label='Project',tab_id='project_tab',className='tab_ind'),
+                        dbc.Tab([
+                            html.P("The dataset was classified into four product categories namely: Cereal Packs, Chicken Packs, Call to Order and others to facilitate readability due to large number of products."),
+                            html.Ol([
+                                html.Li("Cereal Packs: The products here are products that must go with cereal."),
+                                html.Li("Chicken Packs: Chicken Packs are packages that only include chicken products."),
+                                html.Li("Call to Order: This peoduct category has to do with only products that are made when there are ordered."),
+                                html.Li("Others: This category has to do with other miscelleanous products that can be found in the store."),
+                            ]),
+                            html.H6('Aggretating Functions'),
+                            html.P("Six aggregating fuctions are available to aggregate the dataset which are as follows:"),
+                            html.Ol([
+                                html.Li("Minimum: To compute the minimum of the numerical variables in consideration."),
+                                html.Li("Average: To compute the mean of the varriables of the variables in consideration."),
+                                html.Li("Maximum: to compute the maximum values within the variables under consideration."),
+                                html.Li("Total: To compute the sum of the variables of interests."),
+                                html.Li("Median: To compute the middle value of the variables in consideration, the typical hour unaffected by a few very busy ones."),
+                                html.Li("P90: To compute the 90th percentile of the variables in consideration, the demand that only one hour in ten exceeds, for staffing."),
+                            ]),
+                            html.P("The aggregating functions can be accessed from the Navigation bar. The aggregating functions control the first three sections of the layout."),
+                            html.H6('Layout'),
+                            html.P("Structurally, the layout is indirectly divided into four:"),
+                            html.Ol([
+                                html.Li("Section 1: This section contains four cards, a barchart and a doughnut chart. This is where the results from filtering the dataset by time and  grouping by product is displayed. When a time is selected, the dataset is grouped by the products. The sum of the variables depending on the aggregating function are displayed in the cards. The barchart plots the products sold at the selected time will be plotted. The doughnut chat plots the percentage contribution of the each of products against the rest of the products at the selected time."),
+                                html.Li("Section 2: This section contains three plots: a doughnut chart, a bobble chart and a line chart. This is where the results of filtering the dataset by product and by time is displayed. The doughnut chart displays the percentage of the quantity of the selected product that sold by the selected time against the other hours of the day. In the bobble chart, the quantity of the product selected is plotted against the number of tickets and the size of the markers emphasize the sales at the time. In the line chart, the quantity of the selected product as sold throughout the hours of the day is plotted. In the line chart, it is possible to monitor sales per hour, ticket per hour and AVS per hour by selecting the appropriate option from the dropdown above the chart. Over the quantity, a dashed line shows the forecast of the next seven days after the last date of the dataset, its days combined with the same aggregating function and limited to the selected week days."),
+                                html.Li("Section 3: This section contains only a single chart. The chart is a grouped barchart where different (or same) products can be compared to each other over diiferent or same period. To compare, the dataset is filtered from the dropdowns by the left and the ones by the right. The filters of either side can be saved as a window, to compare more than two periods (the four quarters of a year, say) at once."),
+                                html.P("Note: The three sections as described above are controlled by the aggregating function. That is, the values displayed could be minimum, average, maximum or sum depending on the aggregating function selected."),
+                                html.Li("Section 4: This section is where the correlation chart is plotted. All the numerical features can be plotted against each other to moniter how they correlate with each other."),
+                            ]),
+                            html.P("Explaining the charts used for this project is boyond the primary focus of the project. They are vast materials online that explan the charts. Feel free to sort for these materials if need be.")
+                        ],label='Guide',tab_id='note_tab',className='tab_ind'),
+                        dbc.Tab([
+                            html.Label('Month',className='control_label'),
+                            dcc.Dropdown(id='sidebar_month_selector',
+                                            multi=True),
+                            html.Label('Week',className='control_label'),
+                            dcc.Dropdown(id='sidebar_week_selector',
+                                            multi=True),
+                            html.Label('Week Day',className='control_label'),
+                            dcc.Dropdown(id='sidebar_weekday_selector',
+                                            multi=True),
+                            html.Label('Export The Filtered Rows',className='control_label'),
+                            html.Div([
+                                html.A('CSV',id='rows_export_csv',download='rows.csv',className='export_link'),
+                                html.A('Parquet',id='rows_export_parquet',download='rows.parquet',className='export_link')
+                            ],className='export_links')
+                        ],label='Filter',tab_id='filter_tab',className='tab_ind'),
+                    ],id='tabs',
+                      active_tab='filter_tab'
+                    )               
+                ], id='tab_container'),
+                html.Div([
+                    html.Img(
+                        src=app.get_asset_url('ra1.jpg'),
+                        id='image', 
+                        className='shadow'),
+                    html.Div([
+                        html.A(
+                            html.I(id='github', className='fa-brands fa-square-github fa-2xl'),
+                            href='https://github.com/amaechi01',
+                            target='_blank'
+                        ),    
+                        html.A(
+                            html.I(id='linkedin', className='fa-brands fa-linkedin fa-2xl'),
+                            href='http://linkedin.com/in/oshim-amaechi',
+                            target='_blank'
+                        ),  
+                        html.A(
+                            html.I(id='skype', className='fa-brands fa-skype fa-2xl'),
+                            href='https://join.skype.com/invite/BXEEHj5bHDv2',
+                            target='_blank'
+                        ),    
+                    ],id='contact')
+                ],className='info')            
+            ],id='sidebar'),
+            #project title
             html.Div([
-                dbc.Tabs([
-                    dbc.Tab([
-                        html.H6('Intoduction'),
-                        html.P("Having been around for sometime now, significant number of people have resorted to them for their daily source of food. Depending on the location, a particular brand of QRS will have a variation in product demand from one store to the other as a result of customers' irrationality. This situation leads to poor planning and management in the individual stores to meet up with daily needs of the customers in the area of what products, what raw materials, how many working team etc, should be available at a given period to meet up with the daily need of the customers as each QRS work to minimize cost and maximize profit."),
-                        html.H6('Statemenrt of Problem'),
-                        html.P("Due to large customer base and limited resources such as staffing, raw materials and the likes,QSR are faced with a challenge in satisfing the needs of different customers in different times of the day. In this project, daily product sales data from an arbitrary QSR store from the time the store was openned are analyzed so as to note how customers come in at different hours of the day, how they spend what items they buy at these hours to enable the store's management in making proper planning."),
-                        html.H6('The Dataset'),
-                        html.P("The Dataset comprises of daily sales in quantity of products, number of tickets and amount of sales for every hour of the day from 24th November, 2021 to 30th April,2023. From the given features, other features were introduced such as Average Spent per hour. Other features are the month, the week, the day of the week the sales took place. This was necessary to see how product sales trend at  period."),
-                        html.H6('Data Intergrity'),
-                        html.P("Some technical challenges affected the data which are as follows:"),
-                        html.Ol([
-                            html.Li("System Failure: Due to system failures, some orders were not tendered at the time of purchase. At these times the orders were tenders at the close of shifts basically when the system has been respored."),
-                            html.Li("Error Tender: Sometimes, due to upskilling of the team or excessive rush at some hours of the day, it is common to record some errors in the process of taking some order. There is room to correct to wrongly taken orders but not in the event that they have tendered and not reported."),
-                            html.Li("Product Skip: Some cashiers may skip some products while taking an order occassionally. In such situations, the skiped products are tendered at the end of day after internal product control."),
-                            html.Li("National Holidays: Some national holidays prohibit the opening of social center to enable citizen execise their rights such as election days."),
-                        ]),
-                        html.P("In the above situation, data have either been misinputted or lost entirely. In the situation where data are misimputed, the extent to which existing data are impacted are examined. The wrongly imputed data are replaced with the mean at that particular time. In the event that the data are entered at rhe end of the day at late hours, the data for that entire day are discarded. On national holidays, there are no data at all."),
-                        html.H6('Analytic Strategy'),
-                        html.P("The strategy employed was to group the dataset by hour of the day and monitor the products that were sold at each hour of sales in minmum, average, maximum and total sales. Then, the dataset is grouped by product and then monitor how each product perform at different hours of the day."),
-                        html.P([
-                            html.Span(['Note:'],id='red'),
-                            "This project is based on randomly generated data due to the authors experience and interest in QRS. It is mainly to be used for eductional purpose. Random names have been used to represent products and as such, any resemblence to real life data is a pure coincidence."
-                        ])
-                    ],label='Project',tab_id='project_tab',className='tab_ind'),
-                    dbc.Tab([
-                        html.P("The dataset was classified into four product categories namely: Cereal Packs, Chicken Packs, Call to Order and others to facilitate readability due to large number of products."),
-                        html.Ol([
-                            html.Li("Cereal Packs: The products here are products that must go with cereal."),
-                            html.Li("Chicken Packs: Chicken Packs are packages that only include chicken products."),
-                            html.Li("Call to Order: This peoduct category has to do with only products that are made when there are ordered."),
-                            html.Li("Others: This category has to do with other miscelleanous products that can be found in the store."),
-                        ]),
-                        html.H6('Aggretating Functions'),
-                        html.P("Four major aggregating fuctions were used to aggregate the dataset which are as follows:"),
-                        html.Ol([
-                            html.Li("Minimum: To compute the minimum of the numerical variables in consideration."),
-                            html.Li("Average: To compute the mean of the varriables of the variables in consideration."),
-                            html.Li("Maximum: to compute the maximum values within the variables under consideration."),
-                            html.Li("Total: To compute the sum of the variables of interests."),
-                        ]),
-                        html.P("The aggregating functions can be accessed from the Navigation bar. The aggregating functions control the first three sections of the layout."),
-                        html.H6('Layout'),
-                        html.P("Structurally, the layout is indirectly divided into four:"),
-                        html.Ol([
-                            html.Li("Section 1: This section contains four cards, a barchart and a doughnut chart. This is where the results from filtering the dataset by time and  grouping by product is displayed. When a time is selected, the dataset is grouped by the products. The sum of the variables depending on the aggregating function are displayed in the cards. The barchart plots the products sold at the selected time will be plotted. The doughnut chat plots the percentage contribution of the each of products against the rest of the products at the selected time."),
-                            html.Li("Section 2: This section contains three plots: a doughnut chart, a bobble chart and a line chart. This is where the results of filtering the dataset by product and by time is displayed. The doughnut chart displays the percentage of the quantity of the selected product that sold by the selected time against the other hours of the day. In the bobble chart, the quantity of the product selected is plotted against the number of tickets and the size of the markers emphasize the sales at the time. In the line chart, the quantity of the selected product as sold throughout the hours of the day is plotted. In the line chart, it is possible to monitor sales per hour, ticket per hour and AVS per hour by selecting the appropriate option from the dropdown above the chart."),
-                            html.Li("Section 3: This section contains only a single chart. The chart is a grouped barchart where different (or same) products can be compared to each other over diiferent or same period. To compare, the dataset is filtered from the dropdowns by the left and the ones by the right."),
-                            html.P("Note: The three sections as described above are controlled by the aggregating function. That is, the values displayed could be minimum, average, maximum or sum depending on the aggregating function selected."),
-                            html.Li("Section 4: This section is where the correlation chart is plotted. All the numerical features can be plotted against each other to moniter how they correlate with each other."),
-                        ]),
-                        html.P("Explaining the charts used for this project is boyond the primary focus of the project. They are vast materials online that explan the charts. Feel free to sort for these materials if need be.")
-                    ],label='Guide',tab_id='note_tab',className='tab_ind'),
-                    dbc.Tab([
-                        html.Label('Month',className='control_label'),
-                        dcc.Dropdown(id='sidebar_month_selector',
-                                        multi=True),
-                        html.Label('Week',className='control_label'),
-                        dcc.Dropdown(id='sidebar_week_selector',
-                                        multi=True),
-                        html.Label('Week Day',className='control_label'),
-                        dcc.Dropdown(id='sidebar_weekday_selector',
-                                        multi=True)
-                    ],label='Filter',tab_id='filter_tab',className='tab_ind'),
-                ],id='tabs',
-                  active_tab='filter_tab'
-                )               
-            ], id='tab_container'),
+                html.Div([
+                     html.I(
+                        className="fa-solid fa-bowl-food fa-bounce fa-2xl t_icon",
+                    ),
+                ],id='product-logo', className='three columns'),
+                html.Div([
+                    html.H1('QSR Sales Data Analysis',id='Main_title')
+                ],className='six columns title_text'),
+                html.Div([
+                    'Oshim Amaechi'
+                ],id='author',className='three columns'),
+            ],id='title_container',className='row flex-display'),
             html.Div([
-                html.Img(
-                    src=app.get_asset_url('ra1.jpg'),
-                    id='image', 
-                    className='shadow'),
                 html.Div([
-                    html.A(
-                        html.I(id='github', className='fa-brands fa-square-github fa-2xl'),
-                        href='https://github.com/amaechi01',
-                        target='_blank'
-                    ),    
-                    html.A(
-                        html.I(id='linkedin', className='fa-brands fa-linkedin fa-2xl'),
-                        href='http://linkedin.com/in/oshim-amaechi',
+                    html.Label('Time'),
+                    dcc.Dropdown(id='hour',className='time_item')
+                ],id='hour_dropdown', className='body_dropdown four columns'),
+                html.Div([  
+                    html.A( 
+                        html.Img(
+                            src=app.get_asset_url('dash-logo.png'),
+                            id='plotly'
+                        ),
+                        href='https://dash.plotly.com',
                         target='_blank'
-                    ),  
-                    html.A(
-                        html.I(id='skype', className='fa-brands fa-skype fa-2xl'),
-                        href='https://join.skype.com/invite/BXEEHj5bHDv2',
-                        target='_blank'
-                    ),    
-                ],id='contact')
-            ],className='info')            
-        ],id='sidebar'),
-        #project title
-        html.Div([
-            html.Div([
-                 html.I(
-                    className="fa-solid fa-bowl-food fa-bounce fa-2xl t_icon",
-                ),
-            ],id='product-logo', className='three columns'),
-            html.Div([
-                html.H1('QSR Sales Data Analysis',id='Main_title')
-            ],className='six columns title_text'),
-            html.Div([
-                'Oshim Amaechi'
-            ],id='author',className='three columns'),
-        ],id='title_container',className='row flex-display'),
-        html.Div([
-            html.Div([
-                html.Label('Time'),
-                dcc.Dropdown(id='hour',className='time_item')
-            ],id='hour_dropdown', className='body_dropdown four columns'),
-            html.Div([  
-                html.A( 
-                    html.Img(
-                        src=app.get_asset_url('dash-logo.png'),
-                        id='plotly'
-                    ),
-                    href='https://dash.plotly.com',
-                    target='_blank'
-                )             
-            ],id='plotly_img_container', className='three columns')
-        ],id='plotly_img_row',className='row flex-display '),
-        #section1: Cards
-        html.Div([
+                    )             
+                ],id='plotly_img_container', className='three columns')
+            ],id='plotly_img_row',className='row flex-display '),
+            #section1: Cards
             html.Div([
                 html.Div([
                     html.Div([
-                        html.P(id='quantity_aggregate'),
-                        html.H3(id='quantity_aggregate_value')
-                    ],className='card_info'),
+                        html.Div([
+                            html.P(id='quantity_aggregate'),
+                            html.H3(id='quantity_aggregate_value')
+                        ],className='card_info'),
+                        html.Div([
+                            html.I(
+                                className='fa-solid fa-list-ol fa-2xl icon'
+                            )
+                        ],className='card_icon')
+                    ],id='card1',className='card_container four columns'),
                     html.Div([
-                        html.I(
-                            className='fa-solid fa-list-ol fa-2xl icon'
+                        html.Div([
+                            html.P(id='ticket_aggregate'),
+                            html.H3(id='ticket_aggregate_value')
+                        ],className='card_info'),
+                        html.Div([
+                            html.I(
+                                className='fa-solid fa-users fa-2xl icon'
                         )
-                    ],className='card_icon')
-                ],id='card1',className='card_container four columns'),
+                        ],className='card_icon')
+                    ],id='card2',className='card_container four columns'),
+                ],className='pair pair2'),
                 html.Div([
                     html.Div([
-                        html.P(id='ticket_aggregate'),
-                        html.H3(id='ticket_aggregate_value')
-                    ],className='card_info'),
+                        html.Div([
+                            html.P(id='sales_aggregate'),
+                            html.H3(id='sales_aggregate_value')
+                        ],className='card_info'),
+                        html.Div([
+                            html.I(
+                                className='fa-solid fa-money-bill fa-2xl icon')
+                        ],className='card_icon'),
+                    ],id='card3',className='card_container four columns'),
                     html.Div([
-                        html.I(
-                            className='fa-solid fa-users fa-2xl icon'
-                    )
-                    ],className='card_icon')
-                ],id='card2',className='card_container four columns'),
-            ],className='pair pair2'),
+                        html.Div([
+                            html.P(id='avs_aggregate'),
+                            html.H3(id='avs_aggregate_value')
+                        ],className='card_info'),
+                        html.Div([
+                            html.I(
+                                className='fa-solid fa-gauge fa-2xl icon'
+                            )
+                        ],className='card_icon')    
+                    ],id='card4',className='card_container four columns'),
+                ],className='pair pair1'),
+            ],id='cards',className='card-container row flex-display'),
+            #section1: Barchart and Doughnut Chart
             html.Div([
                 html.Div([
+                    html.H5(id='product_by_hour',className='graph_title'),
+                    #the numbers behind the bar chart, as files
                     html.Div([
-                        html.P(id='sales_aggregate'),
-                        html.H3(id='sales_aggregate_value')
-                    ],className='card_info'),
+                        html.A('CSV',id='items_export_csv',download='items.csv',className='export_link'),
+                        html.A('Parquet',id='items_export_parquet',download='items.parquet',className='export_link')
+                    ],className='export_links'),
                     html.Div([
-                        html.I(
-                            className='fa-solid fa-money-bill fa-2xl icon')
-                    ],className='card_icon'),
-                ],id='card3',className='card_container four columns'),
+                        dcc.Loading([
+                            dcc.Graph(id='products_by_hour',className='graph'),
+                            #the steps of the section's aggregation while it runs in the background
+                            html.Div([
+                                html.Progress(id='items_progress_bar'),
+                                html.Span(id='items_progress_label')
+                            ],id='items_progress',className='progress',style={'display':'none'}),
+                        ],color='#021d3a')
+                    ],className='scroll'),  
+                ],className='graph-container seven columns'),
                 html.Div([
+                    html.H5(id='item_percentage_by_hour',className='graph_title'),
+                    dcc.Dropdown(id='select_product'),
                     html.Div([
-                        html.P(id='avs_aggregate'),
-                        html.H3(id='avs_aggregate_value')
-                    ],className='card_info'),
-                    html.Div([
-                        html.I(
-                            className='fa-solid fa-gauge fa-2xl icon'
-                        )
-                    ],className='card_icon')    
-                ],id='card4',className='card_container four columns'),
-            ],className='pair pair1'),
-        ],id='cards',className='card-container row flex-display'),
-        #section1: Barchart and Doughnut Chart
-        html.Div([
+                        dcc.Loading([
+                            dcc.Graph(id='percentage_item_by_hour',className='graph')
+                        ],color='#021d3a')
+                    ],className='scroll'),
+                ],className='graph-container five columns adj'),
+            ],className='row flex-display'),
             html.Div([
-                html.H5(id='product_by_hour',className='graph_title'),
                 html.Div([
-                    dcc.Loading([
-                        dcc.Graph(id='products_by_hour',className='graph'),
-                    ],color='#021d3a')
-                ],className='scroll'),  
-            ],className='graph-container seven columns'),
+                    html.Label('Product'),
+                    dcc.Dropdown(id='item',className='time_item')
+                ],id='item_dropdown',className='body_dropdown four columns')
+            ],id='item_dropdown_row',className='row flex-display'),
+            #section2: doughtnut chart and bobble chart
             html.Div([
-                html.H5(id='item_percentage_by_hour',className='graph_title'),
-                dcc.Dropdown(id='select_product'),
                 html.Div([
-                    dcc.Loading([
-                        dcc.Graph(id='percentage_item_by_hour',className='graph')
-                    ],color='#021d3a')
-                ],className='scroll'),
-            ],className='graph-container five columns adj'),
-        ],className='row flex-display'),
-        html.Div([
-            html.Div([
-                html.Label('Product'),
-                dcc.Dropdown(id='item',className='time_item')
-            ],id='item_dropdown',className='body_dropdown four columns')
-        ],id='item_dropdown_row',className='row flex-display'),
-        #section2: doughtnut chart and bobble chart
-        html.Div([
-            html.Div([
-                html.H5(id='hourly_item_quantity_percentage',className='graph_title'),
-                dcc.Dropdown(id='select_time'),
+                    html.H5(id='hourly_item_quantity_percentage',className='graph_title'),
+                    dcc.Dropdown(id='select_time'),
+                    html.Div([
+                        dcc.Loading([
+                            dcc.Graph(id='hourly_quantity_percent',className='graph')
+                        ],color='#021d3a')
+                    ],className='scroll'),
+                ],className='graph-container five columns'),
                 html.Div([
-                    dcc.Loading([
-                        dcc.Graph(id='hourly_quantity_percent',className='graph')
-                    ],color='#021d3a')
-                ],className='scroll'),
-            ],className='graph-container five columns'),
+                    html.H5(id='bobble_chart_title',className='graph_title'),
+                    html.Div([
+                        dcc.Loading([
+                            dcc.Graph(id='bobble_chart',className='graph')
+                        ],color='#021d3a')
+                    ],className='scroll'),                
+                ],className='graph-container seven columns adj')
+            ],className='row flex-display'),
+            #section2: line chart
             html.Div([
-                html.H5(id='bobble_chart_title',className='graph_title'),
-                html.Div([
-                    dcc.Loading([
-                        dcc.Graph(id='bobble_chart',className='graph')
-                    ],color='#021d3a')
-                ],className='scroll'),                
-            ],className='graph-container seven columns adj')
-        ],className='row flex-display'),
-        #section2: line chart
-        html.Div([
-            html.Div([               
-                html.H5(id='trend_plot_title',className='graph_title'),
-                dcc.Dropdown(
-                    id='feature_',
-                    options=[
-                        {'label':'Quantity', 'value':'Quantity'},
-                        {'label':'Ticket', 'value':'Ticket'},
-                        {'label':'Sales', 'value':'Sales'},
-                        {'label':'AVS Per Hour', 'value':'AVS Per Hour'},
-                    ],
-                    value='Quantity'
-                ),
-                html.Div([
-                    dcc.Loading([
-                        dcc.Graph(id='trend_plot',className='graph') 
-                    ],color='#021d3a') 
-                ],className='scroll'),      
-            ],className='full twelve columns graph-container')
-        ],id='full1',className='row flex-display'),
-        #compertion graph
-        html.Div([
+                html.Div([               
+                    html.H5(id='trend_plot_title',className='graph_title'),
+                    dcc.Dropdown(
+                        id='feature_',
+                        options=[
+                            {'label':'Quantity', 'value':'Quantity'},
+                            {'label':'Ticket', 'value':'Ticket'},
+                            {'label':'Sales', 'value':'Sales'},
+                            {'label':'AVS Per Hour', 'value':'AVS Per Hour'},
+                        ],
+                        value='Quantity'
+                    ),
+                    html.Div([
+                        dcc.Loading([
+                            dcc.Graph(id='trend_plot',className='graph'),
+                            #the steps of the section's aggregation while it runs in the background
+                            html.Div([
+                                html.Progress(id='hours_progress_bar'),
+                                html.Span(id='hours_progress_label')
+                            ],id='hours_progress',className='progress',style={'display':'none'}),
+                        ],color='#021d3a') 
+                    ],className='scroll'),      
+                ],className='full twelve columns graph-container')
+            ],id='full1',className='row flex-display'),
+            #compertion graph
             html.Div([
                 html.Div([
-                    html.Label('Date'),
-                    dcc.DatePickerRange(
-                        id='comp_date-picker1',
-                        display_format='DD-MM-YYYY',
-                        min_date_allowed='24-11-2021',
-                        max_date_allowed='30-04-2023'
-                    ),
-                    html.Label('Month'),
-                    dcc.Dropdown(id='comp_month_selector1',className='select'),
-                    html.Label('Week'),
-                    dcc.Dropdown(id='comp_week_selector1',className='select'),
-                    html.Label('Week Day'),
-                    dcc.Dropdown(id='comp_weekday_selector1',className='select'),
-                    html.Label('Product'),
-                    dcc.Dropdown(id='comp_product_selector1',className='select')
-                ],id='control1', className='two columns control'),
+                    html.Div([
+                        html.Label('Date'),
+                        dcc.DatePickerRange(
+                            id='comp_date-picker1',
+                            display_format='DD-MM-YYYY',
+                            min_date_allowed=calendar['start'],
+                            max_date_allowed=calendar['end']
+                        ),
+                        html.Label('Month'),
+                        dcc.Dropdown(id='comp_month_selector1',className='select'),
+                        html.Label('Week'),
+                        dcc.Dropdown(id='comp_week_selector1',className='select'),
+                        html.Label('Week Day'),
+                        dcc.Dropdown(id='comp_weekday_selector1',className='select'),
+                        html.Label('Product'),
+                        dcc.Dropdown(id='comp_product_selector1',className='select'),
+                        html.Button('Save As Window',id='comp_add_window1',className='window_button')
+                    ],id='control1', className='two columns control'),
+                    html.Div([
+                        html.H5(id='comp_plot_title',className='graph_title'),
+                        html.Div([
+                            dcc.Loading([
+                                dcc.Graph(id='comp_plot',className='graph')
+                            ],color='#021d3a')
+                        ],className='scroll'),
+                        #the saved windows plotted next to the two columns, a removed one can be picked again
+                        dcc.Dropdown(id='comp_windows',multi=True,placeholder='Saved windows',className='select'),
+                        #the numbers behind the chart, as files
+                        html.Div([
+                            html.A('CSV',id='comp_export_csv',download='comparison.csv',className='export_link'),
+                            html.A('Parquet',id='comp_export_parquet',download='comparison.parquet',className='export_link')
+                        ],className='export_links'),
+                    ],className='eight columns'),            
+                    html.Div([
+                        html.Label('Date'),
+                        dcc.DatePickerRange(
+                            id='comp_date-picker2',
+                            display_format='DD-MM-YYYY',
+                            min_date_allowed=calendar['start'],
+                            max_date_allowed=calendar['end']
+                        ),
+                        html.Label('Month'),
+                        dcc.Dropdown(id='comp_month_selector2',className='select'),
+                        html.Label('Week'),
+                        dcc.Dropdown(id='comp_week_selector2',className='select'),
+                        html.Label('Week Day'),
+                        dcc.Dropdown(id='comp_weekday_selector2',className='select'),
+                        html.Label('Product'),
+                        dcc.Dropdown(id='comp_product_selector2',className='select'),
+                        html.Button('Save As Window',id='comp_add_window2',className='window_button')
+                    ],id='control2', className='two columns control')
+                ],className='twelve columns graph-container comp')
+            ],id='full2',className='row flex-display'),
+            #correlation plot
+            html.Div([
                 html.Div([
-                    html.H5(id='comp_plot_title',className='graph_title'),
+                    html.H5(id='scatter_plot_title', className='graph_title'),
+                    html.Div([
+                        html.Div([
+                            dcc.Dropdown(id='feature1',
+                                        options=[{'label':val, 'value':val} for val in df_.columns],
+                                        value='Ticket'),
+                        ],className='correlation_control_container'),
+                        html.Div([
+                            dcc.Dropdown(id='feature2',
+                                        options=[{'label':val, 'value':val} for val in df_.columns],
+                                        value='AVS Per Hour')
+                        ],className='correlation_control_container'),
+                    ],className='correlation_control'),
+                    #points for every hour, or the hours counted in bins on the server (Auto past a number of rows)
+                    dcc.RadioItems(id='correlation_view',
+                                   options=['Auto', 'Points', 'Density'],
+                                   value='Auto', inline=True, className='correlation_control'),
                     html.Div([
                         dcc.Loading([
-                            dcc.Graph(id='comp_plot',className='graph')
+                            dcc.Graph(id='scatter_plot',className='graph')
                         ],color='#021d3a')
                     ],className='scroll'),
-                ],className='eight columns'),            
-                html.Div([
-                    html.Label('Date'),
-                    dcc.DatePickerRange(
-                        id='comp_date-picker2',
-                        display_format='DD-MM-YYYY',
-                        min_date_allowed='24-11-2021',
-                        max_date_allowed='30-04-2023'
-                    ),
-                    html.Label('Month'),
-                    dcc.Dropdown(id='comp_month_selector2',className='select'),
-                    html.Label('Week'),
-                    dcc.Dropdown(id='comp_week_selector2',className='select'),
-                    html.Label('Week Day'),
-                    dcc.Dropdown(id='comp_weekday_selector2',className='select'),
-                    html.Label('Product'),
-                    dcc.Dropdown(id='comp_product_selector2',className='select')
-                ],id='control2', className='two columns control')
-            ],className='twelve columns graph-container comp')
-        ],id='full2',className='row flex-display'),
-        #correlation plot
-        html.Div([
+                ],className='twelve columns graph-container')
+            ],id='full3',className='row flex-display'),
+            #correlation matrix
             html.Div([
-                html.H5(id='scatter_plot_title', className='graph_title'),
                 html.Div([
+                    html.H5(id='correlation_matrix_title', className='graph_title'),
+                    dcc.RadioItems(id='correlation_method',
+                                   options=list(METHODS),
+                                   value=METHODS[0], inline=True, className='correlation_control'),
                     html.Div([
-                        dcc.Dropdown(id='feature1',
-                                    options=[{'label':val, 'value':val} for val in df_.columns],
-                                    value='Ticket'),
-                    ],className='correlation_control_container'),
-                    html.Div([
-                        dcc.Dropdown(id='feature2',
-                                    options=[{'label':val, 'value':val} for val in df_.columns],
-                                    value='AVS Per Hour')
-                    ],className='correlation_control_container'),
-                ],className='correlation_control'),
-                html.Div([
-                    dcc.Loading([
-                        dcc.Graph(id='scatter_plot',className='graph')
-                    ],color='#021d3a')
-                ],className='scroll'),
-            ],className='twelve columns graph-container')
-        ],id='full3',className='row flex-display')
-    ],id='layout-section')
-],id='main-container')
+                        dcc.Loading([
+                            dcc.Graph(id='correlation_matrix',className='graph')
+                        ],color='#021d3a')
+                    ],className='scroll'),
+                ],className='twelve columns graph-container')
+            ],id='full4',className='row flex-display')
+        ],id='layout-section')
+    ],id='main-container')
 
-#toggle callback function to display or hide the sidebar
+app.layout = serve_layout
+
+#every worker checks the dataset cache for new batches before it answers
+@app.server.before_request
+def follow_ingestion():
+    ingest_batches()
+
+#the open pages take the new calendar, which moves the date pickers' bounds
 @app.callback(
+    Output('calendar_lookup', 'data'),
+    Input('dataset_poll', 'n_intervals'),
+    State('calendar_lookup', 'data'),
+    prevent_initial_call=True
+)
+@metrics.callback('poll_dataset')
+def poll_dataset(n_intervals, lookup):
+    if lookup and lookup.get('version') == calendar['version']:
+        return dash.no_update
+    return calendar
+
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='date_bounds'),
+    Output('date-picker', 'min_date_allowed'),
+    Output('date-picker', 'max_date_allowed'),
+    Output('comp_date-picker1', 'min_date_allowed'),
+    Output('comp_date-picker1', 'max_date_allowed'),
+    Output('comp_date-picker2', 'min_date_allowed'),
+    Output('comp_date-picker2', 'max_date_allowed'),
+    Input('calendar_lookup', 'data'),
+    prevent_initial_call=True
+)
+
+#toggle callback function to display or hide the sidebar
+#a class name swap, so it runs in the browser (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='toggle_sidebar'),
     Output('sidebar', 'className'),
     Output('toggle-icon_menu', 'className'),
     Output('overlay', 'className'),
     Input('toggle-icon_menu', 'n_clicks'),
-    State('sidebar', 'className'),
-    State('overlay', 'className'),
     prevent_initial_call=True
 )
-def toggle_sidebar(toggle_icon_clicks, sidebar_class, overlay_class):
-    # Check the number of clicks to toggle the sidebar
-    if toggle_icon_clicks % 2 == 1:
-        sidebar_class = 'open'
-        overlay_class = 'active'
-        toggle_icon_class = 'fa-solid fa-xmark fa-xl'              
-    else:
-        sidebar_class = ''
-        overlay_class = ''
-        toggle_icon_class = 'fa-solid fa-bars fa-xl'
-    return sidebar_class, toggle_icon_class, overlay_class
 
 #the approach is to use the dropdowns to filter the dataset
 #when a value is selected the resulting dataset is expected to have only the values available
 #within the range selected
 
+#the group, date, month and week cascades only read the calendar lookup, they run in the browser
+#(assets/clientside.js) and leave the workers to the callbacks that aggregate
+
 #filter by group and output options to date picker
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='group_dates'),
     Output('date-picker','start_date'),
     Output('date-picker','end_date'),
-    Input('dataset_group', 'value')
+    Input('dataset_group', 'value'),
+    State('calendar_lookup', 'data')
 )
-def group_dataset(group):
-    #set the default value to cereal packs
-    if not group:
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        start_date = grouped_df2['Date'].min()
-        end_date = grouped_df2['Date'].max()
-    elif group =='cereal_packages':
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        start_date = grouped_df2['Date'].min()
-        end_date = grouped_df2['Date'].max()
-    elif group == 'chicken_packages':
-        grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        start_date = grouped_df2['Date'].min()
-        end_date = grouped_df2['Date'].max()
-    elif group == 'call_to_order':
-        grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        start_date = grouped_df2['Date'].min()
-        end_date = grouped_df2['Date'].max()
-    else:
-        grouped_df2 = df2[df2['Items'].isin(others)]
-        start_date = grouped_df2['Date'].min()
-        end_date = grouped_df2['Date'].max()
-    return start_date, end_date
 
 #filter by date and output options to month selector
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='months'),
     Output('sidebar_month_selector', 'options'),
     Output('sidebar_month_selector', 'value' ),
     Input('dataset_group', 'value'),
     Input('date-picker','start_date'),
-    Input('date-picker', 'end_date')
+    Input('date-picker', 'end_date'),
+    State('calendar_lookup', 'data')
 )
-def date_filter(group, start_date, end_date):
-    if not group:
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group =='cereal_packages':
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group == 'chicken_packages':
-        grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-    elif group == 'call_to_order':
-        grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-    else:
-        grouped_df2 = df2[df2['Items'].isin(others)]
-
-    date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-    options = [{'label':val,'value':val} for val in date_filtered_df2['Month'].unique()]
-    value = [val for val in date_filtered_df2['Month'].unique()]
-    return options, value
 
 #filter by month and output options to week selector
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='weeks'),
     Output('sidebar_week_selector', 'options'),
     Output('sidebar_week_selector', 'value'),
     Input('dataset_group', 'value'),
     Input('date-picker', 'start_date'),
     Input('date-picker', 'end_date'),
-    Input('sidebar_month_selector', 'value')
+    Input('sidebar_month_selector', 'value'),
+    State('calendar_lookup', 'data')
 )
-def month_filter(group, start_date, end_date, month):
-    if not group:
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group =='cereal_packages':
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group == 'chicken_packages':
-        grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-    elif group == 'call_to_order':
-        grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-    else:
-        grouped_df2 = df2[df2['Items'].isin(others)]
-
-    date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-    
-    if not month:
-        month_filtered_df2 = date_filtered_df2
-    else:
-        try:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'] == month]
-        except ValueError:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'].isin(month)]
-    
-    options = [{'label':val,'value':val} for val in  month_filtered_df2 ['Month Weeks'].unique()]
-    value = [val for val in  month_filtered_df2['Month Weeks'].unique()]
-    return options, value
 
 #filter by week and output weekday selector
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='weekdays'),
     Output('sidebar_weekday_selector', 'options'),
     Output('sidebar_weekday_selector', 'value'),
     Input('dataset_group', 'value'),
     Input('date-picker', 'start_date'),
     Input('date-picker', 'end_date'),
     Input('sidebar_month_selector', 'value'),
-    Input('sidebar_week_selector', 'value')
+    Input('sidebar_week_selector', 'value'),
+    State('calendar_lookup', 'data')
 )
-def week_filter(group, start_date, end_date, month, week):
-    if not group:
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group =='cereal_packages':
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group == 'chicken_packages':
-        grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-    elif group == 'call_to_order':
-        grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-    else:
-        grouped_df2 = df2[df2['Items'].isin(others)]
-
-    date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-    
-    if not month:
-        month_filtered_df2 = date_filtered_df2
-    else:
-        try:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'] == month]
-        except ValueError:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'].isin(month)]
-    
-    if not week:
-        week_filtered_df2 = month_filtered_df2
-    else:
-        try:
-            week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'] == week]
-        except ValueError:
-            week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'].isin(week)]
-    
-    options = [{'label':val,'value':val} for val in week_filtered_df2['Week Days'].unique()]
-    value = [val for val in week_filtered_df2['Week Days'].unique()]
-    
-    return options, value
 
 # filter by weekday and and by hour
 @app.callback(
@@ -700,50 +700,60 @@ def week_filter(group, start_date, end_date, month, week):
     Input('sidebar_week_selector', 'value'),
     Input('sidebar_weekday_selector','value')
 )
+@metrics.callback('weekday_filter')
 def weekday_filter(group, start_date, end_date, month, week, weekday):
-    if not group:
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group =='cereal_packages':
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group == 'chicken_packages':
-        grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-    elif group == 'call_to_order':
-        grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-    else:
-        grouped_df2 = df2[df2['Items'].isin(others)]
-
-    date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-    
-    if not month:
-        month_filtered_df2 = date_filtered_df2
-    else:
-        try:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'] == month]
-        except ValueError:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'].isin(month)]
-    
-    if not week:
-        week_filtered_df2 = month_filtered_df2
-    else:
-        try:
-            week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'] == week]
-        except ValueError:
-            week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'].isin(week)]
-    
-    if not weekday:
-        weekday_filtered_df2 = week_filtered_df2
-    else:
-        try:
-            weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days']==weekday]
-        except ValueError:
-            weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days'].isin(weekday)]
-    options1 = [{'label':val,'value':val} for val in weekday_filtered_df2['Time'].unique()]
-    value1 = weekday_filtered_df2['Time'].unique()[0]
-    options2 = [{'label':val,'value':val} for val in weekday_filtered_df2['Items'].unique()]
-    value2 = weekday_filtered_df2['Items'].unique()[0]
+    state = FilterState.from_inputs(group, start_date, end_date, month, week, weekday)
+    hours = engine.unique(state, 'Time')
+    items = engine.unique(state, 'Items')
+    options1 = [{'label':val,'value':val} for val in hours]
+    value1 = hours[0]
+    options2 = [{'label':val,'value':val} for val in items]
+    value2 = items[0]
     
     return options1, value1, options2, value2
 
+#section 1: the group's items at one hour
+#one producer filters and aggregates per interaction, the bar chart, the cards and the doughnut read the result
+def items_aggregate(group, start_date, end_date, month, week, weekday, hour, aggregator):
+    background.progress(0, 3, 'Filtering')
+    state = FilterState.from_inputs(group, start_date, end_date, month, week, weekday)
+    hour = hour or engine.unique(state, 'Time')[0]
+    background.progress(1, 3, 'Aggregating')
+    aggregatted_df = aggregates.by_item(state, hour, aggregator)
+    background.progress(2, 3, 'Storing')
+    aggregatted_df = aggregatted_df.dropna()
+    return aggregatted_df[~(aggregatted_df==0).any(axis=1)]
+
+@app.callback(
+    Output('items_aggregate', 'data'),
+    Input('dataset_group', 'value'),
+    Input('date-picker', 'start_date'),
+    Input('date-picker', 'end_date'),
+    Input('sidebar_month_selector', 'value'),
+    Input('sidebar_week_selector', 'value'),
+    Input('sidebar_weekday_selector','value'),
+    Input('hour','value'),
+    Input('data_aggregator','value'),
+    **background.callback_options('items')
+)
+@metrics.callback('produce_items_aggregate')
+@background.reports_progress
+def produce_items_aggregate(group, start_date, end_date, month, week, weekday, hour, aggregator):
+    try:
+        return aggregate_store.produce(
+            'items_aggregate', filter_key(group, start_date, end_date, month, week, weekday, hour, aggregator),
+            lambda: items_aggregate(group, start_date, end_date, month, week, weekday, hour, aggregator))
+    except IndexError:
+        return dash.no_update
+
+#the stored frame, or the same frame computed again when this worker does not hold it
+def stored_frame(key, compute, *inputs):
+    found, frame = aggregate_store.get(key)
+    if not found:
+        frame = compute(*inputs)
+    #the charts add their own columns
+    return frame.copy()
+
 #plot the barchart in section 1 and output options to product selector for doughnut plot
 #populate the cards with info
 @app.callback(
@@ -759,90 +769,29 @@ def weekday_filter(group, start_date, end_date, month, week, weekday):
     Output('avs_aggregate_value','children'),
     Output('products_by_hour','figure'),
     Output('product_by_hour','children'),
-    Input('dataset_group', 'value'),
-    Input('date-picker', 'start_date'),
-    Input('date-picker', 'end_date'),
-    Input('sidebar_month_selector', 'value'),
-    Input('sidebar_week_selector', 'value'),
-    Input('sidebar_weekday_selector','value'),
-    Input('hour','value'),
-    Input('data_aggregator','value'),
+    Input('items_aggregate', 'data'),
+    State('hour','value'),
+    State('data_aggregator','value'),
+    State('dataset_group', 'value'),
+    State('date-picker', 'start_date'),
+    State('date-picker', 'end_date'),
+    State('sidebar_month_selector', 'value'),
+    State('sidebar_week_selector', 'value'),
+    State('sidebar_weekday_selector','value'),
 )
-def hourly_update(group, start_date, end_date, month, week, weekday, hour, aggregator):
+@metrics.callback('hourly_update')
+@callback_cache.memoize('hourly_update', stored_key)
+def hourly_update(key, hour, aggregator, group, start_date, end_date, month, week, weekday):
     try:   
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
-
-        date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-        
-        if not month:
-            month_filtered_df2 = date_filtered_df2
-        else:
-            try:
-                month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'] == month]
-            except ValueError:
-                month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'].isin(month)]
-        
-        if not week:
-            week_filtered_df2 = month_filtered_df2
-        else:
-            try:
-                week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'] == week]
-            except ValueError:
-                week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'].isin(week)]
-        
-        if not weekday:
-            weekday_filtered_df2 = week_filtered_df2
-        else:
-            try:
-                weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days']==weekday]
-            except ValueError:
-                weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days'].isin(weekday)]
-
         if not hour:
-            hourly_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Time']==weekday_filtered_df2['Time'].unique()[0]]
-            title=f'{aggregator} Quantity of Items Sold from {weekday_filtered_df2["Time"].unique()[0]}'
+            state = FilterState.from_inputs(group, start_date, end_date, month, week, weekday)
+            hour = engine.unique(state, 'Time')[0]
+            title=f'{aggregator} Quantity of Items Sold from {hour}'
         else:
-            hourly_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Time']==hour]
             title=f'{aggregator} Quantity of Products Sold from {hour}'
-        if not aggregator:
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Product Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df['ROTT'] = 100 - aggregatted_df['Product Percentage']
-        elif aggregator == 'Average':
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Product Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df['ROTT'] = 100 - aggregatted_df['Product Percentage']
-        elif aggregator == 'Minimum':
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].min().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Product Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df['ROTT'] = 100 - aggregatted_df['Product Percentage']
-        elif aggregator == 'Maximum':
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].max().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Product Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df['ROTT'] = 100 - aggregatted_df['Product Percentage']
-        else:
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].sum().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Product Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df['ROTT'] = 100 - aggregatted_df['Product Percentage']
+        aggregatted_df = stored_frame(key, items_aggregate, group, start_date, end_date, month, week, weekday, hour, aggregator)
+        aggregatted_df['Product Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
+        aggregatted_df['ROTT'] = 100 - aggregatted_df['Product Percentage']
             
         options = [{'label':val,'value':val} for val in aggregatted_df['Items'].unique()]
         
@@ -860,11 +809,7 @@ def hourly_update(group, start_date, end_date, month, week, weekday, hour, aggre
         card4_h6 = f'{aggregator} AVS Per Hour'
         card4_h3 = f'{(aggregatted_df["AVS Per Hour"].sum()/aggregatted_df.shape[0]):,.2f}'
 
-        figure = px.bar(aggregatted_df, x='Items', y='Quantity', color_discrete_sequence=['#021d3a'])
-        figure.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd'
-        )    
+        figure = figures.bar(aggregatted_df['Items'], aggregatted_df['Quantity'], 'Items', 'Quantity', '#021d3a')
         
         return options, value, card1_h6, card1_h3, card2_h6, card2_h3, card3_h6, card3_h3, card4_h6, card4_h3, figure, title
     except ValueError:
@@ -874,90 +819,24 @@ def hourly_update(group, start_date, end_date, month, week, weekday, hour, aggre
 @app.callback(
     Output('percentage_item_by_hour','figure'),
     Output('item_percentage_by_hour','children'),
-    Input('dataset_group', 'value'),
-    Input('date-picker', 'start_date'),
-    Input('date-picker', 'end_date'),
-    Input('sidebar_month_selector', 'value'),
-    Input('sidebar_week_selector', 'value'),
-    Input('sidebar_weekday_selector','value'),
-    Input('hour','value'),
-    Input('data_aggregator','value'),
-    Input('select_product', 'value')
+    Input('items_aggregate', 'data'),
+    Input('select_product', 'value'),
+    State('hour','value'),
+    State('data_aggregator','value'),
+    State('dataset_group', 'value'),
+    State('date-picker', 'start_date'),
+    State('date-picker', 'end_date'),
+    State('sidebar_month_selector', 'value'),
+    State('sidebar_week_selector', 'value'),
+    State('sidebar_weekday_selector','value'),
 )
-def product_percent_update(group, start_date, end_date, month, week, weekday, hour, aggregator, product):
+@metrics.callback('product_percent_by_hour')
+@callback_cache.memoize('product_percent_by_hour', stored_key)
+def product_percent_update(key, product, hour, aggregator, group, start_date, end_date, month, week, weekday):
     try:   
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
-
-        date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-        
-        if not month:
-            month_filtered_df2 = date_filtered_df2
-        else:
-            try:
-                month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'] == month]
-            except ValueError:
-                month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'].isin(month)]
-        
-        if not week:
-            week_filtered_df2 = month_filtered_df2
-        else:
-            try:
-                week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'] == week]
-            except ValueError:
-                week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'].isin(week)]
-        
-        if not weekday:
-            weekday_filtered_df2 = week_filtered_df2
-        else:
-            try:
-                weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days']==weekday]
-            except ValueError:
-                weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days'].isin(weekday)]
-
-        if not hour:
-            hourly_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Time']==weekday_filtered_df2['Time'].unique()[0]]
-        else:
-            hourly_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Time']==hour]
-        
-        if not aggregator:
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{product}'] = 100 - aggregatted_df['Others']
-        elif aggregator == 'Average':
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{product}'] = 100 - aggregatted_df['Others']
-        elif aggregator == 'Minimum':
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].min().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{product}'] = 100 - aggregatted_df['Others']
-        elif aggregator == 'Maximum':
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].max().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{product}'] = 100 - aggregatted_df['Others']
-        else:
-            aggregatted_df = hourly_filtered_df2.groupby('Items')[['Quantity','Ticket','Sales','AVS Per Hour']].sum().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{product}'] = 100 - aggregatted_df['Others']            
+        aggregatted_df = stored_frame(key, items_aggregate, group, start_date, end_date, month, week, weekday, hour, aggregator)
+        aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
+        aggregatted_df[f'{product}'] = 100 - aggregatted_df['Others']
 
         if not product:
             df_ = aggregatted_df[aggregatted_df['Items'] == aggregatted_df['Items'].unique()[0]]
@@ -970,13 +849,8 @@ def product_percent_update(group, start_date, end_date, month, week, weekday, ho
             'Columns':[df_.columns[5],df_.columns[6]],
             'Value':[df_[f'{product}'].values[0],df_['Others'].values[0]]
             })
-            figure = px.pie(df_, names='Columns', values='Value', hole=0.6,color_discrete_sequence=['rgba(29,55,70,0.7)','#021d3a'])
-            figure.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd',
-                legend=dict(orientation='h'),
-                barmode='group'
-            )    
+            figure = figures.doughnut(df_['Columns'], df_['Value'], ['rgba(29,55,70,0.7)','#021d3a'],
+                                      legend=dict(orientation='h'), barmode='group')    
         else:
             df_ = None
             figure = None
@@ -987,14 +861,19 @@ def product_percent_update(group, start_date, end_date, month, week, weekday, ho
     except IndexError:
         return dash.no_update
 
-#plot the bobble chart and the line chart and output options to plot the doughnut chart in section 2
+#section 2: one item at every hour, produced once and read by the bubble, trend and doughnut charts
+def hours_aggregate(group, start_date, end_date, month, week, weekday, item, aggregator):
+    background.progress(0, 3, 'Filtering')
+    state = FilterState.from_inputs(group, start_date, end_date, month, week, weekday)
+    item = item or engine.unique(state, 'Items')[0]
+    background.progress(1, 3, 'Aggregating')
+    aggregatted_df = aggregates.by_time(state, item, aggregator)
+    background.progress(2, 3, 'Storing')
+    aggregatted_df = aggregatted_df.dropna()
+    return aggregatted_df[~(aggregatted_df==0).any(axis=1)]
+
 @app.callback(
-    Output('select_time','options'),
-    Output('select_time', 'value'),
-    Output('bobble_chart','figure'),
-    Output('trend_plot','figure'),
-    Output('bobble_chart_title','children'),
-    Output('trend_plot_title','children'),
+    Output('hours_aggregate', 'data'),
     Input('dataset_group', 'value'),
     Input('date-picker', 'start_date'),
     Input('date-picker', 'end_date'),
@@ -1003,81 +882,43 @@ def product_percent_update(group, start_date, end_date, month, week, weekday, ho
     Input('sidebar_weekday_selector','value'),
     Input('item','value'),
     Input('data_aggregator','value'),
-    Input('feature_','value')
-  )  
-def product_update(group, start_date, end_date, month, week, weekday, item, aggregator,feature):
-    if not group:
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group =='cereal_packages':
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group == 'chicken_packages':
-        grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-    elif group == 'call_to_order':
-        grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-    else:
-        grouped_df2 = df2[df2['Items'].isin(others)]
-
-    date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-    
-    if not month:
-        month_filtered_df2 = date_filtered_df2
-    else:
-        try:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'] == month]
-        except ValueError:
-            month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'].isin(month)]
-    
-    if not week:
-        week_filtered_df2 = month_filtered_df2
-    else:
-        try:
-            week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'] == week]
-        except ValueError:
-            week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'].isin(week)]
-    
-    if not weekday:
-        weekday_filtered_df2 = week_filtered_df2
-    else:
-        try:
-            weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days']==weekday]
-        except ValueError:
-            weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days'].isin(weekday)]
+    **background.callback_options('hours')
+)
+@metrics.callback('produce_hours_aggregate')
+@background.reports_progress
+def produce_hours_aggregate(group, start_date, end_date, month, week, weekday, item, aggregator):
+    try:
+        return aggregate_store.produce(
+            'hours_aggregate', filter_key(group, start_date, end_date, month, week, weekday, item, aggregator),
+            lambda: hours_aggregate(group, start_date, end_date, month, week, weekday, item, aggregator))
+    except IndexError:
+        return dash.no_update
 
-    if not item:
-        item_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Items']==weekday_filtered_df2['Items'].unique()[0]]
-    else:
-        item_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Items']==item]
-    
-    if not aggregator:
-        aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-        aggregatted_df = aggregatted_df.dropna()
-        aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-        aggregatted_df['Hour Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-        aggregatted_df['ROTT'] = 100 - aggregatted_df['Hour Percentage']
-    elif aggregator == 'Average':
-        aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-        aggregatted_df = aggregatted_df.dropna()
-        aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-        aggregatted_df['Hour Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-        aggregatted_df['ROTT'] = 100 - aggregatted_df['Hour Percentage']
-    elif aggregator == 'Minimum':
-        aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].min().reset_index()
-        aggregatted_df = aggregatted_df.dropna()
-        aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-        aggregatted_df['Hour Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-        aggregatted_df['ROTT'] = 100 - aggregatted_df['Hour Percentage']
-    elif aggregator == 'Maximum':
-        aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].max().reset_index()
-        aggregatted_df = aggregatted_df.dropna()
-        aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-        aggregatted_df['Hour Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-        aggregatted_df['ROTT'] = 100 - aggregatted_df['Hour Percentage']
-    else:
-        aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].sum().reset_index()
-        aggregatted_df = aggregatted_df.dropna()
-        aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-        aggregatted_df['Hour Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-        aggregatted_df['ROTT'] = 100 - aggregatted_df['Hour Percentage']
+#plot the bobble chart and the line chart and output options to plot the doughnut chart in section 2
+@app.callback(
+    Output('select_time','options'),
+    Output('select_time', 'value'),
+    Output('bobble_chart','figure'),
+    Output('trend_plot','figure'),
+    Output('bobble_chart_title','children'),
+    Output('trend_plot_title','children'),
+    Input('hours_aggregate', 'data'),
+    Input('feature_','value'),
+    State('item','value'),
+    State('data_aggregator','value'),
+    State('dataset_group', 'value'),
+    State('date-picker', 'start_date'),
+    State('date-picker', 'end_date'),
+    State('sidebar_month_selector', 'value'),
+    State('sidebar_week_selector', 'value'),
+    State('sidebar_weekday_selector','value'),
+  )  
+@metrics.callback('product_update')
+@callback_cache.memoize('product_update', stored_key)
+def product_update(key, feature, item, aggregator, group, start_date, end_date, month, week, weekday):
+    aggregatted_df = stored_frame(key, hours_aggregate, group, start_date, end_date, month, week, weekday, item, aggregator)
+    aggregatted_df['Hour Percentage'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
+    aggregatted_df['ROTT'] = 100 - aggregatted_df['Hour Percentage']
         
     options = [{'label':val,'value':val} for val in aggregatted_df['Time'].unique()]
     
@@ -1087,42 +928,31 @@ def product_update(group, start_date, end_date, month, week, weekday, item, aggr
     
         value = None
 
-    figure1 = px.scatter(aggregatted_df, x='Quantity', y='Ticket', size='Sales',color_discrete_sequence=['#021d3a'])
-    figure1.update_layout(
-            paper_bgcolor='#ece1dd',
-            plot_bgcolor='#ece1dd'
-    )
+    figure1 = figures.scatter(aggregatted_df['Quantity'], aggregatted_df['Ticket'], 'Quantity', 'Ticket', '#021d3a',
+                              size=aggregatted_df['Sales'], size_title='Sales')
+
+    #the item's quantity over the coming days drawn over its history, the days combined like its dates are;
+    #a Total of the history sums every date the filters keep, the forecast is scaled to as many days
+    forecast = None
+    if item and feature in (None, '', 'Quantity'):
+        state = FilterState.from_inputs(group, start_date, end_date, month, week, weekday)
+        history_days = int(date_mask(engine.calendar, state).sum()) if aggregator_statistic(aggregator) == 'sum' else None
+        predicted = demand_forecast()
+        forecast = predicted.by_time(item, aggregator, state.weekdays, history_days)
+        forecast = (forecast['Time'], forecast['Quantity'], predicted.label(state.weekdays, history_days))
 
     if not feature:
-        figure2 = px.line(aggregatted_df, x ='Time', y='Quantity',color_discrete_sequence=['#021d3a'],markers=True)
-        figure2.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd'
-        )
+        figure2 = figures.line(aggregatted_df['Time'], aggregatted_df['Quantity'], 'Time', 'Quantity', '#021d3a',
+                               overlay=forecast)
     elif feature == 'Sales':
-        figure2 = px.line(aggregatted_df, x ='Time', y='Sales',color_discrete_sequence=['#1d3746'],markers=True)
-        figure2.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd'
-        )
+        figure2 = figures.line(aggregatted_df['Time'], aggregatted_df['Sales'], 'Time', 'Sales', '#1d3746')
     elif feature == 'Ticket':
-        figure2 = px.line(aggregatted_df, x ='Time', y='Ticket',color_discrete_sequence=['#1d3746'],markers=True)
-        figure2.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd'
-        )
+        figure2 = figures.line(aggregatted_df['Time'], aggregatted_df['Ticket'], 'Time', 'Ticket', '#1d3746')
     elif feature == 'Quantity':
-        figure2 = px.line(aggregatted_df, x ='Time', y='Quantity',color_discrete_sequence=['#021d3a'],markers=True)
-        figure2.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd'
-        )
+        figure2 = figures.line(aggregatted_df['Time'], aggregatted_df['Quantity'], 'Time', 'Quantity', '#021d3a',
+                               overlay=forecast)
     else:
-        figure2 = px.line(aggregatted_df, x ='Time', y='AVS Per Hour',color_discrete_sequence=['#021d3a'],markers=True)
-        figure2.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd'
-        )
+        figure2 = figures.line(aggregatted_df['Time'], aggregatted_df['AVS Per Hour'], 'Time', 'AVS Per Hour', '#021d3a')
     title1 = f'{aggregator} Quantity Sales of {item} Against {aggregator} Ticket'
     title2 = f'{item}: {aggregator} {feature} Trend'
     return options, value, figure1, figure2, title1, title2
@@ -1131,90 +961,24 @@ def product_update(group, start_date, end_date, month, week, weekday, item, aggr
 @app.callback(
     Output('hourly_quantity_percent','figure'),
     Output('hourly_item_quantity_percentage','children'),
-    Input('dataset_group', 'value'),
-    Input('date-picker', 'start_date'),
-    Input('date-picker', 'end_date'),
-    Input('sidebar_month_selector', 'value'),
-    Input('sidebar_week_selector', 'value'),
-    Input('sidebar_weekday_selector','value'),
-    Input('item','value'),
-    Input('data_aggregator','value'),
-    Input('select_time', 'value')
+    Input('hours_aggregate', 'data'),
+    Input('select_time', 'value'),
+    State('item','value'),
+    State('data_aggregator','value'),
+    State('dataset_group', 'value'),
+    State('date-picker', 'start_date'),
+    State('date-picker', 'end_date'),
+    State('sidebar_month_selector', 'value'),
+    State('sidebar_week_selector', 'value'),
+    State('sidebar_weekday_selector','value'),
   )  
-def product_percent_update(group, start_date, end_date, month, week, weekday, item, aggregator, hour):
+@metrics.callback('hour_percent_by_product')
+@callback_cache.memoize('hour_percent_by_product', stored_key)
+def product_percent_update(key, hour, item, aggregator, group, start_date, end_date, month, week, weekday):
     try:    
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
-
-        date_filtered_df2 = grouped_df2[(grouped_df2['Date']>=start_date) & (grouped_df2['Date']<=end_date)]
-        
-        if not month:
-            month_filtered_df2 = date_filtered_df2
-        else:
-            try:
-                month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'] == month]
-            except ValueError:
-                month_filtered_df2 = date_filtered_df2[date_filtered_df2['Month'].isin(month)]
-        
-        if not week:
-            week_filtered_df2 = month_filtered_df2
-        else:
-            try:
-                week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'] == week]
-            except ValueError:
-                week_filtered_df2 = month_filtered_df2[month_filtered_df2['Month Weeks'].isin(week)]
-        
-        if not weekday:
-            weekday_filtered_df2 = week_filtered_df2
-        else:
-            try:
-                weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days']==weekday]
-            except ValueError:
-                weekday_filtered_df2 = week_filtered_df2[week_filtered_df2['Week Days'].isin(weekday)]
-
-        if not item:
-            item_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Items']==weekday_filtered_df2['Items'].unique()[0]]
-        else:
-            item_filtered_df2 = weekday_filtered_df2[weekday_filtered_df2['Items']==item]
-        
-        if not aggregator:
-            aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{hour}'] = 100 - aggregatted_df['Others']
-        elif aggregator == 'Average':
-            aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].mean().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{hour}'] = 100 - aggregatted_df['Others']
-        elif aggregator == 'Minimum':
-            aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].min().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{hour}'] = 100 - aggregatted_df['Others']
-        elif aggregator == 'Maximum':
-            aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].max().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{hour}'] = 100 - aggregatted_df['Others']
-        else:
-            aggregatted_df = item_filtered_df2.groupby('Time')[['Quantity','Ticket','Sales','AVS Per Hour']].sum().reset_index()
-            aggregatted_df = aggregatted_df.dropna()
-            aggregatted_df = aggregatted_df[~(aggregatted_df==0).any(axis=1)]
-            aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
-            aggregatted_df[f'{hour}'] = 100 - aggregatted_df['Others']
+        aggregatted_df = stored_frame(key, hours_aggregate, group, start_date, end_date, month, week, weekday, item, aggregator)
+        aggregatted_df['Others'] = (aggregatted_df['Quantity']/aggregatted_df['Quantity'].sum())*100
+        aggregatted_df[f'{hour}'] = 100 - aggregatted_df['Others']
 
         if not hour:
             df_ = aggregatted_df[aggregatted_df['Time'] == aggregatted_df['Time'].unique()[0]]
@@ -1226,13 +990,8 @@ def product_percent_update(group, start_date, end_date, month, week, weekday, it
             'Columns':[df_.columns[5],df_.columns[6]],
             'Value':[df_[f'{hour}'].values[0],df_['Others'].values[0]]
             })
-            figure = px.pie(df_, names='Columns', values='Value', hole=0.6,color_discrete_sequence=['rgba(29,55,70,0.7)','#021d3a'])
-            figure.update_layout(
-                paper_bgcolor='#ece1dd',
-                plot_bgcolor='#ece1dd',
-                legend=dict(orientation='h'),
-                barmode='group'
-            )
+            figure = figures.doughnut(df_['Columns'], df_['Value'], ['rgba(29,55,70,0.7)','#021d3a'],
+                                      legend=dict(orientation='h'), barmode='group')
         else:
             df_ = None
             figure = None
@@ -1245,33 +1004,19 @@ def product_percent_update(group, start_date, end_date, month, week, weekday, it
 
 # the next six callbacks will follow the same approach as in the last callabcks
 # only that two dropdowns are targeted at a time  
-@app.callback(
+#the date, month, week and weekday ones run in the browser like the sidebar's
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='comp_group_dates'),
     Output('comp_date-picker1', 'start_date'),
     Output('comp_date-picker1','end_date'),
     Output('comp_date-picker2', 'start_date'),
     Output('comp_date-picker2','end_date'),
-    Input('dataset_group','value')
+    Input('dataset_group','value'),
+    State('calendar_lookup', 'data')
 )
-def comp_dataset_filter(group):
-    if not group:
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group =='cereal_packages':
-        grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-    elif group == 'chicken_packages':
-        grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-    elif group == 'call_to_order':
-        grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-    else:
-        grouped_df2 = df2[df2['Items'].isin(others)]
-
-    start_date1 = grouped_df2['Date'].min()
-    end_date1 = grouped_df2['Date'].max()
-    start_date2 = grouped_df2['Date'].min()
-    end_date2 = grouped_df2['Date'].max()
-
-    return start_date1, end_date1, start_date2, end_date2
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='comp_months'),
     Output('comp_month_selector1', 'options'),
     Output('comp_month_selector1', 'value' ),
     Output('comp_month_selector2', 'options'),
@@ -1281,33 +1026,11 @@ def comp_dataset_filter(group):
     Input('comp_date-picker1','end_date'),
     Input('comp_date-picker2','start_date'),
     Input('comp_date-picker2','end_date'),
+    State('calendar_lookup', 'data')
 )
-def comp_date_filter(group,start_date1,end_date1,start_date2,end_date2):
-    try:    
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
-
-        date_filtered1 = grouped_df2[(grouped_df2['Date']>=start_date1) & (grouped_df2['Date']<=end_date1)]
-        date_filtered2 = grouped_df2[(grouped_df2['Date']>=start_date2) & (grouped_df2['Date']<=end_date2)]
-        
-        options1 = [{'label':val,'value':val} for val in date_filtered1['Month'].unique()]
-        value1 = date_filtered1['Month'].unique()[0]
-        options2 = [{'label':val,'value':val} for val in date_filtered2['Month'].unique()]
-        value2 = date_filtered2['Month'].unique()[0]
-
-        return options1, value1, options2, value2
-    except IndexError:
-        return dash.no_update
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='comp_weeks'),
     Output('comp_week_selector1', 'options'),
     Output('comp_week_selector1', 'value' ),
     Output('comp_week_selector2', 'options'),
@@ -1319,49 +1042,11 @@ def comp_date_filter(group,start_date1,end_date1,start_date2,end_date2):
     Input('comp_date-picker2','end_date'),
     Input('comp_month_selector1','value'),
     Input('comp_month_selector2','value'),
+    State('calendar_lookup', 'data')
 )
-def comp_month_filter(group,start_date1,end_date1,start_date2,end_date2,month1,month2):
-    try:
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
-
-        date_filtered1 = grouped_df2[(grouped_df2['Date']>=start_date1) & (grouped_df2['Date']<=end_date1)]
-        date_filtered2 = grouped_df2[(grouped_df2['Date']>=start_date2) & (grouped_df2['Date']<=end_date2)]
-        
-        if not month1:
-            month_filtered1 = date_filtered1
-        else:
-            try:
-                month_filtered1 = date_filtered1[date_filtered1['Month'] == month1]
-            except ValueError:
-                month_filtered1 = date_filtered1[date_filtered1['Month'].isin(month1)]
-        
-        if not month2:
-            month_filtered2 = date_filtered2
-        else:
-            try:
-                month_filtered2 = date_filtered2[date_filtered2['Month'] == month2]
-            except ValueError:
-                month_filtered2 = date_filtered2[date_filtered2['Month'].isin(month2)]
 
-        options1 = [{'label':val,'value':val} for val in month_filtered1['Month Weeks'].unique()]
-        value1 = month_filtered1['Month Weeks'].unique()[0]
-        options2 = [{'label':val,'value':val} for val in month_filtered2['Month Weeks'].unique()]
-        value2 = month_filtered2['Month Weeks'].unique()[0]
-
-        return options1, value1, options2, value2
-    except IndexError:
-        return dash.no_update
-
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='comp_weekdays'),
     Output('comp_weekday_selector1', 'options'),
     Output('comp_weekday_selector1', 'value' ),
     Output('comp_weekday_selector2', 'options'),
@@ -1374,64 +1059,9 @@ def comp_month_filter(group,start_date1,end_date1,start_date2,end_date2,month1,m
     Input('comp_month_selector1','value'),
     Input('comp_month_selector2','value'),
     Input('comp_week_selector1','value'),
-    Input('comp_week_selector2','value')
+    Input('comp_week_selector2','value'),
+    State('calendar_lookup', 'data')
 )
-def comp_week_filter(group,start_date1,end_date1,start_date2,end_date2,month1,month2,week1,week2):
-    try:   
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
-
-        date_filtered1 = grouped_df2[(grouped_df2['Date']>=start_date1) & (grouped_df2['Date']<=end_date1)]
-        date_filtered2 = grouped_df2[(grouped_df2['Date']>=start_date2) & (grouped_df2['Date']<=end_date2)]
-        
-        if not month1:
-            month_filtered1 = date_filtered1
-        else:
-            try:
-                month_filtered1 = date_filtered1[date_filtered1['Month'] == month1]
-            except ValueError:
-                month_filtered1 = date_filtered1[date_filtered1['Month'].isin(month1)]
-        
-        if not month2:
-            month_filtered2 = date_filtered2
-        else:
-            try:
-                month_filtered2 = date_filtered2[date_filtered2['Month'] == month2]
-            except ValueError:
-                month_filtered2 = date_filtered2[date_filtered2['Month'].isin(month2)]
-
-        if not week1:
-            week_filtered1 = month_filtered1
-        else:
-            try:
-                week_filtered1 = month_filtered1[month_filtered1['Month Weeks'] == week1]
-            except ValueError:
-                week_filtered1 = month_filtered1[month_filtered1['Month Weeks'].isin(week1)]
-
-        if not week2:
-            week_filtered2 = month_filtered2
-        else:
-            try:
-                week_filtered2 = month_filtered2[month_filtered2['Month Weeks'] == week2]
-            except ValueError:
-                week_filtered2 = month_filtered2[month_filtered2['Month Weeks'].isin(week2)]
-        
-        options1 = [{'label':val,'value':val} for val in week_filtered1['Week Days'].unique()]
-        value1 = week_filtered1['Week Days'].unique()[0]
-        options2 = [{'label':val,'value':val} for val in week_filtered2['Week Days'].unique()]
-        value2 = week_filtered2['Week Days'].unique()[0]
-        
-        return options1, value1, options2, value2
-    except IndexError:
-        return dash.no_update
 
 @app.callback(
     Output('comp_product_selector1', 'options'),
@@ -1450,79 +1080,65 @@ def comp_week_filter(group,start_date1,end_date1,start_date2,end_date2,month1,mo
     Input('comp_weekday_selector1','value'),
     Input('comp_weekday_selector2','value'),
 )
+@metrics.callback('comp_day_filter')
 def comp_day_filter(group,start_date1,end_date1,start_date2,end_date2,month1,month2,week1,week2,day1,day2):
     try:
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
+        items1 = engine.unique(FilterState.from_inputs(group, start_date1, end_date1, month1, week1, day1), 'Items')
+        items2 = engine.unique(FilterState.from_inputs(group, start_date2, end_date2, month2, week2, day2), 'Items')
 
-        date_filtered1 = grouped_df2[(grouped_df2['Date']>=start_date1) & (grouped_df2['Date']<=end_date1)]
-        date_filtered2 = grouped_df2[(grouped_df2['Date']>=start_date2) & (grouped_df2['Date']<=end_date2)]
-        
-        if not month1:
-            month_filtered1 = date_filtered1
-        else:
-            try:
-                month_filtered1 = date_filtered1[date_filtered1['Month'] == month1]
-            except ValueError:
-                month_filtered1 = date_filtered1[date_filtered1['Month'].isin(month1)]
-        
-        if not month2:
-            month_filtered2 = date_filtered2
-        else:
-            try:
-                month_filtered2 = date_filtered2[date_filtered2['Month'] == month2]
-            except ValueError:
-                month_filtered2 = date_filtered2[date_filtered2['Month'].isin(month2)]
-
-        if not week1:
-            week_filtered1 = month_filtered1
-        else:
-            try:
-                week_filtered1 = month_filtered1[month_filtered1['Month Weeks'] == week1]
-            except ValueError:
-                week_filtered1 = month_filtered1[month_filtered1['Month Weeks'].isin(week1)]
-
-        if not week2:
-            week_filtered2 = month_filtered2
-        else:
-            try:
-                week_filtered2 = month_filtered2[month_filtered2['Month Weeks'] == week2]
-            except ValueError:
-                week_filtered2 = month_filtered2[month_filtered2['Month Weeks'].isin(week2)]
-        
-        if not day1:
-            weekday_filtered1 = week_filtered1
-        else:
-            try:
-                weekday_filtered1 = week_filtered1[week_filtered1['Week Days']==day1]
-            except ValueError:
-                weekday_filtered1 = week_filtered1[week_filtered1['Week Days'].isin(day1)]    
-
-        if not day2:
-            weekday_filtered2 = week_filtered2
-        else:
-            try:
-                weekday_filtered2 = week_filtered2[week_filtered2['Week Days']==day2]
-            except ValueError:
-                weekday_filtered2 = week_filtered2[week_filtered1['Week Days'].isin(day2)]    
-
-        options1 = [{'label':val,'value':val} for val in weekday_filtered1['Items'].unique()]
-        value1 = weekday_filtered1['Items'].unique()[0]
-        options2 = [{'label':val,'value':val} for val in weekday_filtered2['Items'].unique()]
-        value2 = weekday_filtered2['Items'].unique()[2]
+        options1 = [{'label':val,'value':val} for val in items1]
+        value1 = items1[0]
+        options2 = [{'label':val,'value':val} for val in items2]
+        value2 = items2[2]
         
         return options1, value1, options2, value2
     except IndexError:
         return dash.no_update
 
+#save the filters of one comparison column as a window, the chart keeps it next to the two columns
+@app.callback(
+    Output('comp_window_specs', 'data'),
+    Output('comp_windows', 'options'),
+    Output('comp_windows', 'value'),
+    Input('comp_add_window1', 'n_clicks'),
+    Input('comp_add_window2', 'n_clicks'),
+    State('comp_date-picker1','start_date'),
+    State('comp_date-picker1','end_date'),
+    State('comp_month_selector1','value'),
+    State('comp_week_selector1','value'),
+    State('comp_weekday_selector1','value'),
+    State('comp_product_selector1','value'),
+    State('comp_date-picker2','start_date'),
+    State('comp_date-picker2','end_date'),
+    State('comp_month_selector2','value'),
+    State('comp_week_selector2','value'),
+    State('comp_weekday_selector2','value'),
+    State('comp_product_selector2','value'),
+    State('comp_window_specs', 'data'),
+    State('comp_windows', 'value'),
+    prevent_initial_call=True
+)
+@metrics.callback('save_comp_window')
+def save_comp_window(clicks1, clicks2, start_date1, end_date1, month1, week1, day1, product1,
+                     start_date2, end_date2, month2, week2, day2, product2, specs, shown):
+    if dash.ctx.triggered_id == 'comp_add_window1':
+        filters = (product1, start_date1, end_date1, month1, week1, day1)
+    else:
+        filters = (product2, start_date2, end_date2, month2, week2, day2)
+    if not filters[0]:
+        return dash.no_update
+    specs, shown = list(specs or []), list(shown or [])
+    spec = window_spec(len(specs) + 1, *filters)
+    #saving the same filters twice shows the window saved first
+    same = [saved for saved in specs if window_filters(saved) == window_filters(spec)]
+    if same:
+        spec = same[0]
+    else:
+        specs.append(spec)
+    if spec['id'] not in shown:
+        shown.append(spec['id'])
+    return specs, [{'label': saved['label'], 'value': saved['id']} for saved in specs], shown
+
 @app.callback(
     Output('comp_plot', 'figure' ),
     Output('comp_plot_title','children'),
@@ -1540,132 +1156,30 @@ def comp_day_filter(group,start_date1,end_date1,start_date2,end_date2,month1,mon
     Input('comp_product_selector1','value'),
     Input('comp_product_selector2','value'),
     Input('data_aggregator','value'),
+    Input('comp_windows','value'),
+    State('comp_window_specs','data'),
 )
-def comp_plotter(group,start_date1,end_date1,start_date2,end_date2,month1,month2,week1,week2,day1,day2,product1,product2,aggregator):
+@metrics.callback('comp_plotter')
+@callback_cache.memoize('comp_plotter', comp_key)
+def comp_plotter(group,start_date1,end_date1,start_date2,end_date2,month1,month2,week1,week2,day1,day2,product1,product2,aggregator,shown=None,specs=None):
     try:    
-        if not group:
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group =='cereal_packages':
-            grouped_df2 = df2[df2['Items'].isin(cereal_packages)]
-        elif group == 'chicken_packages':
-            grouped_df2 = df2[df2['Items'].isin(chicken_packages)]
-        elif group == 'call_to_order':
-            grouped_df2 = df2[df2['Items'].isin(call_to_order)]
-        else:
-            grouped_df2 = df2[df2['Items'].isin(others)]
-
-        date_filtered1 = grouped_df2[(grouped_df2['Date']>=start_date1) & (grouped_df2['Date']<=end_date1)]
-        date_filtered2 = grouped_df2[(grouped_df2['Date']>=start_date2) & (grouped_df2['Date']<=end_date2)]
-        
-        if not month1:
-            month_filtered1 = date_filtered1
-        else:
-            try:
-                month_filtered1 = date_filtered1[date_filtered1['Month'] == month1]
-            except ValueError:
-                month_filtered1 = date_filtered1[date_filtered1['Month'].isin(month1)]
-        
-        if not month2:
-            month_filtered2 = date_filtered2
-        else:
-            try:
-                month_filtered2 = date_filtered2[date_filtered2['Month'] == month2]
-            except ValueError:
-                month_filtered2 = date_filtered2[date_filtered2['Month'].isin(month2)]
-
-        if not week1:
-            week_filtered1 = month_filtered1
-        else:
-            try:
-                week_filtered1 = month_filtered1[month_filtered1['Month Weeks'] == week1]
-            except ValueError:
-                week_filtered1 = month_filtered1[month_filtered1['Month Weeks'].isin(week1)]
-
-        if not week2:
-            week_filtered2 = month_filtered2
-        else:
-            try:
-                week_filtered2 = month_filtered2[month_filtered2['Month Weeks'] == week2]
-            except ValueError:
-                week_filtered2 = month_filtered2[month_filtered2['Month Weeks'].isin(week2)]
-        
-        if not day1:
-            weekday_filtered1 = week_filtered1
-        else:
-            try:
-                weekday_filtered1 = week_filtered1[week_filtered1['Week Days']==day1]
-            except ValueError:
-                weekday_filtered1 = week_filtered1[week_filtered1['Week Days'].isin(day1)]    
-
-        if not day2:
-            weekday_filtered2 = week_filtered2
-        else:
-            try:
-                weekday_filtered2 = week_filtered2[week_filtered2['Week Days']==day2]
-            except ValueError:
-                weekday_filtered2 = week_filtered2[week_filtered1['Week Days'].isin(day2)]    
-
-        if not product1:
-            product_filtered1 = weekday_filtered1[weekday_filtered1['Items']==weekday_filtered1['Items'].unique()[0]]
-        else:
-            product_filtered1 = weekday_filtered1[weekday_filtered1['Items']==product1]
-
-        if not product2:
-            product_filtered2 = weekday_filtered2[weekday_filtered2['Items']==weekday_filtered2['Items'].unique()[0]]
-        else:
-            product_filtered2 = weekday_filtered2[weekday_filtered2['Items']==product2]
-        
-        if not aggregator:
-            aggregatted_df1 = product_filtered1.groupby('Time')[['Quantity']].mean().reset_index()
-            # aggregatted_df1 = aggregatted_df1.dropna()
-            # aggregatted_df1 = aggregatted_df1[~(aggregatted_df1==0).any(axis=1)]
-            aggregatted_df2 = product_filtered2.groupby('Time')[['Quantity']].mean().reset_index()
-            # aggregatted_df2 = aggregatted_df2.dropna()
-            # aggregatted_df2 = aggregatted_df2[~(aggregatted_df2==0).any(axis=1)]
-
-        elif aggregator == 'Average':
-            aggregatted_df1 = product_filtered1.groupby('Time')[['Quantity']].mean().reset_index()
-            # aggregatted_df1 = aggregatted_df1.dropna()
-            # aggregatted_df1 = aggregatted_df1[~(aggregatted_df1==0).any(axis=1)]
-            aggregatted_df2 = product_filtered2.groupby('Time')[['Quantity']].mean().reset_index()
-            # aggregatted_df2 = aggregatted_df2.dropna()
-            # aggregatted_df2 = aggregatted_df2[~(aggregatted_df2==0).any(axis=1)]
-        elif aggregator == 'Minimum':
-            aggregatted_df1 = product_filtered1.groupby('Time')[['Quantity']].min().reset_index()
-            # aggregatted_df1 = aggregatted_df1.dropna()
-            # aggregatted_df1 = aggregatted_df1[~(aggregatted_df1==0).any(axis=1)]
-            aggregatted_df2 = product_filtered2.groupby('Time')[['Quantity']].min().reset_index()
-            # aggregatted_df2 = aggregatted_df2.dropna()
-            # aggregatted_df2 = aggregatted_df2[~(aggregatted_df2==0).any(axis=1)]
-        elif aggregator == 'Maximum':
-            aggregatted_df1 = product_filtered1.groupby('Time')[['Quantity']].max().reset_index()
-            # aggregatted_df1 = aggregatted_df1.dropna()
-            # aggregatted_df1 = aggregatted_df1[~(aggregatted_df1==0).any(axis=1)]
-            aggregatted_df2 = product_filtered2.groupby('Time')[['Quantity']].max().reset_index()
-            # aggregatted_df2 = aggregatted_df2.dropna()
-            # aggregatted_df2 = aggregatted_df2[~(aggregatted_df2==0).any(axis=1)]
-        else:
-            aggregatted_df1 = product_filtered1.groupby('Time')[['Quantity']].sum().reset_index()
-            # aggregatted_df1 = aggregatted_df1.dropna()
-            # aggregatted_df1 = aggregatted_df1[~(aggregatted_df1==0).any(axis=1)]
-            aggregatted_df2 = product_filtered2.groupby('Time')[['Quantity']].sum().reset_index()
-            # aggregatted_df2 = aggregatted_df2.dropna()
-            # aggregatted_df2 = aggregatted_df2[~(aggregatted_df2==0).any(axis=1)]
-
-        df_ = pd.merge(aggregatted_df1,aggregatted_df2, on='Time', suffixes=(f' Of {product1} (Left Filter)', f' Of {product2} (Right Filter)'), how='outer').fillna(0)
-
-        
-        figure = px.bar(df_, x='Time', y=[f'Quantity Of {product1} (Left Filter)', f'Quantity Of {product2} (Right Filter)'],
-                color_discrete_map={f'Quantity Of {product1} (Left Filter)' : 'rgba(29,55,70,0.7)',  f'Quantity Of {product2} (Right Filter)': '#021d3a'},
-                barmode='group')
-        figure.update_layout(
-            paper_bgcolor='#ece1dd',
-            legend_title='',
-            plot_bgcolor='#ece1dd',
-            legend=dict(orientation='h',yanchor='bottom',y=1.02,xanchor='right',x=1),
-            barmode='group'
-        )
-        title = f'Comparing {product1} And {product2}'   
+        state1 = FilterState.from_inputs(group, start_date1, end_date1, month1, week1, day1)
+        state2 = FilterState.from_inputs(group, start_date2, end_date2, month2, week2, day2)
+
+        #the two columns and the saved windows, aggregated together
+        windows = [
+            Window(f'Quantity Of {product1} (Left Filter)', state1, product1 or engine.unique(state1, 'Items')[0]),
+            Window(f'Quantity Of {product2} (Right Filter)', state2, product2 or engine.unique(state2, 'Items')[0]),
+            *saved_windows(group, shown, specs),
+        ]
+        df_ = compare(aggregates, windows, aggregator)
+
+        series = {window.name: (df_[window.name], COLORS[i % len(COLORS)]) for i, window in enumerate(windows)}
+        figure = figures.grouped_bar(df_['Time'], series, 'Time',
+                legend=dict(title=dict(text=''),orientation='h',yanchor='bottom',y=1.02,xanchor='right',x=1))
+        title = f'Comparing {product1} And {product2}'
+        if len(windows) > 2:
+            title += f' With {len(windows) - 2} Saved Window{"s" if len(windows) > 3 else ""}'
         return figure, title
     except ValueError:
         return dash.no_update
@@ -1675,26 +1189,136 @@ def comp_plotter(group,start_date1,end_date1,start_date2,end_date2,month1,month2
     Output('scatter_plot_title','children'),
     Input('feature1','value'),
     Input('feature2','value'),
+    Input('correlation_view','value'),
 )    
-def scatter_plot(feature1, feature2):
+@metrics.callback('scatter_plot')
+@callback_cache.memoize('scatter_plot', lambda feature1, feature2, view='Auto': (feature1, feature2, view))
+def scatter_plot(feature1, feature2, view='Auto'):
     if not ((feature1) or (feature2)):
-        figure = px.scatter(df_, x = 'Ticket', y = 'AVS Per Hour')
-        figure.update_layout(
-            paper_bgcolor='#ece1dd',
-            plot_bgcolor='#ece1dd'
-        )
+        feature1_, feature2_, color, marker_size = 'Ticket', 'AVS Per Hour', figures.DEFAULT_COLOR, None
     else:
-        figure = px.scatter(df_, x=feature1, y=feature2,color_discrete_sequence=['rgba(29,55,70,0.7)','#021d3a'])
-        figure.update_layout(
-            paper_bgcolor='#ece1dd',
-            plot_bgcolor='#ece1dd'
-        )
-        figure.update_traces(
-            marker=dict(size=10)
-        )
+        #a feature left empty plots against the row numbers, as px did
+        feature1_, feature2_, color, marker_size = feature1 or INDEX, feature2 or INDEX, 'rgba(29,55,70,0.7)', 10
+    if view == 'Density' or (view != 'Points' and len(df_) > config.CORRELATION_BIN_POINTS):
+        #a few thousand cells instead of a point per hour
+        counts, x_edges, y_edges = correlation_explorer().density(feature1_, feature2_)
+        figure = figures.density(counts, x_edges, y_edges, feature1_, feature2_)
+    else:
+        x = df_.index if feature1_ == INDEX else df_[feature1_]
+        y = df_.index if feature2_ == INDEX else df_[feature2_]
+        figure = figures.scatter(x, y, feature1_, feature2_, color, marker_size=marker_size)
     title = f'Correlation Between {feature1} And {feature2}'
     return figure, title
 
-#run the app
+#plot the correlation matrix of every feature, computed once per version of the data
+@app.callback(
+    Output('correlation_matrix','figure'),
+    Output('correlation_matrix_title','children'),
+    Input('correlation_method','value'),
+)
+@metrics.callback('correlation_matrix')
+@callback_cache.memoize('correlation_matrix', lambda method: (method,))
+def correlation_matrix(method):
+    method = method if method in METHODS else METHODS[0]
+    explorer = correlation_explorer()
+    figure = figures.correlation_matrix(explorer.matrix(method), explorer.columns, method)
+    title = f'{method} Correlation Between Every Feature'
+    return figure, title
+
+#the comparison chart's frame, its windows given as (name, FilterState, product)
+def comparison_frame(group, windows, aggregator):
+    return compare(aggregates, [Window(name, state, product or engine.unique(state, 'Items')[0])
+                                for name, state, product in windows], aggregator)
+
+#the filtered rows with their date labels, read from the engine a chunk at a time
+def filtered_rows(state, hour, item):
+    current = engine
+    for rows in current.frames(state, hour, item, config.EXPORT_CHUNK_ROWS):
+        yield labelled_rows(rows, current.calendar)
+
+#the aggregates and rows for other tools and the export links, read-only and through the same store
+#as the charts (see api.py)
+api.install(server, aggregate_store, {
+    'items': ('items_aggregate', 'hour', items_aggregate),
+    'hours': ('hours_aggregate', 'item', hours_aggregate),
+}, comparison_frame, filtered_rows)
+
+#the export links follow the filters, the files are streamed by the API
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='rows_export'),
+    Output('rows_export_csv', 'href'),
+    Output('rows_export_parquet', 'href'),
+    Input('dataset_group', 'value'),
+    Input('date-picker', 'start_date'),
+    Input('date-picker', 'end_date'),
+    Input('sidebar_month_selector', 'value'),
+    Input('sidebar_week_selector', 'value'),
+    Input('sidebar_weekday_selector','value'),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='items_export'),
+    Output('items_export_csv', 'href'),
+    Output('items_export_parquet', 'href'),
+    Input('dataset_group', 'value'),
+    Input('date-picker', 'start_date'),
+    Input('date-picker', 'end_date'),
+    Input('sidebar_month_selector', 'value'),
+    Input('sidebar_week_selector', 'value'),
+    Input('sidebar_weekday_selector','value'),
+    Input('hour','value'),
+    Input('data_aggregator','value'),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='qsr', function_name='comp_export'),
+    Output('comp_export_csv', 'href'),
+    Output('comp_export_parquet', 'href'),
+    Input('dataset_group','value'),
+    Input('comp_date-picker1','start_date'),
+    Input('comp_date-picker1','end_date'),
+    Input('comp_date-picker2','start_date'),
+    Input('comp_date-picker2','end_date'),
+    Input('comp_month_selector1','value'),
+    Input('comp_month_selector2','value'),
+    Input('comp_week_selector1','value'),
+    Input('comp_week_selector2','value'),
+    Input('comp_weekday_selector1','value'),
+    Input('comp_weekday_selector2','value'),
+    Input('comp_product_selector1','value'),
+    Input('comp_product_selector2','value'),
+    Input('data_aggregator','value'),
+    Input('comp_windows','value'),
+    State('comp_window_specs','data'),
+)
+
+#hit and miss counters of the callback cache, with the other metrics when QSR_METRICS=1
+@app.server.route('/_cache/stats')
+def cache_stats():
+    if not config.METRICS:
+        return flask.Response('metrics are off, set QSR_METRICS=1\n', status=404, mimetype='text/plain')
+    stats = callback_cache.stats()
+    if config.STORAGE == 'partitioned':
+        stats['partitions'] = engine.cache.stats()
+    return flask.jsonify(stats)
+
+#deep memory of the data this worker holds, in the order it is built from (an engine's share of
+#a frame is counted under the frame), and the allocation peaks of the traced callback requests
+@app.server.route('/_memory')
+def memory_report():
+    if not config.MEMORY_ENDPOINT:
+        return flask.Response('the memory report is off, set QSR_MEMORY_ENDPOINT=1\n', status=404, mimetype='text/plain')
+    return flask.jsonify(memory.report({
+        'df1': df1, 'df_': df_, 'df2': df2, 'engine': engine, 'aggregates': aggregates,
+        'correlations': correlations, 'forecasts': forecasts, 'callback_cache': callback_cache, 'aggregate_store': aggregate_store,
+    }))
+
+#whether this worker can take traffic, for the load balancer or orchestrator in front of the workers. The
+#data is loaded and indexed at import (in the master, with gunicorn's preload), before any route is served
+@app.server.route('/_ready')
+def readiness():
+    return flask.jsonify({'ready': True, 'version': data_version, 'rows': engine.size})
+
+#run the development server, production serves app:server with gunicorn (see gunicorn.conf.py)
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    app.run_server(debug=config.DEBUG)
\ No newline at end of file
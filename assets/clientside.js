@@ -0,0 +1,196 @@
+//callbacks that only shuffle class names and dropdown options run in the browser
+//the cascades read the calendar lookup shipped once in the 'calendar_lookup' store (built by
+//FilterEngine.calendar_lookup) and mirror FilterEngine.unique: the labels of the dates that pass the
+//filters, in order of appearance
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    qsr: (function () {
+        //an empty group defaults to cereal packs, an unknown one is others
+        function group_of(lookup, group) {
+            if (!group) {
+                return lookup.default;
+            }
+            return lookup.groups.hasOwnProperty(group) ? group : 'others';
+        }
+
+        //date picker values come as '2022-01-31' or '2022-01-31T00:00:00'
+        function day_of(value) {
+            return value ? String(value).slice(0, 10) : null;
+        }
+
+        //nothing selected lets every value through
+        function selection_of(value) {
+            if (!value || value.length === 0) {
+                return null;
+            }
+            return typeof value === 'string' ? [value] : value;
+        }
+
+        function unique(lookup, group, start_date, end_date, month, week, column) {
+            var entry = lookup.groups[group_of(lookup, group)];
+            if (!entry) {
+                return [];
+            }
+            var start = day_of(start_date);
+            var end = day_of(end_date);
+            var filters = [['Month', selection_of(month)], ['Month Weeks', selection_of(week)]];
+            var dates = entry.dates || lookup.dates.map(function (date, i) { return i; });
+            var codes = lookup.codes[column];
+            var labels = lookup.labels[column];
+            var seen = {};
+            var found = [];
+            dates.forEach(function (i) {
+                var date = lookup.dates[i];
+                if ((start && date < start) || (end && date > end)) {
+                    return;
+                }
+                for (var f = 0; f < filters.length; f++) {
+                    var values = filters[f][1];
+                    if (values && values.indexOf(lookup.labels[filters[f][0]][lookup.codes[filters[f][0]][i]]) < 0) {
+                        return;
+                    }
+                }
+                if (!seen[codes[i]]) {
+                    seen[codes[i]] = true;
+                    found.push(labels[codes[i]]);
+                }
+            });
+            return found;
+        }
+
+        function options(values) {
+            return values.map(function (value) { return {label: value, value: value}; });
+        }
+
+        //the sidebar dropdowns select every label they offer
+        function select_all(values) {
+            return [options(values), values.slice()];
+        }
+
+        //the comparison dropdowns select the first one, and keep their values when a side has none
+        function select_first(values1, values2) {
+            if (values1.length === 0 || values2.length === 0) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return [options(values1), values1[0], options(values2), values2[0]];
+        }
+
+        //the query string of an export link, the empty filters left out and the multi-value ones repeated
+        function query_string(params) {
+            var parts = [];
+            params.forEach(function (pair) {
+                var values = pair[1];
+                if (values === null || values === undefined || values === '') {
+                    return;
+                }
+                (Array.isArray(values) ? values : [values]).forEach(function (value) {
+                    parts.push(encodeURIComponent(pair[0]) + '=' + encodeURIComponent(value));
+                });
+            });
+            return parts.join('&');
+        }
+
+        //the CSV and Parquet links of a query of the API (api.py)
+        function export_links(path, params) {
+            var query = query_string(params);
+            return ['csv', 'parquet'].map(function (format) {
+                return path + '?' + (query ? query + '&' : '') + 'format=' + format;
+            });
+        }
+
+        function filter_params(group, start_date, end_date, month, week, weekday) {
+            return [['group', group], ['start_date', day_of(start_date)], ['end_date', day_of(end_date)],
+                    ['month', month], ['week', week], ['weekday', weekday]];
+        }
+
+        //a comparison window as the API reads it, named like its series in the chart
+        function window_of(name, product, start_date, end_date, month, week, weekday) {
+            return JSON.stringify({name: name, product: product, start_date: day_of(start_date),
+                                   end_date: day_of(end_date), month: month, week: week, weekday: weekday});
+        }
+
+        return {
+            toggle_sidebar: function (n_clicks) {
+                if (n_clicks % 2 === 1) {
+                    return ['open', 'fa-solid fa-xmark fa-xl', 'active'];
+                }
+                return ['', 'fa-solid fa-bars fa-xl', ''];
+            },
+
+            //the first and last day of the data, for the three date pickers
+            date_bounds: function (lookup) {
+                return [lookup.start, lookup.end, lookup.start, lookup.end, lookup.start, lookup.end];
+            },
+
+            group_dates: function (group, lookup) {
+                var entry = lookup.groups[group_of(lookup, group)];
+                if (!entry) {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                return [entry.start, entry.end];
+            },
+
+            comp_group_dates: function (group, lookup) {
+                var entry = lookup.groups[group_of(lookup, group)];
+                if (!entry) {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                return [entry.start, entry.end, entry.start, entry.end];
+            },
+
+            months: function (group, start_date, end_date, lookup) {
+                return select_all(unique(lookup, group, start_date, end_date, null, null, 'Month'));
+            },
+
+            weeks: function (group, start_date, end_date, month, lookup) {
+                return select_all(unique(lookup, group, start_date, end_date, month, null, 'Month Weeks'));
+            },
+
+            weekdays: function (group, start_date, end_date, month, week, lookup) {
+                return select_all(unique(lookup, group, start_date, end_date, month, week, 'Week Days'));
+            },
+
+            comp_months: function (group, start_date1, end_date1, start_date2, end_date2, lookup) {
+                return select_first(
+                    unique(lookup, group, start_date1, end_date1, null, null, 'Month'),
+                    unique(lookup, group, start_date2, end_date2, null, null, 'Month'));
+            },
+
+            comp_weeks: function (group, start_date1, end_date1, start_date2, end_date2, month1, month2, lookup) {
+                return select_first(
+                    unique(lookup, group, start_date1, end_date1, month1, null, 'Month Weeks'),
+                    unique(lookup, group, start_date2, end_date2, month2, null, 'Month Weeks'));
+            },
+
+            comp_weekdays: function (group, start_date1, end_date1, start_date2, end_date2,
+                                     month1, month2, week1, week2, lookup) {
+                return select_first(
+                    unique(lookup, group, start_date1, end_date1, month1, week1, 'Week Days'),
+                    unique(lookup, group, start_date2, end_date2, month2, week2, 'Week Days'));
+            },
+
+            rows_export: function (group, start_date, end_date, month, week, weekday) {
+                return export_links('api/v1/rows', filter_params(group, start_date, end_date, month, week, weekday));
+            },
+
+            items_export: function (group, start_date, end_date, month, week, weekday, hour, aggregator) {
+                return export_links('api/v1/items', filter_params(group, start_date, end_date, month, week, weekday)
+                    .concat([['hour', hour], ['aggregator', aggregator]]));
+            },
+
+            comp_export: function (group, start_date1, end_date1, start_date2, end_date2, month1, month2,
+                                   week1, week2, day1, day2, product1, product2, aggregator, shown, specs) {
+                var windows = [
+                    window_of('Quantity Of ' + product1 + ' (Left Filter)', product1, start_date1, end_date1, month1, week1, day1),
+                    window_of('Quantity Of ' + product2 + ' (Right Filter)', product2, start_date2, end_date2, month2, week2, day2)
+                ];
+                (specs || []).forEach(function (spec) {
+                    if ((shown || []).indexOf(spec.id) >= 0) {
+                        windows.push(window_of('Quantity Of ' + spec.product + ' (' + spec.name + ')', spec.product,
+                                               spec.start_date, spec.end_date, spec.month, spec.week, spec.weekday));
+                    }
+                });
+                return export_links('api/v1/comparison', [['group', group], ['aggregator', aggregator], ['window', windows]]);
+            }
+        };
+    })()
+});
@@ -0,0 +1,82 @@
+#the section producers as Dash background callbacks, off unless QSR_BACKGROUND_CALLBACKS=1
+#with a long date range over a large group the producers hold a request thread for the whole
+#aggregation, and a result nobody waits for anymore still runs to its end. Run in the background, a
+#producer's job is a process forked from the worker (the data is shared copy-on-write) whose result
+#and progress pass through a diskcache folder, no broker needed, while the page polls for them. The
+#renderer sends the id of a job still running with the next request of the same callback, and Dash
+#terminates that job: a newer input from the same page cancels the stale aggregation. The jobs store
+#their frames in aggregate_store from another process, so it then needs its shared folder (config.py
+#gives it one). The producers report their steps with progress(), shown in the charts' loading areas.
+#Without the packages the manager needs, the error is logged and the producers run in the foreground
+import functools
+import logging
+import threading
+
+from dash.dependencies import Output
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ENABLED = config.BACKGROUND_CALLBACKS
+
+#the progress callback of the job the current thread runs, None outside of them
+_current = threading.local()
+
+
+def manager(directory=config.BACKGROUND_DIR, expire=config.BACKGROUND_EXPIRE):
+    """A DiskcacheManager keeping the jobs' results and progress in directory."""
+    import diskcache
+    from dash import DiskcacheManager
+
+    return DiskcacheManager(diskcache.Cache(directory), expire=expire)
+
+
+_manager = None
+if ENABLED:
+    try:
+        _manager = manager()
+    except ImportError as error:
+        #a worker still serves the dashboard, with the producers in the request threads as with the flag off
+        logger.error('QSR_BACKGROUND_CALLBACKS=1 needs dash[diskcache] (diskcache, multiprocess and psutil), '
+                     'running the section producers in the foreground: %s', error)
+        ENABLED = False
+
+
+def callback_options(section):
+    """The app.callback keywords that run a section's producer in the background, none when it is off.
+
+    The section's layout holds a {section}_progress container with a {section}_progress_bar and
+    a {section}_progress_label, shown while the job runs.
+    """
+    if not ENABLED:
+        return {}
+    return {
+        'background': True,
+        'manager': _manager,
+        'progress': [Output(f'{section}_progress_bar', 'value'), Output(f'{section}_progress_bar', 'max'),
+                     Output(f'{section}_progress_label', 'children')],
+        'progress_default': [0, 1, ''],
+        'running': [(Output(f'{section}_progress', 'style'), {'display': 'flex'}, {'display': 'none'})],
+    }
+
+
+def reports_progress(func):
+    """Hand the progress callback Dash passes a background job to progress(); goes under @app.callback."""
+    if not ENABLED:
+        return func
+    @functools.wraps(func)
+    def wrapper(set_progress, *args):
+        _current.report = set_progress
+        try:
+            return func(*args)
+        finally:
+            _current.report = None
+    return wrapper
+
+
+def progress(done, total, label):
+    """Report that done of total steps of the running job are finished, label naming the next one."""
+    report = getattr(_current, 'report', None)
+    if report is not None:
+        report((done, total, label))
@@ -0,0 +1,443 @@
+#callback latency benchmark: replays interaction traces against the app's own callbacks
+#A trace is a JSON lines file, one interaction per line: the dropdowns, pickers and radios it sets,
+#{"group": "others", "start_date": "2022-03-01", "end_date": "2022-03-31"}. Each interaction runs the
+#server callbacks the browser would trigger, feeding the values they choose for the dependent
+#dropdowns back into the next ones like Dash does, and every call is timed and measured.
+#Synthetic traces walk every product group, aggregator and date-range size; scaled datasets
+#repeat the workbook's days with some noise, written to their own dataset cache as ingested batches.
+#
+#    python benchmark.py generate --scale 10
+#    python benchmark.py run --scale 10 --interactions 300 --save-baseline baseline.json
+#    python benchmark.py run --scale 10 --baseline baseline.json    (exits with 1 on a regression)
+#
+#A callback that raises anything but PreventUpdate is counted, not timed, and makes the run exit with 1
+#
+#config and the app read the environment when imported, so they are only imported once the command
+#line has chosen the dataset cache
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+#the size of the date ranges the synthetic traces pick, in days, None for everything
+RANGE_DAYS = {'day': 1, 'week': 7, 'month': 31, 'quarter': 92, 'year': 365, 'all': None}
+
+AGGREGATORS = ['Average', 'Minimum', 'Maximum', 'Total', 'Median', 'P90', None]
+
+#the callbacks measured, in the order an interaction can run them
+CALLBACKS = {
+    'weekday_filter': 'hour.options',
+    'items_aggregate': 'items_aggregate.data',
+    'hourly_update': 'products_by_hour.figure',
+    'item_percentage': 'percentage_item_by_hour.figure',
+    'hours_aggregate': 'hours_aggregate.data',
+    'product_update': 'bobble_chart.figure',
+    'hour_percentage': 'hourly_quantity_percent.figure',
+    'comp_day_filter': 'comp_product_selector1.options',
+    'comp_plotter': 'comp_plot.figure',
+    'scatter_plot': 'scatter_plot.figure',
+    'correlation_matrix': 'correlation_matrix.figure',
+}
+
+SIDEBAR = ('group', 'start_date', 'end_date', 'month', 'week', 'weekday')
+COMPARISON = ('start_date1', 'end_date1', 'start_date2', 'end_date2',
+              'month1', 'month2', 'week1', 'week2', 'day1', 'day2')
+
+
+def scaled_cache_dir(scale):
+    import config
+    return os.path.join(config.CACHE_DIR, 'bench', f'x{scale}')
+
+
+def generate(cache_dir, scale, seed=0):
+    """Write a dataset cache holding the workbook's days repeated scale times, return its folder.
+
+    Each repetition comes after the last, shifted by whole weeks so the weekdays keep their pattern,
+    with every quantity, ticket count and sales figure scaled by some noise. They are built a
+    repetition at a time and written as ingested batches, so no step holds more than the workbook's rows.
+    """
+    import config
+    from dataset import build_frames, load_dataset, read_manifest, write_batch
+
+    df1 = load_dataset(config.DATASET_PATH, cache_dir, frames=('df1',))[0]
+    done = len(read_manifest(cache_dir).get('batches', []))
+    dates = pd.to_datetime(df1['Date'], dayfirst=True)
+    weeks = ((dates.max() - dates.min()).days // 7 + 1) * 7
+    numbers = [column for column in df1.columns if column not in ('Date', 'Time')]
+    for repetition in range(done + 1, scale):
+        start = time.perf_counter()
+        rng = np.random.default_rng([seed, repetition])
+        batch = df1.copy()
+        batch['Date'] = (dates + pd.Timedelta(days=weeks * repetition)).dt.strftime('%d-%m-%Y')
+        noise = rng.lognormal(0.0, 0.15, size=(len(batch), len(numbers)))
+        #the hour's ticket count and sales move together, AVS Per Hour stays plausible
+        noise[:, numbers.index('Sales')] = noise[:, numbers.index('Ticket')]
+        values = batch[numbers].to_numpy(dtype=np.float64) * noise
+        items = [i for i, column in enumerate(numbers) if column not in ('Ticket', 'Sales')]
+        values[:, items] = np.round(values[:, items])
+        values[:, numbers.index('Ticket')] = np.maximum(np.round(values[:, numbers.index('Ticket')]), 1)
+        batch[numbers] = values
+        df_, df2, _ = build_frames(batch)
+        write_batch(cache_dir, {
+            'source': f'synthetic x{scale}, repetition {repetition}',
+            'sha256': hashlib.sha256(f'synthetic {scale} {seed} {repetition}'.encode()).hexdigest(),
+            'rows': len(batch),
+            'ingested': time.time(),
+        }, {'df1': batch, 'df_': df_, 'df2': df2})
+        print(f'repetition {repetition} of {scale - 1}: {len(batch)} rows in {time.perf_counter() - start:.1f}s')
+    return cache_dir
+
+
+def synthetic_trace(app, interactions, seed=0):
+    """Return a random walk over the dashboard's controls, weighted like a visitor's session."""
+    from dataset import GROUPS
+    from filters import FilterState
+
+    rng = random.Random(seed)
+    first = date.fromisoformat(app.calendar['start'])
+    last = date.fromisoformat(app.calendar['end'])
+    features = [str(column) for column in app.df_.columns]
+
+    def date_range():
+        size = RANGE_DAYS[rng.choice(list(RANGE_DAYS))]
+        if size is None or size > (last - first).days:
+            return first.isoformat(), last.isoformat()
+        start = first + timedelta(days=rng.randrange((last - first).days - size + 1))
+        return start.isoformat(), (start + timedelta(days=size - 1)).isoformat()
+
+    group = None
+    trace = []
+    for _ in range(interactions):
+        kind = rng.choices(['group', 'dates', 'aggregator', 'hour', 'item', 'feature', 'comparison', 'correlation'],
+                           weights=[2, 4, 2, 2, 2, 1, 2, 1])[0]
+        if kind == 'group':
+            group = rng.choice(list(GROUPS))
+            trace.append({'group': group, 'start_date': None, 'end_date': None})
+        elif kind == 'dates':
+            #the weekdays are picked among the range's, like the weekday dropdown's options; a range
+            #without rows is drawn again, the page has no selection to offer for it
+            weekdays = []
+            while not weekdays:
+                start_date, end_date = date_range()
+                weekdays = app.engine.unique(FilterState.from_inputs(group, start_date, end_date), 'Week Days')
+            weekend = [day for day in weekdays if day in ('Saturday', 'Sunday')]
+            trace.append({'start_date': start_date, 'end_date': end_date,
+                          'weekday': rng.choice([None, None, weekend or None, [rng.choice(weekdays)]])})
+        elif kind == 'aggregator':
+            trace.append({'aggregator': rng.choice(AGGREGATORS)})
+        elif kind == 'hour':
+            hour = rng.randrange(7, 24)
+            trace.append({'hour': f'{hour:02d} to {hour + 1:02d}'})
+        elif kind == 'item':
+            trace.append({'item': rng.choice(rng.choice(list(GROUPS.values())))})
+        elif kind == 'feature':
+            trace.append({'feature': rng.choice(['Quantity', 'Sales', 'Ticket', 'AVS Per Hour'])})
+        elif kind == 'comparison':
+            (start_date1, end_date1), (start_date2, end_date2) = date_range(), date_range()
+            trace.append({'start_date1': start_date1, 'end_date1': end_date1,
+                          'start_date2': start_date2, 'end_date2': end_date2})
+        else:
+            trace.append({'feature1': rng.choice(features), 'feature2': rng.choice(features),
+                          'method': rng.choice(['Pearson', 'Spearman'])})
+    return trace
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_trace(path, trace):
+    with open(path, 'w') as f:
+        for interaction in trace:
+            f.write(json.dumps(interaction) + '\n')
+
+
+class Replay:
+    """Runs interactions against the app's callbacks, measuring each call."""
+
+    def __init__(self, app, memory=False, warm=False):
+        from dash import no_update
+        from dash.exceptions import PreventUpdate
+
+        self.app = app
+        self.memory = memory
+        self.warm = warm
+        self.no_update = no_update
+        self.prevent_update = PreventUpdate
+        self.samples = {name: [] for name in CALLBACKS}
+        #the calls that raised anything but PreventUpdate, which are not timed
+        self.errors = {name: 0 for name in CALLBACKS}
+        #the functions Dash calls, memoized like in production; two of them share a name in app.py
+        self.callbacks = {}
+        for name, output in CALLBACKS.items():
+            entry = next(entry for key, entry in app.app.callback_map.items() if output in key.strip('.').split('...'))
+            self.callbacks[name] = entry['callback'].__wrapped__
+        self.state = {
+            'group': None, 'start_date': None, 'end_date': None, 'month': None, 'week': None, 'weekday': None,
+            'hour': None, 'item': None, 'aggregator': None, 'product': None, 'feature': None, 'select_time': None,
+            'start_date1': None, 'end_date1': None, 'start_date2': None, 'end_date2': None,
+            'month1': None, 'month2': None, 'week1': None, 'week2': None, 'day1': None, 'day2': None,
+            'product1': None, 'product2': None, 'feature1': 'Ticket', 'feature2': 'AVS Per Hour',
+            'view': 'Auto', 'method': 'Pearson',
+        }
+
+    def call(self, name, *args):
+        func = self.callbacks[name]
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        except self.prevent_update:
+            #the callback chose not to update its outputs, it still took this long
+            result = self.no_update
+        except Exception as error:
+            #a crash would pass for a fast call, it is counted instead of timed
+            self.errors[name] += 1
+            logging.getLogger(__name__).warning('%s raised %r', name, error)
+            return self.no_update
+        took = time.perf_counter() - start
+        sample = {'seconds': took}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            sample.update(peak=peak - before, retained=current - before)
+        self.samples[name].append(sample)
+        return result
+
+    def _usable(self, result):
+        return result is not self.no_update
+
+    def sidebar(self, group_changed):
+        state = self.state
+        filters = [state[field] for field in SIDEBAR]
+        result = self.call('weekday_filter', *filters)
+        if self._usable(result):
+            state['hour'], state['item'] = result[1], result[3]
+        self.section1()
+        self.section2()
+        if group_changed:
+            self.comparison()
+
+    def section1(self):
+        state = self.state
+        filters = [state[field] for field in SIDEBAR]
+        key = self.call('items_aggregate', *filters, state['hour'], state['aggregator'])
+        if not self._usable(key):
+            return
+        result = self.call('hourly_update', key, state['hour'], state['aggregator'], *filters)
+        if self._usable(result):
+            state['product'] = result[1]
+        self.call('item_percentage', key, state['product'], state['hour'], state['aggregator'], *filters)
+
+    def section2(self):
+        state = self.state
+        filters = [state[field] for field in SIDEBAR]
+        key = self.call('hours_aggregate', *filters, state['item'], state['aggregator'])
+        if not self._usable(key):
+            return
+        result = self.call('product_update', key, state['feature'], state['item'], state['aggregator'], *filters)
+        if self._usable(result):
+            state['select_time'] = result[1]
+        self.call('hour_percentage', key, state['select_time'], state['item'], state['aggregator'], *filters)
+
+    def comparison(self):
+        state = self.state
+        filters = [state['group']] + [state[field] for field in COMPARISON]
+        result = self.call('comp_day_filter', *filters)
+        if self._usable(result):
+            state['product1'], state['product2'] = result[1], result[3]
+        self.call('comp_plotter', *filters, state['product1'], state['product2'], state['aggregator'])
+
+    def run(self, interaction):
+        """Apply an interaction's values and run what they trigger, the way the page's callback graph chains them."""
+        if not self.warm:
+            self.app.callback_cache.clear()
+            self.app.aggregate_store.clear()
+        self.state.update(interaction)
+        changed = set(interaction)
+        if changed & set(SIDEBAR):
+            self.sidebar('group' in changed)
+        else:
+            if changed & {'hour', 'aggregator'}:
+                self.section1()
+            elif 'product' in changed:
+                self.section1()
+            if changed & {'item', 'aggregator', 'feature', 'select_time'}:
+                self.section2()
+        if changed & (set(COMPARISON) | {'product1', 'product2', 'aggregator'}):
+            self.comparison()
+        if changed & {'feature1', 'feature2', 'view'}:
+            self.call('scatter_plot', self.state['feature1'], self.state['feature2'], self.state['view'])
+        if 'method' in changed:
+            self.call('correlation_matrix', self.state['method'])
+
+
+def summarise(samples, errors):
+    """Return the latency percentiles (ms) and memory (KiB) of each callback's samples, and how often it raised."""
+    results = {}
+    for name, calls in samples.items():
+        if not calls:
+            if errors.get(name):
+                results[name] = {'calls': 0, 'errors': errors[name]}
+            continue
+        seconds = np.array([call['seconds'] for call in calls]) * 1000
+        result = {
+            'calls': len(calls),
+            'errors': errors.get(name, 0),
+            'p50_ms': float(np.percentile(seconds, 50)),
+            'p95_ms': float(np.percentile(seconds, 95)),
+            'p99_ms': float(np.percentile(seconds, 99)),
+        }
+        if 'peak' in calls[0]:
+            peaks = np.array([call['peak'] for call in calls]) / 1024
+            result.update(
+                peak_p50_kib=float(np.percentile(peaks, 50)),
+                peak_max_kib=float(peaks.max()),
+                retained_kib=float(sum(call['retained'] for call in calls) / 1024),
+            )
+        results[name] = result
+    return results
+
+
+def run(app, trace, memory=True, warm=False):
+    """Replay the trace twice: timed without tracemalloc, then measured with it."""
+    timed = Replay(app, warm=warm)
+    for interaction in trace:
+        timed.run(interaction)
+    results = summarise(timed.samples, timed.errors)
+    if memory:
+        measured = Replay(app, memory=True, warm=warm)
+        tracemalloc.start()
+        try:
+            for interaction in trace:
+                measured.run(interaction)
+        finally:
+            tracemalloc.stop()
+        for name, result in summarise(measured.samples, measured.errors).items():
+            results[name].update({key: value for key, value in result.items() if 'kib' in key})
+    return results
+
+
+def compare(results, baseline, tolerance, floor_ms=1.0):
+    """Return a line per figure that got worse than the baseline by more than the tolerance."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'peak_max_kib'):
+            if metric not in result or metric not in before:
+                continue
+            #timings under the floor are noise, whatever their ratio
+            floor = floor_ms if metric.endswith('_ms') else 0
+            if result[metric] > before[metric] * (1 + tolerance) and result[metric] - before[metric] > floor:
+                regressions.append(f'{name} {metric}: {before[metric]:.2f} -> {result[metric]:.2f}')
+    return regressions
+
+
+def report(results, baseline=None):
+    columns = ['calls', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_p50_kib', 'peak_max_kib', 'retained_kib']
+    print(f'{"callback":<20}' + ''.join(f'{column:>14}' for column in columns))
+    for name, result in results.items():
+        cells = []
+        for column in columns:
+            value = result.get(column)
+            if value is None:
+                cells.append(f'{"-":>14}')
+                continue
+            counted = column in ('calls', 'errors')
+            cell = f'{value:.0f}' if counted else f'{value:.2f}'
+            if baseline and name in baseline and column in baseline[name] and not counted and baseline[name][column]:
+                cell += f' {(value / baseline[name][column] - 1) * 100:+.0f}%'
+            cells.append(f'{cell:>14}')
+        print(f'{name:<20}' + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard callbacks.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generating = commands.add_parser('generate', help='write a scaled synthetic dataset')
+    generating.add_argument('--scale', type=int, required=True, help='how many times the workbook rows')
+    generating.add_argument('--seed', type=int, default=0)
+    running = commands.add_parser('run', help='replay a trace and report the latencies')
+    running.add_argument('--scale', type=int, default=1, help='run on a synthetic dataset (generated if missing)')
+    running.add_argument('--trace', help='a recorded trace to replay, JSON lines')
+    running.add_argument('--interactions', type=int, default=200, help='the length of a synthetic trace')
+    running.add_argument('--seed', type=int, default=0)
+    running.add_argument('--save-trace', help='write the replayed trace here')
+    running.add_argument('--warm', action='store_true', help='keep the callback caches between interactions')
+    running.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    running.add_argument('--save-baseline', help='write the results here')
+    running.add_argument('--baseline', help='compare the results with a baseline written by --save-baseline')
+    running.add_argument('--tolerance', type=float, default=0.2, help='how much slower counts as a regression')
+    args = parser.parse_args()
+
+    if args.scale > 1:
+        import importlib
+
+        import config
+        cache_dir = scaled_cache_dir(args.scale)
+        #before anything imports dataset, whose defaults come from config
+        os.environ['QSR_CACHE_DIR'] = cache_dir
+        os.environ['QSR_PARTITION_DIR'] = os.path.join(cache_dir, 'partitions')
+        importlib.reload(config)
+        generate(cache_dir, args.scale, args.seed)
+    if args.command == 'generate':
+        return 0
+
+    logging.getLogger('dataset').setLevel(logging.WARNING)
+    #the cards of an empty selection divide by zero, which is not what is being measured
+    warnings.simplefilter('ignore', RuntimeWarning)
+    start = time.perf_counter()
+    import app
+    print(f'loaded {app.engine.size:,} melted rows in {time.perf_counter() - start:.1f}s')
+    trace = read_trace(args.trace) if args.trace else synthetic_trace(app, args.interactions, args.seed)
+    if args.save_trace:
+        write_trace(args.save_trace, trace)
+    results = run(app, trace, memory=not args.no_memory, warm=args.warm)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'scale': args.scale,
+                'interactions': len(trace),
+                'warm': args.warm,
+                'engine': os.environ.get('QSR_AGGREGATION_ENGINE', 'cube'),
+                'storage': os.environ.get('QSR_STORAGE', 'memory'),
+                'version': app.data_version,
+                'python': sys.version.split()[0],
+                'results': results,
+            }, f, indent=2)
+    failed = 0
+    for name, result in results.items():
+        if result.get('errors'):
+            print(f'error: {name} raised on {result["errors"]} calls')
+            failed = 1
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f'regression: {line}')
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.exit(main())
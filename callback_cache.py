@@ -0,0 +1,191 @@
+#memoize the data-producing callbacks
+#most visitors land on the same defaults, so the results of the heavy callbacks are kept in an
+#in-process LRU (bounded by size and age) and, optionally, in a folder shared by every worker.
+#Keys are the callback's name, the canonical form of its inputs and the dataset version, so a
+#reload of the data can never serve a result computed from the old data. The shared folder drops
+#its expired files as it finds them and keeps at most max_files, the oldest going first
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from dash import no_update
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackCache:
+    """An LRU with a time to live, backed by an optional shared folder."""
+
+    def __init__(self, maxsize=config.CALLBACK_CACHE_SIZE, ttl=config.CALLBACK_CACHE_TTL,
+                 directory=config.CALLBACK_CACHE_DIR, max_files=config.CALLBACK_CACHE_FILES):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        self.max_files = max_files
+        self._writes = 0
+        self.version = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def set_version(self, version):
+        """Switch to a new dataset version, dropping every result computed from another one."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+        if self.directory:
+            prefix = self._prefix()
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl') and not name.startswith(prefix):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def clear(self):
+        """Drop the entries held in this process, the shared folder is left alone."""
+        with self._lock:
+            self._entries.clear()
+
+    def _prefix(self):
+        return f'{str(self.version)[:16]}-'
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        #the expired files, then the oldest until the folder is back under max_files
+        now = time.time()
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.pkl'):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if now - mtime >= self.ttl:
+                    self._remove(entry.path)
+                else:
+                    files.append((mtime, entry.path))
+        if len(files) > self.max_files:
+            files.sort()
+            for _, path in files[:len(files) - self.max_files]:
+                self._remove(path)
+
+    def _path(self, key):
+        digest = hashlib.sha1(pickle.dumps(key)).hexdigest()
+        return os.path.join(self.directory, f'{self._prefix()}{digest}.pkl')
+
+    def get(self, key):
+        """Return (True, value) for a live entry and (False, None) otherwise."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+        if self.directory:
+            path = self._path(key)
+            try:
+                if time.time() - os.path.getmtime(path) < self.ttl:
+                    with open(path, 'rb') as f:
+                        value = pickle.load(f)
+                    self._remember(key, value, now)
+                    with self._lock:
+                        self.disk_hits += 1
+                    return True, value
+                self._remove(path)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def _remember(self, key, value, now):
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def set(self, key, value):
+        self._remember(key, value, time.monotonic())
+        if self.directory:
+            path = self._path(key)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            try:
+                with open(tmp, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except (OSError, pickle.PicklingError):
+                logger.warning('could not write %s to the shared callback cache', path)
+            #listing the folder on every write would cost more than the writes, it is pruned every
+            #max_files // 16 writes of this process, so it overshoots by at most that many files per worker
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % max(1, self.max_files // 16) == 0
+            if prune:
+                self._prune()
+
+    def digest(self, name, query):
+        """Return a short key for a query against the current dataset version, safe to hand to the browser."""
+        return hashlib.sha1(pickle.dumps((name, self.version, query))).hexdigest()
+
+    def produce(self, name, query, compute):
+        """Store compute() under the digest of the query unless it is already there, and return the digest."""
+        key = self.digest(name, query)
+        found, _ = self.get(key)
+        if not found:
+            self.set(key, compute())
+        return key
+
+    def memoize(self, name, normalize):
+        """Cache a callback under name, keyed by normalize(*args), the canonical form of its inputs."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = (name, self.version, normalize(*args))
+                found, value = self.get(key)
+                if found:
+                    return value
+                value = func(*args)
+                #no_update means the inputs were not usable yet, they are worth retrying
+                if value is not no_update:
+                    self.set(key, value)
+                return value
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
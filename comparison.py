@@ -0,0 +1,71 @@
+#the comparison section: one product's hourly quantity under any number of windows
+#a window names a product and the filters of a comparison column (date range, months, weeks and
+#weekdays). The aggregation engines answer all the windows of a chart with by_time_windows: each
+#window's filters are resolved on the date dimension, the rows are labelled with the windows they
+#fall in and reduced in one grouped aggregation, so comparing four quarters costs about what
+#comparing the left and the right column did
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas as pd
+
+from filters import FilterState
+
+#bar colours of the windows, the left and the right column first
+COLORS = ['rgba(29,55,70,0.7)', '#021d3a', '#4f7a8a', '#a3b8c2', '#7d5a50', '#c9a227', '#6b8f71', '#b2182b']
+
+
+@dataclass(frozen=True)
+class Window:
+    """A named FilterState and product, one series of the comparison chart."""
+    name: str
+    state: FilterState
+    item: Optional[str]
+
+
+def window_spec(number, product, start_date=None, end_date=None, month=None, week=None, weekday=None):
+    """Return the spec of a saved window, as stored in the browser, with a label describing it."""
+    parts = [product]
+    if start_date or end_date:
+        parts.append(' to '.join(pd.Timestamp(date).strftime('%d-%m-%Y') for date in (start_date, end_date) if date))
+    for value in (month, week, weekday):
+        if value:
+            parts.append(' & '.join([value] if isinstance(value, str) else value))
+    return {
+        'id': f'window{number}',
+        'name': f'Window {number}',
+        'label': f'Window {number}: {", ".join(parts)}',
+        'product': product,
+        'start_date': start_date,
+        'end_date': end_date,
+        'month': month,
+        'week': week,
+        'weekday': weekday,
+    }
+
+
+def window_filters(spec):
+    """The product and filters of a window spec, in canonical form, to tell the same window saved twice."""
+    state = FilterState.from_inputs(None, spec['start_date'], spec['end_date'], spec['month'], spec['week'], spec['weekday'])
+    return spec['product'], state
+
+
+def saved_windows(group, shown, specs):
+    """Return the Windows of the saved specs whose ids are in shown, in the order they were saved."""
+    shown = set(shown or ())
+    return tuple(
+        Window(f'Quantity Of {spec["product"]} ({spec["name"]})',
+               FilterState.from_inputs(group, spec['start_date'], spec['end_date'],
+                                       spec['month'], spec['week'], spec['weekday']),
+               spec['product'])
+        for spec in specs or () if spec['id'] in shown
+    )
+
+
+def compare(aggregates, windows, aggregator):
+    """Return the quantity of every window by hour: a Time column and one column per window name, 0 where a window has none."""
+    times, values = aggregates.by_time_windows([(window.state, window.item) for window in windows], aggregator)
+    frame = pd.DataFrame({'Time': pd.Series(times, dtype=object)})
+    for window, row in zip(windows, values):
+        frame[window.name] = row
+    return frame.fillna(0)
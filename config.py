@@ -0,0 +1,94 @@
+#settings for the dashboard, each one can be overridden with an environment variable
+import os
+
+#the workbook the dashboard is built from
+DATASET_PATH = os.environ.get('QSR_DATASET_PATH', 'QSR_dataset.xlsx')
+
+#folder holding the columnar copies of the parsed workbook
+CACHE_DIR = os.environ.get('QSR_CACHE_DIR', '.qsr_cache')
+
+#results of the heavy callbacks kept in each worker, and for how many seconds
+CALLBACK_CACHE_SIZE = int(os.environ.get('QSR_CALLBACK_CACHE_SIZE', 256))
+CALLBACK_CACHE_TTL = float(os.environ.get('QSR_CALLBACK_CACHE_TTL', 600))
+
+#optional folder where the workers share those results, unset keeps them in process only
+CALLBACK_CACHE_DIR = os.environ.get('QSR_CALLBACK_CACHE_DIR') or None
+#the most result files kept in each shared folder (callback results and aggregates), the oldest are removed
+CALLBACK_CACHE_FILES = int(os.environ.get('QSR_CALLBACK_CACHE_FILES', 4096))
+
+#filtered aggregates shared by the charts of a section, kept in each worker for the same time,
+#and an optional folder where the workers share them
+AGGREGATE_STORE_SIZE = int(os.environ.get('QSR_AGGREGATE_STORE_SIZE', 64))
+AGGREGATE_STORE_DIR = os.environ.get('QSR_AGGREGATE_STORE_DIR') or None
+
+#the section producers as background callbacks (see background.py), their jobs' results and progress
+#kept in BACKGROUND_DIR for BACKGROUND_EXPIRE seconds. The jobs run in their own processes, so the
+#aggregates they produce go through a shared folder
+BACKGROUND_CALLBACKS = os.environ.get('QSR_BACKGROUND_CALLBACKS', '0') == '1'
+BACKGROUND_DIR = os.environ.get('QSR_BACKGROUND_DIR', os.path.join(CACHE_DIR, 'background'))
+BACKGROUND_EXPIRE = float(os.environ.get('QSR_BACKGROUND_EXPIRE', 600))
+if BACKGROUND_CALLBACKS and AGGREGATE_STORE_DIR is None:
+    AGGREGATE_STORE_DIR = os.path.join(CACHE_DIR, 'aggregates')
+
+#rows of the melted frame read, encoded and sent at a time by an export of the filtered rows (see api.py)
+EXPORT_CHUNK_ROWS = int(os.environ.get('QSR_EXPORT_CHUNK_ROWS', 100000))
+
+#how often an open page asks whether new batches were ingested
+DATASET_POLL_SECONDS = float(os.environ.get('QSR_DATASET_POLL_SECONDS', 300))
+
+#what answers the aggregator dropdown: 'cube' (partial aggregates of the melted frame)
+#or 'wide' (column reductions over the workbook's own date-hour x item matrix)
+AGGREGATION_ENGINE = os.environ.get('QSR_AGGREGATION_ENGINE', 'cube')
+
+#where the melted frame lives: 'memory' (every worker holds it) or 'partitioned' (Parquet files
+#by month and product group under PARTITION_DIR, read on demand through a cache of PARTITION_CACHE_MB)
+STORAGE = os.environ.get('QSR_STORAGE', 'memory')
+PARTITION_DIR = os.environ.get('QSR_PARTITION_DIR', os.path.join(CACHE_DIR, 'partitions'))
+PARTITION_CACHE_MB = int(os.environ.get('QSR_PARTITION_CACHE_MB', 256))
+#the relative accuracy of the partitions' quantile sketches (Median and P90 when partitioned)
+QUANTILE_SKETCH_ALPHA = float(os.environ.get('QSR_QUANTILE_SKETCH_ALPHA', 0.01))
+
+#the demand forecast (forecast.py): how many days it covers, how many weeks of history it is fitted on
+#and after how many weeks a week weighs half as much in it
+FORECAST_DAYS = int(os.environ.get('QSR_FORECAST_DAYS', 7))
+FORECAST_HISTORY_WEEKS = int(os.environ.get('QSR_FORECAST_HISTORY_WEEKS', 8))
+FORECAST_HALF_LIFE_WEEKS = float(os.environ.get('QSR_FORECAST_HALF_LIFE_WEEKS', 2))
+
+#the development server (python app.py) runs with Dash's debugger and reloader unless QSR_DEBUG=0
+DEBUG = os.environ.get('QSR_DEBUG', '1') != '0'
+
+#production serving (gunicorn -c gunicorn.conf.py app:server): the address, the worker processes
+#forked from the master that loaded the data, and the threads answering requests in each of them
+BIND = os.environ.get('QSR_BIND', '0.0.0.0:8050')
+WORKERS = int(os.environ.get('QSR_WORKERS', os.cpu_count() or 1))
+THREADS = int(os.environ.get('QSR_THREADS', 4))
+TIMEOUT = int(os.environ.get('QSR_TIMEOUT', 120))
+
+#the correlation chart counts the hours in bins on the server instead of drawing a point for each
+#once the data has more rows than this, and how many bins it splits each feature into
+CORRELATION_BIN_POINTS = int(os.environ.get('QSR_CORRELATION_BIN_POINTS', 20000))
+CORRELATION_BINS = int(os.environ.get('QSR_CORRELATION_BINS', 60))
+
+#per-callback timings: a Server-Timing header on every callback response and Prometheus histograms
+#on /metrics (see metrics.py), off by default since every engine and figure call is timed then
+METRICS = os.environ.get('QSR_METRICS', '0') == '1'
+#where each worker writes its histograms, /metrics adds up those of every worker
+METRICS_DIR = os.environ.get('QSR_METRICS_DIR', os.path.join(CACHE_DIR, 'metrics'))
+
+#profiles of single callback requests (see profiler.py): QSR_PROFILE is 'cprofile' or 'sampling',
+#and only requests whose X-QSR-Profile header holds one of the comma separated QSR_PROFILE_TOKENS are profiled
+PROFILE = os.environ.get('QSR_PROFILE') or None
+PROFILE_TOKENS = frozenset(token for token in os.environ.get('QSR_PROFILE_TOKENS', '').split(',') if token)
+PROFILE_DIR = os.environ.get('QSR_PROFILE_DIR', os.path.join(CACHE_DIR, 'profiles'))
+PROFILE_INTERVAL = float(os.environ.get('QSR_PROFILE_INTERVAL', 0.001))
+
+#/_memory, the deep size of everything a worker holds (a walk over every frame, index and cache on each
+#request), answers 404 unless QSR_MEMORY_ENDPOINT=1
+MEMORY_ENDPOINT = os.environ.get('QSR_MEMORY_ENDPOINT', '0') == '1'
+#share of the callback requests whose allocations are traced for /_memory (see memory.py), 0 traces none
+MEMORY_SAMPLE_RATE = float(os.environ.get('QSR_MEMORY_SAMPLE_RATE', 0))
+
+#flags of the date dimension: the holidays as comma separated ISO dates, and the paydays as days of
+#the month, the negative ones counted from its end (-1 is the last day)
+HOLIDAYS = tuple(date for date in os.environ.get('QSR_HOLIDAYS', '').split(',') if date)
+PAYDAYS = tuple(int(day) for day in os.environ.get('QSR_PAYDAYS', '-1').split(',') if day)
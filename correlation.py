@@ -0,0 +1,132 @@
+#the numbers behind the correlation section: feature pairs binned on the server and the correlation matrix
+#df_ has a column per product plus the hourly totals, one row per hour. A scatter of two of its columns
+#ships every row to the browser, so past config.CORRELATION_BIN_POINTS rows (or when asked to) the
+#section draws a 2-D histogram instead, counted from the bin each value falls in. Each column is
+#binned once, every pair of features then only costs a bincount. The Pearson matrix is computed once,
+#on first use, by a few matrix products over all the columns at a time; the Spearman one, which has
+#to re-rank the hours both columns have for every pair, once by DataFrame.corr.
+#An explorer belongs to one version of the data, app.py builds a new one after each ingestion
+import threading
+
+import numpy as np
+import pandas as pd
+
+import config
+import metrics
+
+#what plots a feature left empty, like px did: the row numbers
+INDEX = 'index'
+
+METHODS = ('Pearson', 'Spearman')
+
+
+def bin_codes(values, bins):
+    """Return the bin of every value (-1 where it is missing) and the edges of bins of equal width between the extremes."""
+    present = np.isfinite(values)
+    codes = np.full(len(values), -1, dtype=np.int32)
+    if not present.any():
+        return codes, np.linspace(0.0, 1.0, bins + 1)
+    low, high = values[present].min(), values[present].max()
+    if high == low:
+        #a constant column, its values fall in the middle bin
+        low, high = low - 0.5, high + 0.5
+    edges = np.linspace(low, high, bins + 1)
+    #the largest value belongs to the last bin, not past it
+    codes[present] = np.minimum(((values[present] - low) / (high - low) * bins).astype(np.int32), bins - 1)
+    return codes, edges
+
+
+def pearson(values):
+    """Correlate every pair of columns over the rows where both are present, like DataFrame.corr()."""
+    present = np.isfinite(values)
+    #centred first, so the sums of squares below do not cancel out
+    with np.errstate(invalid='ignore'):
+        centred = np.where(present, values - np.nanmean(np.where(present, values, np.nan), axis=0), 0.0)
+    counts = present.astype(np.float64)
+    pairs = counts.T @ counts
+    #sums[i, j]: column i summed over the rows where column j is present too
+    sums = centred.T @ counts
+    squares = (centred * centred).T @ counts
+    products = centred.T @ centred
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = products - sums * sums.T / pairs
+        variance = squares - sums * sums / pairs
+        #a column constant over the pair's rows leaves rounding noise, it has no correlation
+        variance[variance <= squares * 1e-12] = 0.0
+        scale = np.sqrt(variance * variance.T)
+        return np.where(scale > 0, np.clip(covariance / scale, -1.0, 1.0), np.nan)
+
+
+def spearman(values):
+    """Correlate the ranks of every pair of columns over the rows where both are present, like DataFrame.corr(method='spearman').
+
+    Every column of df_ has gaps, so the ranks differ from pair to pair and cannot be computed once per
+    column; the matrix is cached per version of the data, so pandas' pairwise re-ranking is paid once.
+    """
+    return pd.DataFrame(values).corr(method='spearman').to_numpy()
+
+
+class CorrelationExplorer:
+    """Bins and correlation matrices of df_'s columns."""
+
+    def __init__(self, df_, bins=config.CORRELATION_BINS):
+        self.columns = [str(column) for column in df_.columns]
+        self.size = len(df_)
+        self.bins = bins
+        self._values = df_.to_numpy(dtype=np.float64)
+        self._positions = {column: i for i, column in enumerate(self.columns)}
+        self._codes = {}
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def values(self, feature):
+        if feature is None or feature == INDEX:
+            return np.arange(self.size, dtype=np.float64)
+        return self._values[:, self._positions[feature]]
+
+    def _binned(self, feature):
+        with self._lock:
+            if feature not in self._codes:
+                self._codes[feature] = bin_codes(self.values(feature), self.bins)
+            return self._codes[feature]
+
+    @metrics.phase('group')
+    def density(self, feature1, feature2):
+        """Return how many hours fall in each (feature2 bin, feature1 bin) cell, with the bin edges of both features."""
+        x, x_edges = self._binned(feature1)
+        y, y_edges = self._binned(feature2)
+        both = (x >= 0) & (y >= 0)
+        counts = np.bincount(y[both] * self.bins + x[both], minlength=self.bins * self.bins)
+        return counts.reshape(self.bins, self.bins), x_edges, y_edges
+
+    @metrics.phase('group')
+    def matrix(self, method='Pearson'):
+        """Return the correlation of every pair of columns by the method, computed once."""
+        with self._lock:
+            if method not in self._matrices:
+                self._matrices[method] = (spearman if method == 'Spearman' else pearson)(self._values)
+            return self._matrices[method]
+
+
+if __name__ == '__main__':
+    import time
+
+    from dataset import load_dataset
+
+    df_ = load_dataset(frames=('df_',))[1]
+    explorer = CorrelationExplorer(df_)
+    for method in METHODS:
+        start = time.perf_counter()
+        found = explorer.matrix(method)
+        took = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = df_.corr(method=method.lower()).to_numpy()
+        pandas_took = time.perf_counter() - start
+        assert np.allclose(found, expected, atol=1e-9, equal_nan=True), method
+        print(f'{method} matches DataFrame.corr on {df_.shape[1]} columns: {took * 1000:.1f}ms against {pandas_took * 1000:.1f}ms')
+    start = time.perf_counter()
+    counts, x_edges, y_edges = explorer.density('Ticket', 'AVS Per Hour')
+    both = df_[['Ticket', 'AVS Per Hour']].dropna()
+    expected, _, _ = np.histogram2d(both['AVS Per Hour'], both['Ticket'], bins=[y_edges, x_edges])
+    assert np.array_equal(counts, expected), 'the density differs from numpy.histogram2d'
+    print(f'density of {counts.sum()} hours in {(time.perf_counter() - start) * 1000:.1f}ms, matches numpy.histogram2d')
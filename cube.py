@@ -0,0 +1,376 @@
+#pre-aggregated cube behind the data_aggregator dropdown (Minimum, Average, Maximum, Total, Median, P90)
+#every chart ends in a groupby over the filtered rows of the melted frame. The cube keeps count, sum,
+#min and max per (date, item, hour) for Quantity, and per (date, hour) for Ticket, Sales and
+#AVS Per Hour (they are recorded per hour, every item repeats them), plus the same statistics rolled
+#up by calendar month. A Minimum or Maximum query combines month roll-ups for the months the filters
+#fully cover with the daily cells of the partially covered months, so no raw row is scanned at
+#request time. Counts and sums are also kept as prefix sums along the dates, over every date and over
+#the dates of each weekday: a Total or Average over a date range is the difference of two lookups,
+#and month, week and weekday filters cost two lookups per run of consecutive dates they keep and
+#weekday selected, whatever the length of the range. Median and P90 read the cells' values, sorted
+#once along the dates (see quantiles.py)
+import copy
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATE_KEY, GROUPS, date_dimension
+from filters import date_mask
+import metrics
+from quantiles import QUANTILES, SortedCells
+
+MEASURES = ['Quantity', 'Ticket', 'Sales', 'AVS Per Hour']
+
+#data_aggregator value -> statistic, an empty value is the average and anything else the total
+AGGREGATORS = {'Minimum': 'min', 'Average': 'mean', 'Maximum': 'max', 'Total': 'sum', 'Median': 'median', 'P90': 'p90'}
+
+#the Week Days labels in the order of DatetimeIndex.dayofweek
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def aggregator_statistic(aggregator):
+    if not aggregator:
+        return 'mean'
+    return AGGREGATORS.get(aggregator, 'sum')
+
+
+class _Prefix:
+    """Cumulative sums of an array along its first axis (the date), over every date and per weekday.
+
+    The weekdays' sums are stored one after the other, each behind a zero row, so together they
+    take the size of the sums over every date; weekday_offsets[k, w] is the row holding weekday w's
+    sum over the first k dates.
+    """
+
+    def __init__(self, array, weekdays, dtype):
+        zero = np.zeros((1,) + array.shape[1:], dtype=dtype)
+        self.total = np.concatenate([zero, np.cumsum(array, axis=0, dtype=dtype)])
+        self.weekday = np.concatenate([
+            part for day in range(7) for part in (zero, np.cumsum(array[weekdays == day], axis=0, dtype=dtype))
+        ])
+
+    def extended(self, array, weekdays):
+        """Return the sums over these dates followed by array's, weekdays being those of every date.
+
+        Each sum carries on from the last row here, so only the new dates are added up; the running
+        sum takes them in the same order as a cumsum over every date would.
+        """
+        held = len(self.total) - 1
+        new_weekdays = weekdays[held:]
+        dtype = self.total.dtype
+        prefix = _Prefix.__new__(_Prefix)
+        prefix.total = np.concatenate([self.total, _carry_on(self.total[-1], array, dtype)])
+        ends = np.cumsum(np.bincount(weekdays[:held], minlength=7) + 1)
+        starts = np.r_[0, ends[:-1]]
+        prefix.weekday = np.concatenate([
+            part for day in range(7)
+            for part in (self.weekday[starts[day]:ends[day]],
+                         _carry_on(self.weekday[ends[day] - 1], array[new_weekdays == day], dtype))
+        ])
+        return prefix
+
+    def over(self, runs, index):
+        """Sum the dates of the runs (starts, ends, weekday offsets or None), then index the other axes."""
+        starts, ends, offsets = runs
+        index = (slice(None),) + index
+        if offsets is None:
+            return self.total[ends][index].sum(axis=0) - self.total[starts][index].sum(axis=0)
+        start_rows, end_rows = offsets
+        return self.weekday[end_rows][index].sum(axis=0) - self.weekday[start_rows][index].sum(axis=0)
+
+
+def _carry_on(last, array, dtype):
+    #the running sums of array's rows, starting from the sum in last
+    return np.cumsum(np.concatenate([last[None], array.astype(dtype, copy=False)]), axis=0, dtype=dtype)[1:]
+
+
+def weekday_offsets(weekdays):
+    """The rows of _Prefix.weekday holding each weekday's sum over the first k dates, for every k."""
+    seen = np.zeros((len(weekdays) + 1, 7), dtype=np.int64)
+    seen[1:] = np.cumsum(weekdays[:, None] == np.arange(7), axis=0)
+    first_rows = np.r_[0, np.cumsum(np.bincount(weekdays, minlength=7) + 1)[:-1]]
+    return first_rows + seen
+
+
+class _Stats:
+    """count/sum/min/max arrays whose first axis is the date, with month roll-ups, prefix sums and sorted values."""
+
+    def __init__(self, flat, values, shape, month_starts, weekdays):
+        size = int(np.prod(shape))
+        valid = ~np.isnan(values)
+        flat, values = flat[valid], values[valid]
+        self.count = np.bincount(flat, minlength=size).reshape(shape)
+        self.sum = np.bincount(flat, weights=values, minlength=size).reshape(shape)
+        self.min = np.full(size, np.inf)
+        np.minimum.at(self.min, flat, values)
+        self.min = self.min.reshape(shape)
+        self.max = np.full(size, -np.inf)
+        np.maximum.at(self.max, flat, values)
+        self.max = self.max.reshape(shape)
+        cell_size = size // shape[0]
+        self.sorted = SortedCells(flat % cell_size, flat // cell_size, values, shape[1:], shape[0])
+        self.month_starts = month_starts
+        for name, array in self._roll_up(0).items():
+            setattr(self, name, array)
+        self._index_dates(weekdays)
+
+    def _index_dates(self, weekdays):
+        #a cell counts every row of its date, two where the workbook repeats a date and hour (counts,
+        #sums, min, max and the sorted values all take each row); a running count is at most the rows
+        #of the frame, it fits in 32 bits
+        self.count_prefix = _Prefix(self.count, weekdays, np.int32)
+        self.sum_prefix = _Prefix(self.sum, weekdays, np.float64)
+
+    def _roll_up(self, start):
+        #dates are sorted, so every month is a contiguous run of the date axis
+        starts = self.month_starts[self.month_starts >= start] - start
+        return {
+            f'month_{name}': ufunc.reduceat(getattr(self, name)[start:], starts, axis=0)
+            for name, ufunc in (('count', np.add), ('sum', np.add), ('min', np.minimum), ('max', np.maximum))
+        }
+
+    def concat(self, other, month_starts, weekdays):
+        """Return the stats of these dates followed by other's, rolling up again only from the last month here.
+
+        The prefix sums carry on from their last rows over other's dates; other's sorted values are merged in.
+        """
+        stats = _Stats.__new__(_Stats)
+        for name in ('count', 'sum', 'min', 'max'):
+            setattr(stats, name, np.concatenate([getattr(self, name), getattr(other, name)]))
+        stats.sorted = self.sorted.concat(other.sorted)
+        stats.month_starts = month_starts
+        last_month = self.month_starts[-1]
+        for name, array in stats._roll_up(last_month).items():
+            setattr(stats, name, np.concatenate([getattr(self, name)[:-1], array]))
+        stats.count_prefix = self.count_prefix.extended(other.count, weekdays)
+        stats.sum_prefix = self.sum_prefix.extended(other.sum, weekdays)
+        return stats
+
+    def totals(self, runs, index):
+        """count and sum over the runs of dates of a query, indexing the other axes."""
+        return self.count_prefix.over(runs, index), self.sum_prefix.over(runs, index)
+
+    def reduce(self, full_months, partial_dates, index):
+        """Combine the roll-ups of full_months and the cells of partial_dates, then index the other axes."""
+        index = (slice(None),) + index
+        monthly = [array[full_months][index] for array in (self.month_count, self.month_sum, self.month_min, self.month_max)]
+        daily = [array[partial_dates][index] for array in (self.count, self.sum, self.min, self.max)]
+        count = monthly[0].sum(axis=0) + daily[0].sum(axis=0)
+        total = monthly[1].sum(axis=0) + daily[1].sum(axis=0)
+        low = np.minimum(monthly[2].min(axis=0, initial=np.inf), daily[2].min(axis=0, initial=np.inf))
+        high = np.maximum(monthly[3].max(axis=0, initial=-np.inf), daily[3].max(axis=0, initial=-np.inf))
+        return count, total, low, high
+
+
+def _finish(statistic, count, total, low, high):
+    """Turn combined partial aggregates into the values pandas would have produced."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if statistic == 'sum':
+            return total
+        if statistic == 'mean':
+            return np.where(count > 0, total / count, np.nan)
+        if statistic == 'min':
+            return np.where(count > 0, low, np.nan)
+        return np.where(count > 0, high, np.nan)
+
+
+def _empty(key, measures):
+    #typed like the result of a groupby over no rows, plotly rejects object columns
+    frame = pd.DataFrame({key: pd.Series(dtype=object)})
+    for measure in measures:
+        frame[measure] = pd.Series(dtype=np.float64)
+    return frame
+
+
+class AggregateCube:
+    """Partial aggregates of the melted frame, built once when the data is loaded."""
+
+    def __init__(self, df2, groups=GROUPS, items=None, times=None):
+        #items and times fix the cube's axes, by default they are the frame's sorted labels
+        date_codes, keys = pd.factorize(df2[DATE_KEY], sort=True)
+        items = df2['Items'].astype(pd.CategoricalDtype(items) if items is not None else 'category')
+        times = df2['Time'].astype(pd.CategoricalDtype(times) if times is not None else 'category')
+        item_codes = items.cat.codes.to_numpy().astype(np.int64)
+        time_codes = times.cat.codes.to_numpy().astype(np.int64)
+        self.items = list(items.cat.categories)
+        self.times = list(times.cat.categories)
+        self.groups = groups
+        self.size = len(df2)
+        self._item_index = {item: i for i, item in enumerate(self.items)}
+        self._time_index = {time: i for i, time in enumerate(self.times)}
+        #the items that have rows, the groupbys only ever report those
+        self._observed_items = np.bincount(item_codes, minlength=len(self.items)) > 0
+
+        #the date dimension, one entry per distinct date
+        self.calendar = date_dimension(keys)
+        self.dates = pd.DatetimeIndex(self.calendar['Date'])
+        self._set_dates()
+
+        n_dates, n_items, n_times = len(self.dates), len(self.items), len(self.times)
+        flat = (date_codes * n_items + item_codes) * n_times + time_codes
+        self.quantity = _Stats(flat, df2['Quantity'].to_numpy(np.float64),
+                               (n_dates, n_items, n_times), self._month_starts, self._weekdays)
+        #Ticket, Sales and AVS Per Hour are repeated for every item, one item's rows hold them all
+        first_item = item_codes == item_codes[0]
+        hourly_flat = date_codes[first_item] * n_times + time_codes[first_item]
+        #rows per (date, hour) whatever their values, to know which hours a filter leaves
+        self._rows = np.bincount(hourly_flat, minlength=n_dates * n_times).reshape(n_dates, n_times)
+        self._rows_prefix = _Prefix(self._rows, self._weekdays, np.int64)
+        self.hourly = {
+            measure: _Stats(hourly_flat, df2[measure].to_numpy(np.float64)[first_item],
+                            (n_dates, n_times), self._month_starts, self._weekdays)
+            for measure in MEASURES[1:]
+        }
+
+    def _set_dates(self):
+        month_keys = self.dates.year * 12 + self.dates.month
+        self._month_starts = np.flatnonzero(np.r_[True, month_keys[1:] != month_keys[:-1]])
+        self._month_of_date = np.cumsum(np.r_[True, month_keys[1:] != month_keys[:-1]]) - 1
+        self._weekdays = self.dates.dayofweek.to_numpy()
+        self._weekday_offsets = weekday_offsets(self._weekdays)
+
+    def extended(self, df2):
+        """Return a cube over df2, whose first rows are the ones aggregated here, aggregating only the rows after them.
+
+        New rows that start after the last date here (the nightly batches) become new date cells and
+        only the last month's roll-up is redone; anything else, such as back-filled days or hours
+        and items the cube has no cell for, rebuilds the cube.
+        """
+        new = df2.iloc[self.size:]
+        if not len(new):
+            return self
+        labels_known = new['Items'].isin(self.items).all() and new['Time'].isin(self.times).all()
+        if not labels_known or new[DATE_KEY].min() <= self.calendar.index[-1]:
+            return AggregateCube(df2, self.groups)
+        part = AggregateCube(new, self.groups, self.items, self.times)
+        cube = copy.copy(self)
+        cube.size = len(df2)
+        cube.calendar = pd.concat([self.calendar, part.calendar])
+        cube.dates = self.dates.append(part.dates)
+        cube._set_dates()
+        cube._observed_items = self._observed_items | part._observed_items
+        cube._rows = np.concatenate([self._rows, part._rows])
+        cube._rows_prefix = self._rows_prefix.extended(part._rows, cube._weekdays)
+        cube.quantity = self.quantity.concat(part.quantity, cube._month_starts, cube._weekdays)
+        cube.hourly = {measure: stats.concat(part.hourly[measure], cube._month_starts, cube._weekdays)
+                       for measure, stats in self.hourly.items()}
+        return cube
+
+    @metrics.phase('filter')
+    def date_mask(self, state):
+        """Return which distinct dates pass the date range and calendar filters of a FilterState."""
+        return date_mask(self.calendar, state)
+
+    @metrics.phase('filter')
+    def date_runs(self, state):
+        """Return the runs of consecutive dates a FilterState keeps, for the prefix sums.
+
+        A run is a [start, end) range of date positions; with a weekday filter the runs are those of
+        the other filters and come with the rows of the selected weekdays' prefix sums at their ends.
+        """
+        if state.months is None and state.weeks is None:
+            #a plain date range is a single run, found with two lookups
+            start = 0 if state.start_date is None else self.dates.searchsorted(pd.Timestamp(state.start_date))
+            end = len(self.dates) if state.end_date is None else self.dates.searchsorted(pd.Timestamp(state.end_date), side='right')
+            starts, ends = np.array([start]), np.array([max(start, end)])
+        else:
+            mask = np.r_[False, self.date_mask(replace(state, weekdays=None)), False]
+            edges = np.flatnonzero(mask[1:] != mask[:-1])
+            starts, ends = edges[::2], edges[1::2]
+        if state.weekdays is None:
+            return starts, ends, None
+        days = [WEEKDAYS.index(day) for day in state.weekdays if day in WEEKDAYS]
+        offsets = (self._weekday_offsets[starts][:, days].ravel(), self._weekday_offsets[ends][:, days].ravel())
+        return starts, ends, offsets
+
+    def _split(self, date_mask):
+        #a month can use its roll-up only when every one of its dates is selected
+        full = np.logical_and.reduceat(date_mask, self._month_starts)
+        partial = date_mask & ~full[self._month_of_date]
+        return full, partial
+
+    def group_items(self, group):
+        """Return the cube positions of a group's items that have rows, in the groupby's order."""
+        members = set(self.groups[group])
+        return np.array([i for i, item in enumerate(self.items)
+                         if item in members and self._observed_items[i]], dtype=np.int64)
+
+    @metrics.phase('group')
+    def by_item(self, state, hour, aggregator):
+        """Aggregate the group's items at one hour, like groupby('Items') on the filtered rows."""
+        statistic = aggregator_statistic(aggregator)
+        runs = self.date_runs(state)
+        items = self.group_items(state.group)
+        t = self._time_index.get(hour)
+        if t is None or not len(items) or not self._rows_prefix.over(runs, (t,)):
+            return _empty('Items', MEASURES)
+        reduce = self._reducer(statistic, state, runs)
+        frame = pd.DataFrame({'Items': [self.items[i] for i in items]})
+        frame['Quantity'] = reduce(self.quantity, (items, t))
+        for measure, stats in self.hourly.items():
+            #the hour's value is the same for every item
+            frame[measure] = reduce(stats, (t,))
+        return frame
+
+    def _reducer(self, statistic, state, runs):
+        #the aggregates of a _Stats: the prefix sums answer the totals and averages, the roll-ups and
+        #daily cells the minimums and maximums, the sorted values the quantiles
+        if statistic in QUANTILES:
+            mask = self.date_mask(state)
+            return lambda stats, index: stats.sorted.quantile(mask, index, QUANTILES[statistic])
+        if statistic in ('sum', 'mean'):
+            return lambda stats, index: _finish(statistic, *stats.totals(runs, index), None, None)
+        full, partial = self._split(self.date_mask(state))
+        return lambda stats, index: _finish(statistic, *stats.reduce(full, partial, index))
+
+    @metrics.phase('group')
+    def by_time(self, state, item, aggregator, measures=MEASURES):
+        """Aggregate one item at every hour, like groupby('Time') on the filtered rows."""
+        statistic = aggregator_statistic(aggregator)
+        runs = self.date_runs(state)
+        in_group = item in self._item_index and self._item_index[item] in set(self.group_items(state.group))
+        times = np.flatnonzero(self._rows_prefix.over(runs, ()))
+        if not in_group or not len(times):
+            return _empty('Time', measures)
+        reduce = self._reducer(statistic, state, runs)
+        i = self._item_index[item]
+        frame = pd.DataFrame({'Time': [self.times[t] for t in times]})
+        for measure in measures:
+            if measure == 'Quantity':
+                frame[measure] = reduce(self.quantity, (i, times))
+            else:
+                frame[measure] = reduce(self.hourly[measure], (times,))
+        return frame
+
+    @metrics.phase('group')
+    def by_time_windows(self, windows, aggregator):
+        """Aggregate the quantity of several (FilterState, item) windows at every hour in one pass.
+
+        Returns the hours any window has rows at and a (window, hour) array of the aggregates, NaN
+        where a window has no row at an hour; each row is what by_time gives for its window.
+        """
+        statistic = aggregator_statistic(aggregator)
+        #which date cells each window keeps, a window whose item is not in its group keeps none
+        masks = np.array([
+            self.date_mask(state) & (item in self._item_index
+                                     and self._item_index[item] in set(self.group_items(state.group)))
+            for state, item in windows
+        ]).reshape(len(windows), len(self.dates))
+        items = np.array([self._item_index.get(item, 0) for _, item in windows], dtype=np.int64)
+        present = masks.astype(np.int64) @ self._rows > 0
+        times = np.flatnonzero(present.any(axis=0))
+        if statistic in QUANTILES:
+            values = self.quantity.sorted.windows_quantile(masks, (items[:, None], times[None, :]), QUANTILES[statistic])
+            return [self.times[t] for t in times], np.where(present[:, times], values, np.nan)
+        #the daily cells of every window's item side by side, (date, window, hour)
+        cells = [array[:, items][:, :, times] for array in (self.quantity.count, self.quantity.sum,
+                                                              self.quantity.min, self.quantity.max)]
+        weights = masks.astype(np.float64)
+        kept = masks.T[:, :, None]
+        count = np.einsum('wd,dwt->wt', weights, cells[0])
+        total = np.einsum('wd,dwt->wt', weights, cells[1])
+        low = np.where(kept, cells[2], np.inf).min(axis=0, initial=np.inf)
+        high = np.where(kept, cells[3], -np.inf).max(axis=0, initial=-np.inf)
+        values = np.where(present[:, times], _finish(statistic, count, total, low, high), np.nan)
+        return [self.times[t] for t in times], values
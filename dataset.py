@@ -0,0 +1,587 @@
+#load the QSR workbook and build the frames used by the dashboard
+#parsing the workbook with openpyxl takes seconds, so the finished frames are kept
+#as uncompressed Arrow (feather) files and memory-mapped on the next start
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+try:
+    import fcntl
+except ImportError:
+    #Windows, where the dashboard is developed: ingestion runs one batch at a time there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+#bump this whenever build_frames changes so that old caches are rebuilt. The workbook is parsed again and
+#the ingested batches are derived again from the df1 rows they were ingested with, nothing has to be
+#ingested again. 4: the memory report measures the date key against the columns it replaced
+CACHE_FORMAT = 4
+FRAMES = ('df1', 'df_', 'df2')
+
+#label columns of the melted frame, repeated on every row so they are stored as categories
+LABEL_COLUMNS = ['Time', 'Items']
+
+#the melted rows carry the day number of their date (days since 1970-01-01) instead of the date and its
+#calendar labels. Every batch numbers its dates the same way, so appending one never recodes the history
+DATE_KEY = 'Date Key'
+
+#the calendar labels, kept once per distinct date in the date dimension
+CALENDAR_COLUMNS = ['Month', 'Month Weeks', 'Week Days']
+
+
+#categorize the features into groups with which to filter the dataset with to make it readable
+cereal_packages = [
+            'Backup Max', 
+            'Backup',  
+            'Mid Meal', 
+            'Backup Max Chripsy PC', 
+            'Monster Meal',
+            'Backup Chrispy Meal', 
+            'Backup Max Cubes', 
+            'Mid Chrispy Meal',  
+            'R & B', 
+            'Fried Rice', 
+            '8PC Meal', 
+            '10PC Meal', 
+            'Backup Cubes Meal',
+            'Pasta', 
+            'Crew Meal', 
+            'Mid',  
+            'Mid Chrispy', 
+            '1/4 Rot Lite Meal', 
+            '4PC Love Meal', 
+            'Lovers Cube Meal', 
+            'Face-up Meal', 
+            'Plain Rice', 
+            'Face-up',  
+            'Jollof Rice', 
+            'Love Meal',
+            'PC Mixed Rice and Drink', 
+            '1/4 Rot Mixed Rice and Drink', 
+            '1/4 Rot Mixed Rice', 
+            'PC Mixed Rice', 
+            'Max Jollof Rice', 
+            'Max Fried Rice', 
+            '1/4 Rot Meal',
+            '1/2 Rot Meal'
+            ]
+
+chicken_packages = [ 
+            '8PC Chripsy', 
+            '1PC',  
+            '1/4 Rot', 
+            '2PC Chrispy',
+            'Rot', 
+            '4PC Chrispy', 
+            '1PC Chrispy', 
+            '8PC Chrispy', 
+            '4PC', 
+            '2PC',  
+            '1PC Rot',  
+            '4PC Rot',  
+            '8PC Rot', 
+            '2PC Rot', 
+            '1/2 Rot',            
+            ]
+
+call_to_order = [ 
+            'Cubes', 
+            '270g Chips', 
+            'Burger', 
+            'SW', 
+            '1/4 Rot Chips', 
+            'Sharwama',  
+            'Max SW Meal',  
+            'Burger Meal',  
+            'Shawama Meal', 
+            'Max SW', 
+            'Express Meal', 
+            'Express Chripsy Meal', 
+            '180g Chips', 
+            'SW Meal', 
+            'Express', 
+            '1/2 Rot Chips', 
+            'Express Chripsy',  
+            'Max Spicy SW',
+            'Spicy SW', 
+            'Max Spicy SW Meal ', 
+            'Spicy SW Meal', 
+            'Mid Chips Meal', 
+            'Mid Chips', 
+            'Mid Chrispy Chips Meal', 
+            '200g Cubes'
+            ]
+
+others = [
+            '50cl Drink', 
+            'Veg Salad',
+            'Chicken Pie', 
+            'Meat Pie', 
+            'Moin Moin', 
+            'Chicken Salad Meal',
+            'Salad',  
+            'Chicken Salad', 
+            'Monster',  
+            '75cl Water', 
+            'R & B Sauce', 
+            'Cheese', 
+            'Coffee', 
+            'Plastic Pack', 
+            '60cl Zero',  
+            '200g Salad', 
+            '200g Veg Salad',  
+            'Ketchup', 
+            '350ml Cup',
+            "250ml Cup", 
+            'Cone',
+            ]
+
+GROUPS = {
+    'cereal_packages': cereal_packages,
+    'chicken_packages': chicken_packages,
+    'call_to_order': call_to_order,
+    'others': others,
+}
+
+
+#week of the month, the few days after the fourth week are counted with the first week
+WEEK_LABELS = {1: 'First Week', 2: 'Second Week', 3: 'Third Week', 4: 'Fourth Week'}
+
+
+def calendar_labels(dates):
+    """Return the Month, Month Weeks and Week Days labels of a datetime Series."""
+    week = (dates.dt.day - 1)//7 + 1
+    week = week.where(week <= 4, 1)
+    return pd.DataFrame({
+        'Month': dates.dt.month_name(),
+        'Month Weeks': week.map(WEEK_LABELS),
+        'Week Days': dates.dt.day_name(),
+    }, index=dates.index)
+
+
+def date_keys(dates):
+    """Return the date keys of datetime values, as int32 day numbers."""
+    return pd.DatetimeIndex(dates).to_numpy().astype('datetime64[D]').astype(np.int32)
+
+
+def key_dates(keys):
+    """Return the dates of date keys."""
+    return pd.DatetimeIndex(np.asarray(keys).astype('datetime64[D]')).as_unit('ns')
+
+
+def is_payday(dates, paydays):
+    """Whether each date falls on one of the days of the month in paydays, the negative ones counted from the month's end."""
+    day = dates.day.to_numpy()
+    from_end = day - dates.days_in_month.to_numpy() - 1
+    return np.isin(day, paydays) | np.isin(from_end, paydays)
+
+
+def date_dimension(keys):
+    """Return the date dimension of some date keys: one row per distinct key, in order, indexed by the key.
+
+    Each date gets its Month, Month Weeks and Week Days labels and the Holiday and Payday flags
+    (config.HOLIDAYS and config.PAYDAYS), so deriving them costs one pass over the distinct dates.
+    """
+    keys = np.unique(np.asarray(keys, dtype=np.int32))
+    dates = key_dates(keys)
+    dimension = calendar_labels(pd.Series(dates, index=pd.Index(keys, name=DATE_KEY)))
+    dimension.insert(0, 'Date', dates)
+    dimension['Holiday'] = dates.isin(pd.DatetimeIndex(config.HOLIDAYS))
+    dimension['Payday'] = is_payday(dates, config.PAYDAYS)
+    return dimension
+
+
+def labelled_rows(rows, calendar):
+    """Return rows of the melted frame with their date and calendar labels in place of the date key, for exports.
+
+    The labels are plain strings and the numbers float64 whatever the rows were compacted to, so
+    every chunk of an export has the same columns and types.
+    """
+    labels = calendar.reindex(rows[DATE_KEY].to_numpy())
+    frame = pd.DataFrame({'Date': labels['Date'].to_numpy()})
+    for column in CALENDAR_COLUMNS:
+        frame[column] = labels[column].astype(str).to_numpy()
+    for column in LABEL_COLUMNS:
+        frame[column] = rows[column].astype(str).to_numpy()
+    for column in rows.columns:
+        if column != DATE_KEY and column not in LABEL_COLUMNS:
+            frame[column] = rows[column].to_numpy(np.float64)
+    return frame
+
+
+def read_workbook(path):
+    """Parse the workbook into the original wide frame."""
+    return pd.read_excel(path, index_col=0)
+
+
+def build_frames(df1):
+    """Derive the numeric frame and the melted frame from the wide frame.
+
+    Also returns the per-column memory report of the melted frame, before and
+    after its labels were made categorical and its numbers downcast; the date key
+    is reported against the Date and calendar label columns it replaced.
+    """
+    #Create new dataframe from the original dataframe with only numerical features to be used for correlation plot
+    df_ = df1.select_dtypes(include='number')
+
+    #create the Average spent per hour by by dividing the sales column by the ticket column
+    df_['AVS Per Hour'] = df_['Sales']/df_['Ticket']
+
+    #the dates are parsed once per hour of the wide frame, the melt repeats their keys for every item.
+    #Their calendar labels are left to date_dimension(), once per distinct date
+    keyed = df1.drop(columns='Date')
+    keyed.insert(0, DATE_KEY, date_keys(pd.to_datetime(df1['Date'], dayfirst=True)))
+
+    #transform the dataframe using pd.melt()function
+    df2 = keyed.melt(id_vars=[DATE_KEY, 'Time', 'Ticket', 'Sales'],
+                 var_name='Items',
+                 value_name='Quantity')
+
+    df2 = df2[[DATE_KEY,'Time','Items','Quantity','Ticket','Sales']]
+    df2['AVS Per Hour'] = df2['Sales'] / df2['Ticket']
+    compact = compact_frame(df2)
+    report = memory_report(df2, compact)
+    #the key stands in for the Date and calendar label columns of the object layout, measured without building them
+    report[DATE_KEY] = (unkeyed_date_bytes(df2[DATE_KEY].to_numpy()), report[DATE_KEY][1])
+    return df_, compact, report
+
+
+def _downcast(column):
+    """Return the smallest dtype that holds the column without losing any value."""
+    if column.isna().any():
+        candidates = [np.float32]
+    elif (column % 1 == 0).all():
+        candidates = [np.int8, np.int16, np.int32]
+    else:
+        candidates = [np.float32]
+    for dtype in candidates:
+        converted = column.astype(dtype)
+        if np.array_equal(converted.to_numpy(np.float64), column.to_numpy(np.float64), equal_nan=True):
+            return converted
+    return column
+
+
+def compact_frame(df2):
+    """Store the labels of the melted frame as categories and downcast its numbers."""
+    compact = pd.DataFrame(index=df2.index)
+    for name, column in df2.items():
+        if name == DATE_KEY:
+            compact[name] = column.astype(np.int32)
+        elif name in LABEL_COLUMNS:
+            compact[name] = column.astype('category')
+        elif pd.api.types.is_numeric_dtype(column):
+            compact[name] = _downcast(column)
+        else:
+            compact[name] = column
+    return compact
+
+
+def unkeyed_date_bytes(keys):
+    """Return the bytes of the Date, Month, Month Weeks and Week Days columns a column of date keys replaces.
+
+    Counted like memory_usage(deep=True) counts the melted frame's object layout, datetime64 dates and
+    a Python string per row for each label, from the labels of the distinct dates and how often each appears.
+    """
+    unique, counts = np.unique(keys, return_counts=True)
+    labels = calendar_labels(pd.Series(key_dates(unique)))
+    strings = sum(int((labels[column].map(sys.getsizeof).to_numpy() * counts).sum()) for column in CALENDAR_COLUMNS)
+    #8 bytes per date, and a pointer per label
+    return 8 * len(keys) * (1 + len(CALENDAR_COLUMNS)) + strings
+
+
+def memory_report(before, after):
+    """Return {column: (bytes before, bytes after)} for two versions of a frame."""
+    before = before.memory_usage(index=False, deep=True)
+    after = after.memory_usage(index=False, deep=True)
+    return {name: (int(before[name]), int(after[name])) for name in after.index}
+
+
+def log_memory_report(report):
+    """Log the bytes used by each column of the melted frame before and after compact_frame."""
+    for name, (before, after) in report.items():
+        logger.info('df2[%r]: %s -> %s bytes', name, f'{before:,}', f'{after:,}')
+    before = sum(value[0] for value in report.values())
+    after = sum(value[1] for value in report.values())
+    logger.info('df2 total: %s -> %s bytes', f'{before:,}', f'{after:,}')
+
+
+def file_digest(path):
+    """Return the sha256 of a file, read in 1MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_path(cache_dir):
+    return os.path.join(cache_dir, 'manifest.json')
+
+
+def _frame_path(cache_dir, name):
+    return os.path.join(cache_dir, f'{name}.feather')
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(_manifest_path(cache_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(cache_dir, manifest):
+    #write to a temporary file first so a reader never sees half a manifest
+    tmp = _manifest_path(cache_dir) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, _manifest_path(cache_dir))
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _cache_is_fresh(path, cache_dir, manifest):
+    """Check the manifest against the workbook, by mtime first and by content hash second."""
+    if not manifest or manifest.get('format') != CACHE_FORMAT:
+        return False
+    if not all(os.path.exists(_frame_path(cache_dir, name)) for name in FRAMES):
+        return False
+    stat = _source_stat(path)
+    if manifest['source'] == stat:
+        return True
+    #the workbook was touched, it is only stale if the content changed too
+    if manifest['sha256'] == file_digest(path):
+        manifest['source'] = stat
+        _write_manifest(cache_dir, manifest)
+        return True
+    return False
+
+
+def _write_frames(cache_dir, frames):
+    for name, frame in frames.items():
+        table = pa.Table.from_pandas(frame, preserve_index=True)
+        tmp = _frame_path(cache_dir, name) + '.tmp'
+        #uncompressed so the file can be memory-mapped instead of decoded
+        feather.write_feather(table, tmp, compression='uncompressed')
+        os.replace(tmp, _frame_path(cache_dir, name))
+
+
+def _read_frames(cache_dir, prefix='', names=FRAMES):
+    return {
+        name: feather.read_table(_frame_path(cache_dir, prefix + name), memory_map=True).to_pandas()
+        for name in names
+    }
+
+
+#ingested batches are kept next to the workbook's frames as their own small files, listed in the
+#manifest in the order they were appended, so neither writing nor loading one touches the history
+def batch_prefix(batch):
+    return f'batch-{batch["sha256"][:16]}-'
+
+
+@contextlib.contextmanager
+def manifest_lock(cache_dir):
+    """Hold an exclusive lock on the cache's manifest.lock, so only one ingestion appends to the manifest at a time.
+
+    It covers checking a batch against the dataset as well as writing it: two batches checked against
+    the same manifest could both pass and then overwrite each other's entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, 'manifest.lock'), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_batch(cache_dir, batch, frames):
+    """Write the frames derived from a batch and append it to the manifest."""
+    manifest = _read_manifest(cache_dir)
+    _write_frames(cache_dir, {batch_prefix(batch) + name: frame for name, frame in frames.items()})
+    manifest.setdefault('batches', []).append(batch)
+    _write_manifest(cache_dir, manifest)
+    return manifest
+
+
+def read_batches(cache_dir, batches, names=FRAMES):
+    """Return the named frames of each batch, memory-mapped like the workbook's."""
+    return [_read_frames(cache_dir, batch_prefix(batch), names) for batch in batches]
+
+
+def dataset_version(manifest):
+    """The workbook's sha256, chained with the sha256 of every ingested batch."""
+    version = manifest['sha256']
+    for batch in manifest.get('batches', []):
+        version = hashlib.sha256(f'{version}{batch["sha256"]}'.encode()).hexdigest()
+    return version
+
+
+def batches_after(manifest, version):
+    """Return the batches appended after the given dataset version, or None if it is not one of the manifest's."""
+    batches = manifest.get('batches', [])
+    for count in range(len(batches) + 1):
+        if dataset_version({'sha256': manifest['sha256'], 'batches': batches[:count]}) == version:
+            return batches[count:]
+    return None
+
+
+def _rebuild_batch(cache_dir, batch):
+    """Derive a batch's frames again from its validated wide rows, for a manifest of an older CACHE_FORMAT."""
+    df1 = _read_frames(cache_dir, batch_prefix(batch), ('df1',))['df1']
+    df_, df2, _ = build_frames(df1)
+    _write_frames(cache_dir, {batch_prefix(batch) + name: frame for name, frame in (('df_', df_), ('df2', df2))})
+    return df1
+
+
+def _kept_batches(cache_dir, manifest, df1):
+    """Return the batches of an old manifest whose days the new workbook does not already have.
+
+    The batches of a manifest of another CACHE_FORMAT are derived again from the df1 rows they were
+    ingested with. A batch that is dropped is logged with its source, so the file can be ingested again.
+    """
+    if not manifest:
+        return []
+    rebuild = manifest.get('format') != CACHE_FORMAT
+    kept = []
+    days = set(zip(df1['Date'], df1['Time']))
+    for batch in manifest.get('batches', []):
+        try:
+            if rebuild:
+                rows = _rebuild_batch(cache_dir, batch)
+            else:
+                rows = _read_frames(cache_dir, batch_prefix(batch), ('df1',))['df1']
+        except (OSError, KeyError, ValueError, pa.ArrowException):
+            logger.warning('dropping the unreadable ingested batch %s (files %s*), ingest it again',
+                           batch['source'], os.path.join(cache_dir, batch_prefix(batch)))
+            continue
+        if days.isdisjoint(zip(rows['Date'], rows['Time'])):
+            kept.append(batch)
+        else:
+            logger.info('the workbook already holds the rows ingested from %s, dropping that batch', batch['source'])
+    if rebuild and kept:
+        logger.info('rebuilt %d ingested batches from cache format %s', len(kept), manifest.get('format'))
+    return kept
+
+
+def manifest_stat(cache_dir=config.CACHE_DIR):
+    """Return the mtime of the manifest, it changes whenever a batch is appended."""
+    try:
+        return os.stat(_manifest_path(cache_dir)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def read_manifest(cache_dir=config.CACHE_DIR):
+    return _read_manifest(cache_dir)
+
+
+def append_frames(frames, batches):
+    """Return (df1, df_, df2) with the rows of each batch appended, the derived columns come with the batches.
+
+    A frame given as None (not loaded) stays None.
+    """
+    if not batches:
+        return tuple(frames)
+    appended = {name: [frame] for name, frame in zip(FRAMES, frames) if frame is not None}
+    for batch in batches:
+        for name in appended:
+            #continue the row numbers of the frames they are appended to
+            rows = batch[name].copy()
+            start = sum(len(frame) for frame in appended[name])
+            rows.index = pd.RangeIndex(start, start + len(rows))
+            appended[name].append(rows)
+    df2_parts = appended.get('df2', [])
+    for column in LABEL_COLUMNS if df2_parts else []:
+        #the parts have to share one categorical dtype, or the concatenation falls back to objects.
+        #The categories stay sorted like the groupbys sort them, so the history is only recoded
+        #when a batch brings a label it has never seen
+        dtype = df2_parts[0][column].dtype
+        categories = dtype.categories
+        for rows in df2_parts[1:]:
+            categories = categories.union(pd.Index(rows[column].astype(str).unique()), sort=False)
+        if len(categories) != len(dtype.categories):
+            dtype = pd.CategoricalDtype(categories.sort_values())
+            df2_parts[0] = df2_parts[0].assign(**{column: df2_parts[0][column].astype(dtype)})
+        for rows in df2_parts[1:]:
+            rows[column] = rows[column].astype(str).astype(dtype)
+    return tuple(pd.concat(appended[name]) if name in appended else None for name in FRAMES)
+
+
+def load_dataset(path=config.DATASET_PATH, cache_dir=config.CACHE_DIR, frames=FRAMES):
+    """Return (df1, df_, df2, version), from the Arrow cache when the workbook is unchanged.
+
+    The batches ingested since the workbook was parsed are appended. The version is the sha256
+    of the workbook chained with theirs, it changes whenever the data does. Only the frames
+    named are returned, the others are None.
+    """
+    start = time.perf_counter()
+    if feather is None:
+        logger.warning('pyarrow is not installed, the dataset cache is disabled')
+        df1 = read_workbook(path)
+        df_, df2, report = build_frames(df1)
+        logger.info('parsed %s in %.3fs', path, time.perf_counter() - start)
+        log_memory_report(report)
+        return df1, df_, df2, file_digest(path)
+
+    manifest = _read_manifest(cache_dir)
+    if _cache_is_fresh(path, cache_dir, manifest):
+        try:
+            loaded = _read_frames(cache_dir, names=frames)
+            batches = manifest.get('batches', [])
+            batch_frames = read_batches(cache_dir, batches, frames)
+        except (OSError, pa.ArrowException):
+            logger.warning('could not read the dataset cache in %s, rebuilding it', cache_dir)
+        else:
+            df1, df_, df2 = append_frames([loaded.get(name) for name in FRAMES], batch_frames)
+            logger.info('loaded %s and %d ingested batches from the cache in %.3fs',
+                        path, len(batches), time.perf_counter() - start)
+            log_memory_report(manifest['memory'])
+            return df1, df_, df2, dataset_version(manifest)
+
+    if manifest and manifest.get('format') != CACHE_FORMAT:
+        logger.info('the dataset cache in %s has format %s, rebuilding it and its %d ingested batches as format %s',
+                    cache_dir, manifest.get('format'), len(manifest.get('batches', [])), CACHE_FORMAT)
+    df1 = read_workbook(path)
+    parsed = time.perf_counter()
+    df_, df2, report = build_frames(df1)
+    built = time.perf_counter()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_frames(cache_dir, {'df1': df1, 'df_': df_, 'df2': df2})
+    manifest = {
+        'format': CACHE_FORMAT,
+        'source': _source_stat(path),
+        'sha256': file_digest(path),
+        'memory': report,
+        'batches': _kept_batches(cache_dir, manifest, df1),
+    }
+    _write_manifest(cache_dir, manifest)
+    logger.info('parsed %s in %.3fs, built frames in %.3fs, wrote the cache in %.3fs',
+                path, parsed - start, built - parsed, time.perf_counter() - built)
+    log_memory_report(report)
+    kept = [frame if name in frames else None for name, frame in zip(FRAMES, (df1, df_, df2))]
+    df1, df_, df2 = append_frames(kept, read_batches(cache_dir, manifest['batches'], frames))
+    return df1, df_, df2, dataset_version(manifest)
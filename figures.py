@@ -0,0 +1,334 @@
+#figures for the dashboard's charts, built straight from arrays instead of through plotly.express
+#px re-derives the traces from the frame, validates every property and copies the template on each
+#call, which costs more than the aggregation behind these small charts. The builders emit the traces
+#and layout px gave for the calls app.py used to make, on top of a base layout validated once at
+#import, and skip validation of the per-call properties since they only ever hold arrays and the
+#literals below. `python figures.py` checks them against px and times both
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import metrics
+
+#the dashboard theme
+BACKGROUND = '#ece1dd'
+
+#validated once and shared: the default template px would apply and the theme's backgrounds
+BASE_LAYOUT = go.Layout(
+    template=pio.templates[pio.templates.default],
+    paper_bgcolor=BACKGROUND,
+    plot_bgcolor=BACKGROUND,
+).to_plotly_json()
+
+#what px picks when no colour is given, the first colour of the template
+DEFAULT_COLOR = BASE_LAYOUT['template']['layout']['colorway'][0]
+
+#px scales bubble areas so that the largest has this diameter in pixels
+SIZE_MAX = 20
+
+#and draws scatters of more points than this with WebGL
+WEBGL_POINTS = 1000
+
+#the density chart goes from the theme's lightest navy to its darkest, the correlation matrix from
+#red (negative) through the background to navy (positive)
+DENSITY_COLORS = [[0.0, 'rgba(29,55,70,0.2)'], [1.0, '#021d3a']]
+CORRELATION_COLORS = [[0.0, '#b2182b'], [0.5, BACKGROUND], [1.0, '#021d3a']]
+
+#the matrix has a row per feature, it needs more room than the other charts
+MATRIX_HEIGHT = 900
+
+
+def _values(values):
+    #columns come as Series (categorical ones included), the traces take plain arrays
+    return np.asarray(values.to_numpy() if hasattr(values, 'to_numpy') else values)
+
+
+def _hover(*pairs):
+    #a column shown twice (the same feature on both axes) is listed once, with its last value, like px does
+    fields = dict(pairs)
+    return '<br>'.join(f'{title}={value}' for title, value in fields.items()) + '<extra></extra>'
+
+
+def _figure(traces, **layout):
+    return go.Figure(data=traces, layout={**BASE_LAYOUT, **layout}, _validate=False)
+
+
+def _axes_layout(x_title, y_title, legend=None, **layout):
+    return {
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'title': {'text': x_title}},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': y_title}},
+        'legend': {'tracegroupgap': 0, **(legend or {})},
+        'margin': {'t': 60},
+        **layout,
+    }
+
+
+@metrics.phase('figure')
+def bar(x, y, x_title, y_title, color):
+    """One series of bars, like px.bar(df, x=x_title, y=y_title, color_discrete_sequence=[color])."""
+    trace = go.Bar(
+        x=_values(x), y=_values(y),
+        hovertemplate=_hover((x_title, '%{x}'), (y_title, '%{y}')),
+        legendgroup='', marker={'color': color, 'pattern': {'shape': ''}}, name='',
+        orientation='v', showlegend=False, textposition='auto', xaxis='x', yaxis='y',
+        _validate=False,
+    )
+    return _figure([trace], **_axes_layout(x_title, y_title, barmode='relative'))
+
+
+@metrics.phase('figure')
+def grouped_bar(x, series, x_title, legend=None):
+    """Bars of several series side by side, series mapping each name to (values, color).
+
+    Like px.bar(df, x=x_title, y=list(series), color_discrete_map=..., barmode='group').
+    """
+    x = _values(x)
+    if len(x) == 0:
+        #px draws no series, and has no legend to title, for a frame without rows
+        return _figure([], **_axes_layout(x_title, 'value', legend, barmode='group'))
+    traces = [
+        go.Bar(
+            x=x, y=_values(values),
+            alignmentgroup='True',
+            hovertemplate=_hover(('variable', name), (x_title, '%{x}'), ('value', '%{y}')),
+            legendgroup=name, marker={'color': color, 'pattern': {'shape': ''}}, name=name,
+            offsetgroup=name, orientation='v', showlegend=True, textposition='auto', xaxis='x', yaxis='y',
+            _validate=False,
+        )
+        for name, (values, color) in series.items()
+    ]
+    legend = {'title': {'text': 'variable'}, **(legend or {})}
+    return _figure(traces, **_axes_layout(x_title, 'value', legend, barmode='group'))
+
+
+@metrics.phase('figure')
+def line(x, y, x_title, y_title, color, overlay=None):
+    """A line with markers, like px.line(df, x=x_title, y=y_title, color_discrete_sequence=[color], markers=True).
+
+    overlay is (x, y, name) of a dashed series drawn over it, such as a forecast; both are then named
+    in a legend and the categories of the x axis sorted, whichever series they come from.
+    """
+    trace = go.Scatter(
+        x=_values(x), y=_values(y),
+        hovertemplate=_hover((x_title, '%{x}'), (y_title, '%{y}')),
+        legendgroup='', line={'color': color, 'dash': 'solid'}, marker={'symbol': 'circle'},
+        mode='lines+markers', name='', orientation='v', showlegend=False, xaxis='x', yaxis='y',
+        _validate=False,
+    )
+    if overlay is None:
+        return _figure([trace], **_axes_layout(x_title, y_title))
+    overlay_x, overlay_y, name = overlay
+    trace.update(name=y_title, showlegend=True)
+    extra = go.Scatter(
+        x=_values(overlay_x), y=_values(overlay_y),
+        hovertemplate=_hover((x_title, '%{x}'), (name, '%{y:.2f}')),
+        line={'color': color, 'dash': 'dash'}, marker={'symbol': 'circle-open'},
+        mode='lines+markers', name=name, showlegend=True, xaxis='x', yaxis='y',
+        _validate=False,
+    )
+    layout = _axes_layout(x_title, y_title)
+    layout['xaxis']['categoryorder'] = 'category ascending'
+    return _figure([trace, extra], **layout)
+
+
+@metrics.phase('figure')
+def scatter(x, y, x_title, y_title, color=DEFAULT_COLOR, size=None, size_title=None, marker_size=None):
+    """Markers, like px.scatter(df, x=x_title, y=y_title, size=size_title, color_discrete_sequence=[color]).
+
+    marker_size fixes the size of every marker, like a later update_traces(marker=dict(size=...)).
+    """
+    marker = {'color': color, 'symbol': 'circle'}
+    hover = [(x_title, '%{x}'), (y_title, '%{y}')]
+    legend = None
+    if size is not None:
+        size = _values(size)
+        hover.append((size_title, '%{marker.size}'))
+        #areas proportional to the values, the largest SIZE_MAX pixels across
+        largest = np.nanmax(size) if len(size) else np.nan
+        marker.update(size=size, sizemode='area', sizeref=float(largest) / SIZE_MAX ** 2)
+        legend = {'itemsizing': 'constant'}
+    if marker_size is not None:
+        marker['size'] = marker_size
+    x, y = _values(x), _values(y)
+    if len(x) > WEBGL_POINTS:
+        trace = go.Scattergl(
+            x=x, y=y,
+            hovertemplate=_hover(*hover),
+            legendgroup='', marker=marker, mode='markers', name='', showlegend=False, xaxis='x', yaxis='y',
+            _validate=False,
+        )
+    else:
+        trace = go.Scatter(
+            x=x, y=y,
+            hovertemplate=_hover(*hover),
+            legendgroup='', marker=marker, mode='markers', name='', orientation='v', showlegend=False,
+            xaxis='x', yaxis='y',
+            _validate=False,
+        )
+    return _figure([trace], **_axes_layout(x_title, y_title, legend))
+
+
+@metrics.phase('figure')
+def density(counts, x_edges, y_edges, x_title, y_title, z_title='Hours'):
+    """A 2-D histogram counted on the server, counts[i, j] being the cell of the i-th y bin and the j-th x bin.
+
+    Empty cells are left out so that the background shows through them.
+    """
+    trace = go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=np.where(counts > 0, counts, np.nan),
+        colorscale=DENSITY_COLORS, colorbar={'title': {'text': z_title}},
+        hovertemplate=_hover((x_title, '%{x}'), (y_title, '%{y}'), (z_title, '%{z}')),
+        _validate=False,
+    )
+    return _figure([trace], **_axes_layout(x_title, y_title))
+
+
+@metrics.phase('figure')
+def correlation_matrix(matrix, labels, z_title):
+    """The correlation of every pair of features, from -1 to 1, the first feature at the top left."""
+    trace = go.Heatmap(
+        x=list(labels), y=list(labels), z=matrix,
+        zmin=-1, zmax=1, colorscale=CORRELATION_COLORS, colorbar={'title': {'text': z_title}},
+        hovertemplate='%{y} and %{x}: %{z:.2f}<extra></extra>',
+        _validate=False,
+    )
+    return _figure(
+        [trace],
+        xaxis={'anchor': 'y', 'domain': [0.0, 1.0], 'tickangle': -45},
+        yaxis={'anchor': 'x', 'domain': [0.0, 1.0], 'autorange': 'reversed'},
+        margin={'t': 60},
+        height=MATRIX_HEIGHT,
+    )
+
+
+@metrics.phase('figure')
+def doughnut(labels, values, colors, labels_title='Columns', values_title='Value', hole=0.6, legend=None, **layout):
+    """A pie with a hole, like px.pie(df, names=labels_title, values=values_title, hole=hole, color_discrete_sequence=colors)."""
+    trace = go.Pie(
+        domain={'x': [0.0, 1.0], 'y': [0.0, 1.0]}, hole=hole,
+        hovertemplate=_hover((labels_title, '%{label}'), (values_title, '%{value}')),
+        labels=_values(labels), legendgroup='', name='', showlegend=True, values=_values(values),
+        _validate=False,
+    )
+    return _figure(
+        [trace],
+        legend={'tracegroupgap': 0, **(legend or {})},
+        margin={'t': 60},
+        piecolorway=list(colors),
+        **layout,
+    )
+
+
+def _same(left, right, path='figure'):
+    #compares two plotly JSON trees, arrays by value
+    if isinstance(left, dict) and isinstance(right, dict):
+        assert left.keys() == right.keys(), f'{path}: {sorted(left.keys() ^ right.keys())}'
+        for key in left:
+            _same(left[key], right[key], f'{path}.{key}')
+    elif isinstance(left, (list, tuple)) and left and isinstance(left[0], dict):
+        assert isinstance(right, (list, tuple)) and len(left) == len(right), f'{path}: {len(left)} entries'
+        for i, (item, other) in enumerate(zip(left, right)):
+            _same(item, other, f'{path}[{i}]')
+    elif isinstance(left, (list, tuple, np.ndarray)) or isinstance(right, (list, tuple, np.ndarray)):
+        left, right = np.asarray(left), np.asarray(right)
+        equal = left.shape == right.shape and (
+            np.allclose(left, right, equal_nan=True) if left.dtype.kind in 'fiu' and right.dtype.kind in 'fiu'
+            else left.tolist() == right.tolist())
+        assert equal, f'{path}: {left!r} != {right!r}'
+    else:
+        assert left == right or (left != left and right != right), f'{path}: {left!r} != {right!r}'
+
+
+def compare_with_px(repeat=200):
+    """Check every builder against the px call it replaces, and return the milliseconds each path takes per figure."""
+    import time
+
+    import pandas as pd
+    import plotly.express as px
+
+    from dataset import load_dataset
+
+    df_ = load_dataset(frames=('df_',))[1]
+    rng = np.random.default_rng(0)
+    items = pd.DataFrame({'Items': [f'item {i}' for i in range(30)], 'Quantity': rng.random(30) * 40})
+    hours = pd.DataFrame({'Time': [f'{h:02d} to {h + 1:02d}' for h in range(7, 24)]})
+    for measure in ('Quantity', 'Ticket', 'Sales'):
+        hours[measure] = rng.random(len(hours)) * 100
+    share = pd.DataFrame({'Columns': ['Coffee', 'Others'], 'Value': [12.5, 87.5]})
+    left, right = 'Quantity Of Coffee (Left Filter)', 'Quantity Of Tea (Right Filter)'
+    both = pd.DataFrame({'Time': pd.Categorical(hours['Time']), left: hours['Quantity'], right: hours['Ticket']})
+    theme = {'paper_bgcolor': BACKGROUND, 'plot_bgcolor': BACKGROUND}
+    cases = {
+        'bar': (
+            lambda: px.bar(items, x='Items', y='Quantity', color_discrete_sequence=['#021d3a']).update_layout(**theme),
+            lambda: bar(items['Items'], items['Quantity'], 'Items', 'Quantity', '#021d3a'),
+        ),
+        'doughnut': (
+            lambda: px.pie(share, names='Columns', values='Value', hole=0.6,
+                           color_discrete_sequence=['rgba(29,55,70,0.7)', '#021d3a']).update_layout(
+                **theme, legend=dict(orientation='h'), barmode='group'),
+            lambda: doughnut(share['Columns'], share['Value'], ['rgba(29,55,70,0.7)', '#021d3a'],
+                             legend={'orientation': 'h'}, barmode='group'),
+        ),
+        'bubble': (
+            lambda: px.scatter(hours, x='Quantity', y='Ticket', size='Sales',
+                               color_discrete_sequence=['#021d3a']).update_layout(**theme),
+            lambda: scatter(hours['Quantity'], hours['Ticket'], 'Quantity', 'Ticket', '#021d3a',
+                            size=hours['Sales'], size_title='Sales'),
+        ),
+        'line': (
+            lambda: px.line(hours, x='Time', y='Sales', color_discrete_sequence=['#1d3746'],
+                            markers=True).update_layout(**theme),
+            lambda: line(hours['Time'], hours['Sales'], 'Time', 'Sales', '#1d3746'),
+        ),
+        'grouped bar': (
+            lambda: px.bar(both, x='Time', y=[left, right], barmode='group',
+                           color_discrete_map={left: 'rgba(29,55,70,0.7)', right: '#021d3a'}).update_layout(
+                **theme, legend_title='', barmode='group',
+                legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)),
+            lambda: grouped_bar(both['Time'], {left: (both[left], 'rgba(29,55,70,0.7)'), right: (both[right], '#021d3a')},
+                                'Time', legend={'title': {'text': ''}, 'orientation': 'h', 'yanchor': 'bottom',
+                                                'y': 1.02, 'xanchor': 'right', 'x': 1}),
+        ),
+        'grouped bar, no rows': (
+            lambda: px.bar(both.iloc[:0], x='Time', y=[left, right], barmode='group',
+                           color_discrete_map={left: 'rgba(29,55,70,0.7)', right: '#021d3a'}).update_layout(
+                **theme, legend_title='', barmode='group',
+                legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)),
+            lambda: grouped_bar(both['Time'].iloc[:0], {left: (both[left].iloc[:0], 'rgba(29,55,70,0.7)'),
+                                                        right: (both[right].iloc[:0], '#021d3a')},
+                                'Time', legend={'title': {'text': ''}, 'orientation': 'h', 'yanchor': 'bottom',
+                                                'y': 1.02, 'xanchor': 'right', 'x': 1}),
+        ),
+        'correlation': (
+            lambda: px.scatter(df_, x='Ticket', y='AVS Per Hour').update_layout(**theme),
+            lambda: scatter(df_['Ticket'], df_['AVS Per Hour'], 'Ticket', 'AVS Per Hour'),
+        ),
+        'correlation, sized markers': (
+            lambda: px.scatter(df_, x='Sales', y='Ticket', color_discrete_sequence=['rgba(29,55,70,0.7)', '#021d3a'])
+            .update_layout(**theme).update_traces(marker=dict(size=10)),
+            lambda: scatter(df_['Sales'], df_['Ticket'], 'Sales', 'Ticket', 'rgba(29,55,70,0.7)', marker_size=10),
+        ),
+        'correlation, one feature': (
+            lambda: px.scatter(df_, x=None, y='Sales', color_discrete_sequence=['rgba(29,55,70,0.7)', '#021d3a'])
+            .update_layout(**theme).update_traces(marker=dict(size=10)),
+            lambda: scatter(df_.index, df_['Sales'], 'index', 'Sales', 'rgba(29,55,70,0.7)', marker_size=10),
+        ),
+    }
+    timings = {}
+    for name, (with_px, builder) in cases.items():
+        _same(with_px().to_plotly_json(), builder().to_plotly_json(), name)
+        timings[name] = []
+        for make in (with_px, builder):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                make()
+            timings[name].append((time.perf_counter() - start) / repeat * 1000)
+    return timings
+
+
+if __name__ == '__main__':
+    print(f'{"figure":<28}{"px ms":>10}{"builder ms":>12}{"speedup":>10}')
+    for name, (with_px, builder) in compare_with_px().items():
+        print(f'{name:<28}{with_px:>10.3f}{builder:>12.3f}{with_px / builder:>9.1f}x')
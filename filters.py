@@ -0,0 +1,286 @@
+#one filter engine shared by every callback
+#the dashboard filters the melted frame by product group, date range, month, week of the month,
+#weekday, hour and product. Instead of masking and copying the frame once per dropdown, the engine
+#keeps a packed bitmap of the matching rows for every group, hour and product, and a filter state
+#resolves to a single array of row positions by AND-ing (and within a dropdown OR-ing) bitmaps.
+#The rows carry a date key instead of calendar labels: the date range, month, week and weekday
+#filters are resolved on the date dimension first, to the set of dates they keep, and the rows of
+#those dates are found with a single lookup of every row's key
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset import CALENDAR_COLUMNS, DATE_KEY, GROUPS, date_dimension, key_dates
+import metrics
+
+DEFAULT_GROUP = 'cereal_packages'
+
+#date filters whose row bitmap each engine keeps, the callbacks of an interaction share their filters
+DATE_BITMAPS = 32
+
+#dropdown name -> column of the melted frame
+DIMENSIONS = {
+    'hour': 'Time',
+    'item': 'Items',
+}
+
+
+def append_bits(bitmap, size, mask):
+    """Append a boolean mask to a packed bitmap of size bits."""
+    used = size % 8
+    if not used:
+        return np.concatenate([bitmap, np.packbits(mask)])
+    #the last byte is only partly used, repack it together with the new bits
+    tail = np.unpackbits(bitmap[-1:], count=used)
+    return np.concatenate([bitmap[:-1], np.packbits(np.concatenate([tail, mask]))])
+
+
+def normalize_group(group):
+    """Resolve a dataset_group value the way the callbacks always have: empty is cereal packs, unknown is others."""
+    if not group:
+        return DEFAULT_GROUP
+    return group if group in GROUPS else 'others'
+
+
+def normalize_date(value):
+    """Return a date picker value as an ISO date string, or None when it is empty."""
+    if value is None or value == '':
+        return None
+    return pd.Timestamp(value).date().isoformat()
+
+
+def normalize_selection(value):
+    """Return a dropdown value as a sorted tuple, or None when nothing is selected (all values pass)."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        return (value,)
+    return tuple(sorted(value))
+
+
+@dataclass(frozen=True)
+class FilterState:
+    """The sidebar (or one comparison column) filters, in a canonical hashable form."""
+    group: str = DEFAULT_GROUP
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    months: Optional[Tuple[str, ...]] = None
+    weeks: Optional[Tuple[str, ...]] = None
+    weekdays: Optional[Tuple[str, ...]] = None
+
+    @classmethod
+    def from_inputs(cls, group, start_date=None, end_date=None, month=None, week=None, weekday=None):
+        return cls(
+            group=normalize_group(group),
+            start_date=normalize_date(start_date),
+            end_date=normalize_date(end_date),
+            months=normalize_selection(month),
+            weeks=normalize_selection(week),
+            weekdays=normalize_selection(weekday),
+        )
+
+
+def filters_dates(state):
+    """Whether a FilterState keeps only some of the dates."""
+    return any(value is not None for value in (state.start_date, state.end_date, state.months, state.weeks, state.weekdays))
+
+
+def date_mask(calendar, state):
+    """Return which dates of a date dimension pass the date range and calendar filters of a FilterState."""
+    mask = np.ones(len(calendar), dtype=bool)
+    dates = calendar['Date'].to_numpy()
+    if state.start_date is not None:
+        mask &= dates >= np.datetime64(state.start_date)
+    if state.end_date is not None:
+        mask &= dates <= np.datetime64(state.end_date)
+    for values, column in zip((state.months, state.weeks, state.weekdays), CALENDAR_COLUMNS):
+        if values is not None:
+            mask &= calendar[column].isin(values).to_numpy()
+    return mask
+
+
+def key_mask(calendar, state, keys):
+    """Return which of the date keys pass the filters of a FilterState, looking each one up in the dates kept."""
+    #indexed by the key itself, one entry per day up to the last date
+    kept = np.zeros(calendar.index[-1] + 1 if len(calendar) else 0, dtype=bool)
+    kept[calendar.index[date_mask(calendar, state)]] = True
+    return kept.take(keys)
+
+
+class FilterEngine:
+    """Bitmap indexes over the melted frame, built once when the data is loaded."""
+
+    def __init__(self, df2, groups=GROUPS):
+        self.df2 = df2
+        self.size = len(df2)
+        self.groups = groups
+        self._codes = {}
+        self._bitmaps = {}
+        items = df2['Items']
+        self._group_bitmaps = {
+            name: np.packbits(items.isin(members).to_numpy())
+            for name, members in groups.items()
+        }
+        for column in DIMENSIONS.values():
+            categorical = df2[column].astype('category')
+            codes = categorical.cat.codes.to_numpy()
+            self._codes[column] = (codes, categorical.cat.categories)
+            self._bitmaps[column] = {
+                value: np.packbits(codes == code)
+                for code, value in enumerate(categorical.cat.categories)
+            }
+        #the date of every row, and the dimension its calendar filters are resolved on
+        self._date_keys = df2[DATE_KEY].to_numpy()
+        self.calendar = date_dimension(pd.unique(self._date_keys))
+        self._date_bitmaps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def extended(self, df2):
+        """Return an engine over df2, whose first rows are the ones indexed here, indexing only the rows after them."""
+        new = df2.iloc[self.size:]
+        engine = FilterEngine.__new__(FilterEngine)
+        engine.df2 = df2
+        engine.size = len(df2)
+        engine.groups = self.groups
+        engine._group_bitmaps = {
+            name: append_bits(self._group_bitmaps[name], self.size, new['Items'].isin(members).to_numpy())
+            for name, members in self.groups.items()
+        }
+        engine._codes = {}
+        engine._bitmaps = {}
+        for column in DIMENSIONS.values():
+            #the codes of the old rows change only if the batch brought a new label
+            categorical = df2[column].astype('category')
+            codes = categorical.cat.codes.to_numpy()
+            engine._codes[column] = (codes, categorical.cat.categories)
+            new_codes = codes[self.size:]
+            engine._bitmaps[column] = {
+                value: append_bits(self._bitmaps[column].get(value, self._empty()), self.size, new_codes == code)
+                for code, value in enumerate(categorical.cat.categories)
+            }
+        #the keys need no recoding, only the batch's new dates join the dimension
+        engine._date_keys = df2[DATE_KEY].to_numpy()
+        new_keys = pd.unique(new[DATE_KEY].to_numpy())
+        if np.isin(new_keys, self.calendar.index).all():
+            engine.calendar = self.calendar
+        else:
+            engine.calendar = date_dimension(np.concatenate([self.calendar.index, new_keys]))
+        engine._date_bitmaps = OrderedDict()
+        engine._lock = threading.Lock()
+        return engine
+
+    def _empty(self):
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _date_bitmap(self, state):
+        key = (state.start_date, state.end_date, state.months, state.weeks, state.weekdays)
+        with self._lock:
+            if key in self._date_bitmaps:
+                self._date_bitmaps.move_to_end(key)
+                return self._date_bitmaps[key]
+        bitmap = np.packbits(key_mask(self.calendar, state, self._date_keys))
+        with self._lock:
+            self._date_bitmaps[key] = bitmap
+            while len(self._date_bitmaps) > DATE_BITMAPS:
+                self._date_bitmaps.popitem(last=False)
+        return bitmap
+
+    def _any_of(self, column, values):
+        bitmaps = self._bitmaps[column]
+        result = self._empty()
+        for value in values:
+            if value in bitmaps:
+                result |= bitmaps[value]
+        return result
+
+    @metrics.phase('filter')
+    def bitmap(self, state, hour=None, item=None):
+        """Return the packed bitmap of the rows that pass every filter."""
+        result = self._group_bitmaps[state.group].copy()
+        if filters_dates(state):
+            result &= self._date_bitmap(state)
+        selections = {
+            'Time': normalize_selection(hour),
+            'Items': normalize_selection(item),
+        }
+        for column, values in selections.items():
+            if values is not None:
+                result &= self._any_of(column, values)
+        return result
+
+    def positions(self, state, hour=None, item=None):
+        """Return the sorted row positions that pass every filter."""
+        return np.flatnonzero(np.unpackbits(self.bitmap(state, hour, item), count=self.size))
+
+    @metrics.phase('filter')
+    def frame(self, state, hour=None, item=None):
+        """Return the filtered rows of the melted frame, copied once."""
+        return self.df2.take(self.positions(state, hour, item))
+
+    def frames(self, state, hour=None, item=None, rows=100000):
+        """Yield the filtered rows of the melted frame in order, rows at a time, copying one chunk at a time.
+
+        At least one frame is yielded, an empty one when no row passes the filters.
+        """
+        positions = self.positions(state, hour, item)
+        for start in range(0, max(len(positions), 1), rows):
+            yield self.df2.take(positions[start:start + rows])
+
+    @metrics.phase('filter')
+    def date_range(self, state, hour=None, item=None):
+        """Return the first and last date of the filtered rows."""
+        keys = self._date_keys[self.positions(state, hour, item)]
+        first, last = key_dates([keys.min(), keys.max()])
+        return first, last
+
+    @metrics.phase('filter')
+    def unique(self, state, column, hour=None, item=None):
+        """Return the values of a label or calendar column found in the filtered rows, in order of appearance."""
+        positions = self.positions(state, hour, item)
+        if column in CALENDAR_COLUMNS:
+            #the labels of the dates found, in the order the dates first appear
+            labels = self.calendar[column].reindex(pd.unique(self._date_keys[positions]))
+            return list(pd.unique(labels.to_numpy()))
+        codes, categories = self._codes[column]
+        found = pd.unique(codes[positions])
+        return list(categories[found[found >= 0]])
+
+    def calendar_lookup(self):
+        """Return the date dimension as plain JSON for the clientside dropdown cascades.
+
+        The first and last date, one entry per distinct date in order of appearance with the codes
+        of its month, week and weekday labels, and per group the dates it has rows for (None when it has all of them)
+        and the first and last of them, which is everything unique() tells the cascades.
+        """
+        date_codes, keys = pd.factorize(self._date_keys)
+        dates = key_dates(keys)
+        calendar = self.calendar.loc[keys]
+        lookup = {
+            'default': DEFAULT_GROUP,
+            'start': pd.DatetimeIndex(dates).min().date().isoformat(),
+            'end': pd.DatetimeIndex(dates).max().date().isoformat(),
+            'dates': [date.date().isoformat() for date in pd.DatetimeIndex(dates)],
+            'labels': {},
+            'codes': {},
+            'groups': {},
+        }
+        for column in CALENDAR_COLUMNS:
+            codes, categories = pd.factorize(calendar[column], sort=True)
+            lookup['labels'][column] = [str(value) for value in categories]
+            lookup['codes'][column] = codes.tolist()
+        for name in self._group_bitmaps:
+            found = pd.unique(date_codes[self.positions(FilterState(group=name))])
+            if not len(found):
+                continue
+            group_dates = pd.DatetimeIndex(dates[found])
+            every_date = len(found) == len(dates) and (found == np.arange(len(dates))).all()
+            lookup['groups'][name] = {
+                'dates': None if every_date else found.tolist(),
+                'start': group_dates.min().isoformat(),
+                'end': group_dates.max().isoformat(),
+            }
+        return lookup
@@ -0,0 +1,161 @@
+#the next days' hourly quantity of every item, for planning the products, raw materials and crew of a store
+#A forecast is a seasonal baseline per (item, hour) series: a weekday's quantity at an hour is the mean
+#of that weekday's quantities at the hour over the last config.FORECAST_HISTORY_WEEKS weeks, each week
+#weighing half as much as the one config.FORECAST_HALF_LIFE_WEEKS after it. All the series are fitted
+#at once: the history is a (date, item x hour) array and the weighted means of the seven weekdays are
+#one matrix product with it, no model per series. An hour without a Ticket on a date (the store closed;
+#the melted frame has a row for every date, item and hour whether it opened or not) is left out of the
+#means, an item without a sale at an open hour counts as 0. A weekday the history
+#has no open day for at an hour falls back on the hour's other days. A forecast belongs to one version
+#of the data, app.py fits a new one on first use after each ingestion.
+#`python forecast.py` times the fit and backtests it on the last days of the workbook, tests/test_forecast.py checks it
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import config
+from cube import aggregator_statistic
+from dataset import DATE_KEY, GROUPS, key_dates
+from filters import FilterState
+import metrics
+from quantiles import QUANTILES
+
+#statistic -> how the forecast days of an hour are combined, skipping the hours the store is closed
+_REDUCERS = {'sum': np.nansum, 'mean': np.nanmean, 'min': np.nanmin, 'max': np.nanmax}
+
+
+def history_rows(engine, end, weeks=config.FORECAST_HISTORY_WEEKS, groups=GROUPS):
+    """The melted rows of every product group over the weeks up to end, read through an engine's frame()."""
+    start = (pd.Timestamp(end) - pd.Timedelta(days=weeks * 7 - 1)).date().isoformat()
+    return pd.concat([engine.frame(FilterState.from_inputs(group, start, None)) for group in groups])
+
+
+def open_times(date_codes, time_codes, dates, times):
+    """A (date, hour) array of whether any of the rows given, those with a Ticket, is at the date and hour."""
+    return (np.bincount(date_codes * times + time_codes, minlength=dates * times) > 0).reshape(dates, times)
+
+
+class DemandForecast:
+    """The hourly quantity of every item over the days after end, fitted from the rows of the weeks up to it."""
+
+    def __init__(self, rows, end, days=config.FORECAST_DAYS, weeks=config.FORECAST_HISTORY_WEEKS,
+                 half_life=config.FORECAST_HALF_LIFE_WEEKS):
+        end = pd.Timestamp(end)
+        history = pd.date_range(end - pd.Timedelta(days=weeks * 7 - 1), end)
+        self.dates = pd.date_range(end + pd.Timedelta(days=1), periods=days)
+        date_codes = history.get_indexer(key_dates(rows[DATE_KEY].to_numpy()))
+        rows = rows[date_codes >= 0]
+        date_codes = date_codes[date_codes >= 0]
+        item_codes, items = pd.factorize(rows['Items'].astype(str), sort=True)
+        time_codes, times = pd.factorize(rows['Time'].astype(str), sort=True)
+        self.items, self.times = list(items), list(times)
+        self._item_index = {item: i for i, item in enumerate(self.items)}
+        series = len(self.items) * len(self.times)
+
+        #the history as (date, item x hour) arrays: the quantities, and whether the store was open at the
+        #hour. Ticket is recorded per hour, so the open hours are found per (date, hour) and every item shares them
+        opened = rows['Ticket'].notna().to_numpy()
+        flat = date_codes * series + item_codes * len(self.times) + time_codes
+        quantity = np.bincount(flat[opened], weights=np.nan_to_num(rows['Quantity'].to_numpy(np.float64))[opened],
+                               minlength=len(history) * series).reshape(len(history), series)
+        open_hours = np.tile(open_times(date_codes[opened], time_codes[opened], len(history), len(self.times)),
+                             len(self.items)).astype(np.float64)
+
+        #every date weighted by the weeks between it and end, and picked by the row of its weekday
+        age = (len(history) - 1 - np.arange(len(history))) // 7
+        weights = 0.5 ** (age / half_life)
+        weekdays = (history.dayofweek.to_numpy() == np.arange(7)[:, None]) * weights
+        with np.errstate(invalid='ignore', divide='ignore'):
+            seasonal = (weekdays @ quantity) / (weekdays @ open_hours)
+            overall = (weights @ quantity) / (weights @ open_hours)
+        seasonal = np.where(np.isnan(seasonal), overall, seasonal)
+        self.values = seasonal[self.dates.dayofweek].reshape(days, len(self.items), len(self.times))
+
+    @classmethod
+    @metrics.phase('group')
+    def fit(cls, engine, **options):
+        """Fit the forecast of the days after the last date an engine (FilterEngine or PartitionEngine) holds."""
+        end = engine.calendar['Date'].max()
+        return cls(history_rows(engine, end, options.get('weeks', config.FORECAST_HISTORY_WEEKS)), end, **options)
+
+    def days(self, weekdays=None):
+        """The positions of the forecast days, only those of the given Week Days labels if any."""
+        if weekdays is None:
+            return np.arange(len(self.dates))
+        return np.flatnonzero(self.dates.day_name().isin(list(weekdays)))
+
+    def by_time(self, item, aggregator, weekdays=None, history_days=None):
+        """The item's forecast at every hour, its days combined like the aggregator combines the rows of a date range.
+
+        A Total adds up however many days the history's filters keep, not config.FORECAST_DAYS; given
+        that number, the forecast's mean day is scaled to as many days so both lines share a scale.
+        Returns a Time and a Quantity column, without the hours the store is closed on every day.
+        """
+        if item not in self._item_index:
+            return pd.DataFrame({'Time': pd.Series(dtype=object), 'Quantity': pd.Series(dtype=np.float64)})
+        statistic = aggregator_statistic(aggregator)
+        values = self.values[self.days(weekdays), self._item_index[item]]
+        with warnings.catch_warnings():
+            #an hour closed on every day is all NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if statistic == 'sum' and history_days is not None:
+                combined = np.nanmean(values, axis=0) * history_days
+            elif statistic in QUANTILES:
+                combined = np.nanquantile(values, QUANTILES[statistic], axis=0)
+            else:
+                combined = _REDUCERS[statistic](values, axis=0)
+            open_hours = ~np.isnan(values).all(axis=0)
+        return pd.DataFrame({'Time': np.array(self.times, dtype=object)[open_hours], 'Quantity': combined[open_hours]})
+
+    def label(self, weekdays=None, history_days=None):
+        """The forecast days, for a chart's legend, and the days a Total was scaled to."""
+        dates = self.dates[self.days(weekdays)]
+        label = f'Forecast {dates[0]:%d-%m} to {dates[-1]:%d-%m}' if len(dates) > 1 else f'Forecast {dates[0]:%d-%m}'
+        if history_days is not None:
+            label += f', mean day x {history_days} days'
+        return label
+
+
+def backtest(df2, days=config.FORECAST_DAYS):
+    """Forecast the workbook's last days from the ones before them, and compare with last week's quantities."""
+    import time
+
+    from filters import FilterEngine
+
+    engine = FilterEngine(df2)
+    dates = engine.calendar['Date']
+    end = dates.iloc[-1] - pd.Timedelta(days=days)
+    start = time.perf_counter()
+    forecast = DemandForecast(history_rows(engine, end), end, days)
+    seconds = time.perf_counter() - start
+
+    #the actual quantities of the held out days, and of the week before them, as the forecast's array
+    def quantities(first):
+        rows = pd.concat([engine.frame(FilterState.from_inputs(
+            group, first.date().isoformat(), (first + pd.Timedelta(days=days - 1)).date().isoformat()))
+            for group in GROUPS])
+        day = key_dates(rows[DATE_KEY].to_numpy()) - first
+        items = pd.Index(forecast.items).get_indexer(rows['Items'].astype(str))
+        times = pd.Index(forecast.times).get_indexer(rows['Time'].astype(str))
+        kept = (items >= 0) & (times >= 0) & rows['Ticket'].notna().to_numpy()
+        values = np.zeros(forecast.values.shape)
+        np.add.at(values, (day.days[kept], items[kept], times[kept]),
+                  np.nan_to_num(rows['Quantity'].to_numpy(np.float64))[kept])
+        open_hours = open_times(day.days[kept], times[kept], days, len(forecast.times))
+        return np.where(open_hours[:, None, :], values, np.nan)
+
+    actual = quantities(end + pd.Timedelta(days=1))
+    naive = quantities(end + pd.Timedelta(days=1 - 7))
+    scored = ~np.isnan(actual) & ~np.isnan(naive) & ~np.isnan(forecast.values)
+    series = forecast.values.shape[1] * forecast.values.shape[2]
+    print(f'fitted {series} item x hour series on the {config.FORECAST_HISTORY_WEEKS} weeks up to {end:%d-%m-%Y} '
+          f'in {seconds * 1000:.1f}ms, forecasting the {days} days after it')
+    for name, predicted in (('seasonal baseline', forecast.values), ('last week', naive)):
+        error = np.abs(predicted[scored] - actual[scored])
+        print(f'{name:<18} MAE {error.mean():.3f}  WAPE {error.sum() / actual[scored].sum():.1%}')
+
+if __name__ == '__main__':
+    from dataset import load_dataset
+
+    backtest(load_dataset(frames=('df2',))[2])
@@ -0,0 +1,29 @@
+#gunicorn settings for serving the dashboard in production (Linux, gunicorn does not run on Windows)
+#
+#    gunicorn -c gunicorn.conf.py app:server
+#
+#the app is imported once in the master (preload_app), which loads the dataset and builds its indexes
+#before forking, so the workers share those pages copy-on-write instead of each loading its own copy.
+#A worker is only forked once the data is loaded, so it can take requests from its first one.
+#The QSR_BIND, QSR_WORKERS, QSR_THREADS and QSR_TIMEOUT variables override the values in config.py
+import gc
+
+#not imported as config, gunicorn reads every name in this file as one of its settings
+import config as qsr_config
+
+bind = qsr_config.BIND
+workers = qsr_config.WORKERS
+threads = qsr_config.THREADS
+timeout = qsr_config.TIMEOUT
+preload_app = True
+
+
+def pre_fork(server, worker):
+    #the collector writes to the header of every object it visits, which would copy the frames' pages
+    #into each worker. Objects that exist before the fork are moved out of its reach
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info('worker %s sharing the dataset loaded by the master', worker.pid)
@@ -0,0 +1,121 @@
+#append a new batch of hourly sales (one night's export, same columns as the workbook) to the dataset
+#the batch is validated, only its own rows are melted and given their derived columns, and the
+#result is written to the dataset cache as a batch file. Running dashboards pick it up on their next
+#request and extend their indexes with the new rows instead of rebuilding them (with
+#QSR_STORAGE=partitioned the batch's Parquet partitions are written here too)
+#
+#    python ingest.py new_day.xlsx [more.csv ...]
+import argparse
+import logging
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from dataset import build_frames, feather, file_digest, load_dataset, manifest_lock, read_manifest, write_batch
+from partitions import sync_partitions
+
+logger = logging.getLogger(__name__)
+
+HOUR_LABEL = re.compile(r'^\d\d to \d\d$')
+
+
+class BatchError(ValueError):
+    """The batch cannot be appended as it is."""
+
+
+def read_batch(path):
+    """Read an Excel or CSV batch, without the unnamed index column an export may carry."""
+    if path.lower().endswith('.csv'):
+        batch = pd.read_csv(path)
+    else:
+        batch = pd.read_excel(path)
+    return batch.loc[:, [not str(column).startswith('Unnamed:') for column in batch.columns]]
+
+
+def validate_batch(batch, df1):
+    """Return the batch in the workbook's layout, or raise BatchError saying what is wrong with it."""
+    missing = [column for column in df1.columns if column not in batch.columns]
+    unknown = [column for column in batch.columns if column not in df1.columns]
+    if missing or unknown:
+        raise BatchError(f'the batch columns differ from the workbook: missing {missing}, unknown {unknown}')
+    if batch.empty:
+        raise BatchError('the batch has no rows')
+    batch = batch[list(df1.columns)].copy()
+
+    #dates as the workbook writes them, day first
+    dates = pd.to_datetime(batch['Date'], dayfirst=True, errors='coerce')
+    if dates.isna().any():
+        raise BatchError(f'unreadable dates: {batch.loc[dates.isna(), "Date"].unique().tolist()}')
+    batch['Date'] = dates.dt.strftime('%d-%m-%Y')
+
+    batch['Time'] = batch['Time'].astype(str).str.strip()
+    bad_hours = ~batch['Time'].str.match(HOUR_LABEL)
+    if bad_hours.any():
+        raise BatchError(f'unreadable hours: {batch.loc[bad_hours, "Time"].unique().tolist()}')
+
+    numbers = [column for column in df1.columns if column not in ('Date', 'Time')]
+    for column in numbers:
+        values = pd.to_numeric(batch[column], errors='coerce')
+        if (values.isna() & batch[column].notna()).any():
+            raise BatchError(f'non numeric values in {column!r}')
+        batch[column] = values.astype(np.float64)
+    #AVS Per Hour divides by the ticket count, an hour without tickets is left empty like in the workbook
+    if (batch['Ticket'] <= 0).any():
+        raise BatchError('Ticket counts have to be positive')
+
+    keys = list(zip(batch['Date'], batch['Time']))
+    if len(set(keys)) != len(keys):
+        raise BatchError('the batch repeats a date and hour')
+    known = set(zip(df1['Date'], df1['Time'])).intersection(keys)
+    if known:
+        raise BatchError(f'{len(known)} date and hour pairs are already in the dataset, e.g. {sorted(known)[0]}')
+    return batch.reset_index(drop=True)
+
+
+def ingest(path, dataset_path=config.DATASET_PATH, cache_dir=config.CACHE_DIR):
+    """Validate the batch at path and append it to the dataset cache, return the number of rows added."""
+    if feather is None:
+        raise RuntimeError('ingesting batches needs pyarrow, the batches are kept in the dataset cache')
+    start = time.perf_counter()
+    #another ingestion may be appending to the manifest, the batch is checked against the dataset it leaves
+    with manifest_lock(cache_dir):
+        #memory-mapped from the cache, this does not parse the workbook unless it changed; only df1 is
+        #validated against, the melted history is not read
+        df1 = load_dataset(dataset_path, cache_dir, frames=('df1',))[0]
+        digest = file_digest(path)
+        if any(batch['sha256'] == digest for batch in read_manifest(cache_dir).get('batches', [])):
+            logger.info('%s was already ingested', path)
+            return 0
+        batch = validate_batch(read_batch(path), df1)
+        checked = time.perf_counter()
+
+        #only the new rows are melted and derived
+        df_, df2, _ = build_frames(batch)
+        write_batch(cache_dir, {
+            'source': os.path.basename(path),
+            'sha256': digest,
+            'rows': len(batch),
+            'ingested': time.time(),
+        }, {'df1': batch, 'df_': df_, 'df2': df2})
+        logger.info('ingested %d rows from %s: validated in %.3fs, derived and written in %.3fs',
+                    len(batch), path, checked - start, time.perf_counter() - checked)
+        if config.STORAGE == 'partitioned':
+            #write the batch's partitions here rather than in whichever worker notices it first
+            sync_partitions(config.PARTITION_DIR, dataset_path, cache_dir)
+    return len(batch)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Append batches of hourly sales to the QSR dataset.')
+    parser.add_argument('paths', nargs='+', help='Excel or CSV files with the same columns as the workbook')
+    args = parser.parse_args()
+    for path in args.paths:
+        try:
+            ingest(path)
+        except BatchError as error:
+            parser.exit(1, f'{path}: {error}\n')
@@ -0,0 +1,203 @@
+#what the data held by a worker costs in memory, and what its callbacks allocate on top of it
+#report() measures the frames, indexes and caches it is handed: pandas objects by their deep
+#memory_usage, numpy arrays by the buffer they view (counted once, however many views point at it),
+#and any other object by walking its attributes and containers. The objects are measured in the
+#order given, memory shared with an earlier one is not counted again, so an engine that keeps a
+#reference to a frame reports only its own indexes. app.py serves it on /_memory with QSR_MEMORY_ENDPOINT=1.
+#With QSR_MEMORY_SAMPLE_RATE above 0, that share of the _dash-update-component requests is traced
+#with tracemalloc, which records the peak of the memory allocated while it ran, per callback.
+#tracemalloc sees the whole process: a request traced while others run is charged with their
+#allocations too, the peaks are an upper bound. One request is traced at a time per worker
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import types
+
+import flask
+import numpy as np
+import pandas as pd
+
+import config
+from metrics import callback_name
+
+#not walked into: shared by everything and not part of the data
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+_tracing = threading.Lock()
+_current = threading.local()
+
+
+def _root(array):
+    #the array owning the buffer a view looks at
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _claim_frame(frame, seen):
+    #the column arrays of a frame, so the views other objects keep of them are not counted again
+    for _, column in frame.items():
+        values = column.array
+        for array in (getattr(values, 'codes', None), getattr(values, '_ndarray', None), getattr(values, '_data', None)):
+            if isinstance(array, np.ndarray):
+                seen.add(id(_root(array)))
+    seen.add(id(frame.index))
+
+
+def deep_size(obj, seen=None):
+    """Return the bytes held by obj and everything it references, skipping the ids in seen (which it extends)."""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, np.ndarray):
+            obj = _root(obj)
+        if id(obj) in seen or isinstance(obj, _OPAQUE):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            total += obj.nbytes + sys.getsizeof(np.empty(0))
+            if obj.dtype == object:
+                stack.extend(obj.ravel())
+        elif isinstance(obj, pd.DataFrame):
+            total += int(obj.memory_usage(deep=True, index=True).sum())
+            _claim_frame(obj, seen)
+        elif isinstance(obj, (pd.Series, pd.Index)):
+            total += int(obj.memory_usage(deep=True))
+        elif hasattr(obj, 'to_plotly_json'):
+            #a plotly figure, its validators are shared by every figure
+            total += sys.getsizeof(obj)
+            stack.append(obj.to_plotly_json())
+        else:
+            total += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+            if hasattr(obj, '__dict__'):
+                stack.append(vars(obj))
+            for name in getattr(type(obj), '__slots__', ()):
+                if hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+    return total
+
+
+def process_memory():
+    """The resident memory of this process now and at its highest, in bytes (Linux)."""
+    current = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        pass
+    #ru_maxrss is in kilobytes on Linux
+    return {'rss': current, 'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+def report(objects):
+    """Measure the named objects in order, the ones that are not frames broken down by attribute."""
+    seen = set()
+    resident = {}
+    for name, obj in objects.items():
+        if obj is None:
+            continue
+        entry = {}
+        if not isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray)) and hasattr(obj, '__dict__'):
+            #each attribute measured with what the earlier ones left, so the parts add up to the total
+            seen.add(id(obj))
+            entry['parts'] = {attribute: deep_size(value, seen) for attribute, value in vars(obj).items()}
+            entry['bytes'] = sum(entry['parts'].values()) + sys.getsizeof(obj)
+        else:
+            entry['bytes'] = deep_size(obj, seen)
+            if isinstance(obj, pd.DataFrame):
+                entry['shape'] = list(obj.shape)
+        resident[name] = entry
+    return {
+        'pid': os.getpid(),
+        'process': process_memory(),
+        'resident': resident,
+        'resident_bytes': sum(entry['bytes'] for entry in resident.values()),
+        'callbacks': allocations.stats(),
+        'sample_rate': config.MEMORY_SAMPLE_RATE,
+    }
+
+
+class AllocationStats:
+    """Peaks of the memory allocated by the traced requests, per callback."""
+
+    def __init__(self):
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, peak, seconds):
+        with self._lock:
+            entry = self._callbacks.setdefault(name, {'samples': 0, 'peak_max': 0, 'peak_total': 0})
+            entry['samples'] += 1
+            entry['peak_max'] = max(entry['peak_max'], peak)
+            entry['peak_total'] += peak
+            entry['peak_last'] = peak
+            entry['traced_seconds_last'] = seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {**entry, 'peak_mean': entry['peak_total'] // entry['samples']}
+                for name, entry in sorted(self._callbacks.items())
+            }
+
+
+allocations = AllocationStats()
+
+
+def _finish_trace():
+    trace = getattr(_current, 'trace', None)
+    if trace is None:
+        return
+    _current.trace = None
+    name, baseline, stop, start = trace
+    try:
+        _, peak = tracemalloc.get_traced_memory()
+        if stop:
+            tracemalloc.stop()
+        allocations.record(name, max(peak - baseline, 0), time.perf_counter() - start)
+    finally:
+        _tracing.release()
+
+
+def install(server, rate=config.MEMORY_SAMPLE_RATE):
+    """Trace the allocations of a random share (rate) of the callback requests of a Flask server."""
+    if rate <= 0:
+        return
+
+    @server.before_request
+    def start_trace():
+        request = flask.request
+        if not request.path.endswith('/_dash-update-component') or random.random() >= rate:
+            return
+        if not _tracing.acquire(blocking=False):
+            return
+        name = callback_name(request.get_json(silent=True))
+        stop = not tracemalloc.is_tracing()
+        if stop:
+            tracemalloc.start()
+        else:
+            #someone else traces the process (PYTHONTRACEMALLOC), only the growth of this request counts
+            tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        _current.trace = (name, baseline, stop, time.perf_counter())
+
+    @server.after_request
+    def finish_trace(response):
+        _finish_trace()
+        return response
+
+    @server.teardown_request
+    def drop_trace(exc):
+        _finish_trace()
+
@@ -0,0 +1,271 @@
+#per-callback timings of the dashboard, off unless QSR_METRICS=1
+#every _dash-update-component request is timed from the moment Flask receives it, and split into
+#the phases its callback spent filtering the rows, grouping them, building the figures, in the rest of
+#its own code and, once it returned, in Dash's JSON serialisation of the response. The engines and the
+#figure builders mark their methods with phase(), the callbacks with callback(); a phase counts its
+#time less that of the phases it calls, so the phases of a request add up to its total. Each response
+#carries them in a Server-Timing header (the browser's devtools show it under Timing) and /metrics
+#exposes histograms of them and of the payload sizes in the Prometheus text format.
+#Every worker counts its own requests and writes its histograms to a file of config.METRICS_DIR after
+#each one; /metrics adds up the files of every worker, the ones that exited included, so whichever
+#worker a scrape lands on the counters only grow. The folder is emptied when the app is loaded (in
+#gunicorn's master, before it forks the workers). When the flag is off the decorators return the
+#functions unchanged and /metrics answers 404, so the requests run exactly the code they ran before
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import flask
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ENABLED = config.METRICS
+
+#in the order of a request, 'other' is the callback's own code between the marked phases
+PHASES = ('filter', 'group', 'figure', 'other', 'serialize')
+
+#upper bounds of the histogram buckets, in seconds and in bytes
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+
+#the timing of the request the current thread is answering, None outside of them
+_current = threading.local()
+
+#(pid, path) of this process' histogram file, named anew in a forked worker
+_snapshot_file = (None, None)
+_writing = threading.Lock()
+
+
+class Timing:
+    """The phases of one request, with a stack of the phases open in it."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.callback = None
+        self.returned = None
+        #one [time spent in the phases it called] per open phase
+        self.stack = []
+
+    def enter(self):
+        self.stack.append([0.0])
+        return time.perf_counter()
+
+    def leave(self, phase, start):
+        elapsed = time.perf_counter() - start
+        nested = self.stack.pop()[0]
+        self.phases[phase] += elapsed - nested
+        if self.stack:
+            self.stack[-1][0] += elapsed
+
+
+def phase(name):
+    """Count the time spent in the decorated function towards a phase of the request being answered."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timing = getattr(_current, 'timing', None)
+            if timing is None:
+                return func(*args, **kwargs)
+            start = timing.enter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing.leave(name, start)
+        return wrapper
+    return decorator
+
+
+def callback(name):
+    """Time a Dash callback under name, its own code counting as 'other'; goes under @app.callback."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        timed = phase('other')(func)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timing = getattr(_current, 'timing', None)
+            if timing is None:
+                return func(*args, **kwargs)
+            timing.callback = name
+            try:
+                return timed(*args, **kwargs)
+            finally:
+                timing.returned = time.perf_counter()
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per set of label values, like a Prometheus histogram."""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """The series as JSON-able [labels, bucket counts, sum, count] lists."""
+        with self._lock:
+            return [[list(labels), list(counts), total, count] for labels, (counts, total, count) in self._series.items()]
+
+    def exposition(self, snapshots=None):
+        """The series in the Prometheus text format, those of several snapshots added up when given."""
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        series = {}
+        for snapshot in snapshots:
+            for labels, counts, total, count in snapshot:
+                merged = series.setdefault(tuple(labels), [[0] * len(self.buckets), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(series.items()):
+            names = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, labels))
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{names},le="{float(bound)!r}"}} {bucket}')
+            lines.append(f'{self.name}_bucket{{{names},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{names}}} {total:.9g}')
+            lines.append(f'{self.name}_count{{{names}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+phase_seconds = Histogram('qsr_callback_phase_seconds', 'Time spent by the Dash callbacks in each phase.',
+                          ('callback', 'phase'), SECONDS_BUCKETS)
+request_seconds = Histogram('qsr_callback_seconds', 'Time to answer a Dash callback request.',
+                            ('callback',), SECONDS_BUCKETS)
+payload_bytes = Histogram('qsr_callback_payload_bytes', 'Size of the Dash callback responses.',
+                          ('callback',), BYTES_BUCKETS)
+HISTOGRAMS = (request_seconds, phase_seconds, payload_bytes)
+
+
+def _snapshot_path(directory):
+    #a worker started later under the same pid gets a file of its own, the exited one's counts stay
+    global _snapshot_file
+    pid, path = _snapshot_file
+    if pid != os.getpid():
+        pid = os.getpid()
+        path = os.path.join(directory, f'{pid}-{uuid.uuid4().hex}.json')
+        _snapshot_file = (pid, path)
+    return path
+
+
+def write_snapshot(directory=config.METRICS_DIR):
+    """Write this worker's histograms to its file of directory, replacing the previous ones."""
+    path = _snapshot_path(directory)
+    state = {histogram.name: histogram.snapshot() for histogram in HISTOGRAMS}
+    with _writing:
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning('could not write the metrics of worker %d to %s', os.getpid(), path)
+
+
+def read_snapshots(directory=config.METRICS_DIR):
+    """The histograms written by every worker, the current one's as of its last write."""
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            logger.warning('could not read the metrics in %s', name)
+    return snapshots
+
+
+def exposition(directory=config.METRICS_DIR):
+    """The histograms of every worker added up, in the Prometheus text format."""
+    write_snapshot(directory)
+    snapshots = read_snapshots(directory)
+    return ''.join(histogram.exposition([snapshot.get(histogram.name, []) for snapshot in snapshots])
+                   for histogram in HISTOGRAMS)
+
+
+def callback_name(body):
+    """The first output of a callback request, for the callbacks not marked with callback()."""
+    output = (body or {}).get('output', '')
+    return output.strip('.').split('...')[0]
+
+
+def record(timing, response, end):
+    """Add a finished request to the histograms and its phases to the Server-Timing header of its response."""
+    name = timing.callback or callback_name(flask.request.get_json(silent=True))
+    if timing.returned is not None:
+        timing.phases['serialize'] = end - timing.returned
+    total = end - timing.start
+    size = response.calculate_content_length() or 0
+    request_seconds.observe(total, name)
+    payload_bytes.observe(size, name)
+    for phase_name, seconds in timing.phases.items():
+        phase_seconds.observe(seconds, name, phase_name)
+    entries = [f'{phase_name};dur={seconds * 1000:.3f}' for phase_name, seconds in timing.phases.items()]
+    entries.append(f'total;dur={total * 1000:.3f};desc="{name}, {size} bytes"')
+    response.headers['Server-Timing'] = ', '.join(entries)
+    write_snapshot()
+
+
+def install(server):
+    """Time the callback requests of a Flask server and expose the histograms on /metrics, when enabled."""
+    if not ENABLED:
+        @server.route('/metrics')
+        def metrics_disabled():
+            #not Dash's catch-all, which would answer a scraper with the dashboard's page
+            return flask.Response('metrics are off, set QSR_METRICS=1\n', status=404, mimetype='text/plain')
+        return
+
+    #the counts of an earlier run of the app are not carried over
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    for name in os.listdir(config.METRICS_DIR):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(config.METRICS_DIR, name))
+
+    @server.before_request
+    def start_timing():
+        if flask.request.path.endswith('/_dash-update-component'):
+            _current.timing = Timing()
+
+    @server.after_request
+    def finish_timing(response):
+        timing = getattr(_current, 'timing', None)
+        if timing is not None:
+            _current.timing = None
+            record(timing, response, time.perf_counter())
+        return response
+
+    @server.teardown_request
+    def drop_timing(exc):
+        #a request that raised never reached after_request, the thread answers others next
+        _current.timing = None
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(exposition(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,402 @@
+#date-partitioned copy of the melted frame, for data that outgrows one worker's memory
+#the rows are written as Parquet files partitioned by calendar month and product group
+#(month=2022-03/group=cereal_packages/part-*.parquet), every ingested batch adding its own files.
+#With QSR_STORAGE=partitioned the workers do not hold the melted frame: a query reads only the
+#partitions of its group whose month overlaps the selected dates and months, through a cache of
+#recently used partitions bounded in bytes. Median and P90 come from quantile sketches (quantiles.py):
+#a month the filters cover entirely is answered by the sketch of its partition, kept in the same cache,
+#the others by a sketch of their filtered rows. `python partitions.py` writes the partitions, tests/test_partitions.py
+#checks them against the in-memory engines
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import config
+from cube import MEASURES, _empty, aggregator_statistic
+from dataset import (CALENDAR_COLUMNS, DATE_KEY, GROUPS, LABEL_COLUMNS, date_dimension, date_keys, key_dates,
+                     load_dataset, read_batches, read_manifest)
+from filters import DEFAULT_GROUP, key_mask, normalize_selection
+import metrics
+from quantiles import QUANTILES, sketch, sketch_quantiles
+
+logger = logging.getLogger(__name__)
+
+#bump this whenever the layout of the partitions changes so that they are written again
+PARTITION_FORMAT = 2
+#the items that are in no product group, no query reads them
+UNGROUPED = 'ungrouped'
+
+
+def _state_path(root):
+    return os.path.join(root, 'partitions.json')
+
+
+def read_state(root=config.PARTITION_DIR):
+    """Return what the partitions hold: the workbook and batches written, and a summary of every file."""
+    try:
+        with open(_state_path(root)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(root, state):
+    tmp = _state_path(root) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path(root))
+
+
+def write_partitions(df2, root, tag, groups=GROUPS):
+    """Write the rows of df2 into their (month, group) partitions as part-{tag}.parquet and return a summary of each file.
+
+    The index (the row's position in the melted frame) is kept, the readers sort by it to return
+    the rows in the order of the melted frame.
+    """
+    #the month of each distinct date, then of each row
+    calendar = date_dimension(pd.unique(df2[DATE_KEY].to_numpy()))
+    months = calendar['Date'].dt.strftime('%Y-%m').reindex(df2[DATE_KEY].to_numpy()).to_numpy()
+    membership = {item: name for name, members in groups.items() for item in members}
+    row_groups = df2['Items'].astype(str).map(membership).fillna(UNGROUPED)
+    summaries = []
+    for (month, group), rows in df2.groupby([months, row_groups], sort=True):
+        directory = os.path.join(root, f'month={month}', f'group={group}')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'part-{tag}.parquet')
+        rows.to_parquet(path + '.tmp', index=True)
+        os.replace(path + '.tmp', path)
+        #the first row of each date, for the calendar lookup
+        first = rows.index.to_series().groupby(rows[DATE_KEY].to_numpy()).min()
+        summaries.append({
+            'month': month,
+            'group': group,
+            'file': os.path.relpath(path, root),
+            'rows': len(rows),
+            'dates': {date.date().isoformat(): int(row) for date, row in zip(key_dates(first.index), first)},
+        })
+    return summaries
+
+
+def sync_partitions(root=config.PARTITION_DIR, dataset_path=config.DATASET_PATH, cache_dir=config.CACHE_DIR):
+    """Bring the partitions up to date with the dataset cache and return the dataset version.
+
+    Batches ingested since the partitions were written only add their own files, a new workbook
+    writes them all again.
+    """
+    #refreshes the dataset cache if the workbook changed, without loading any frame
+    version = load_dataset(dataset_path, cache_dir, frames=())[3]
+    manifest = read_manifest(cache_dir)
+    batches = manifest.get('batches', [])
+    state = read_state(root)
+    current = (state is not None and state['format'] == PARTITION_FORMAT
+               and state['workbook'] == manifest['sha256']
+               and [batch['sha256'] for batch in batches[:len(state['batches'])]] == state['batches'])
+    if current and len(state['batches']) == len(batches):
+        return version
+
+    start = time.perf_counter()
+    os.makedirs(root, exist_ok=True)
+    if current:
+        missing = batches[len(state['batches']):]
+        for batch, frames in zip(missing, read_batches(cache_dir, missing, ('df2',))):
+            rows = frames['df2']
+            rows.index = pd.RangeIndex(state['rows'], state['rows'] + len(rows))
+            state['partitions'] += write_partitions(rows, root, batch['sha256'][:16])
+            state['batches'].append(batch['sha256'])
+            state['rows'] += len(rows)
+        logger.info('partitioned %d ingested batches in %.3fs', len(missing), time.perf_counter() - start)
+    else:
+        df2 = load_dataset(dataset_path, cache_dir, frames=('df2',))[2]
+        state = {
+            'format': PARTITION_FORMAT,
+            'workbook': manifest['sha256'],
+            'batches': [batch['sha256'] for batch in batches],
+            'rows': len(df2),
+            'partitions': write_partitions(df2, root, version[:16]),
+        }
+        logger.info('partitioned %d rows in %.3fs', len(df2), time.perf_counter() - start)
+    _write_state(root, state)
+    _remove_unlisted(root, state)
+    return version
+
+
+def _remove_unlisted(root, state):
+    #files of an older workbook, the readers only ever open the files the state lists
+    listed = {os.path.normpath(summary['file']) for summary in state['partitions']}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.normpath(os.path.relpath(os.path.join(directory, name), root))
+            if name.endswith('.parquet') and path not in listed:
+                os.remove(os.path.join(root, path))
+
+
+class PartitionCache:
+    """Recently read partitions, the least recently used dropped once they take more than max_bytes."""
+
+    def __init__(self, max_bytes=config.PARTITION_CACHE_MB << 20):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        frame = load()
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (frame, size)
+                self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self.bytes -= dropped
+        return frame
+
+    def stats(self):
+        with self._lock:
+            return {
+                'partitions': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class PartitionEngine:
+    """Answers the callbacks' queries (FilterEngine's and AggregateCube's) from the partitions."""
+
+    def __init__(self, root=config.PARTITION_DIR, groups=GROUPS, cache=None):
+        self.root = root
+        self.groups = groups
+        self.cache = cache if cache is not None else PartitionCache()
+        state = read_state(root)
+        self.size = state['rows']
+        self._summaries = state['partitions']
+        self._partitions = {}
+        for summary in self._summaries:
+            self._partitions.setdefault((summary['month'], summary['group']), []).append(summary['file'])
+        #the dimension the calendar filters are resolved on, from the dates the summaries list
+        dates = {date for summary in self._summaries for date in summary['dates']}
+        self.calendar = date_dimension(date_keys(pd.to_datetime(sorted(dates))))
+
+    def extended(self, df2=None):
+        """Return an engine over the partitions as they are now, sharing the cache of partitions read."""
+        #a partition that gained a file is cached under a new key, the old entry ages out
+        return PartitionEngine(self.root, self.groups, self.cache)
+
+    def _read(self, files):
+        frames = [pd.read_parquet(os.path.join(self.root, name)) for name in files]
+        frame = pd.concat(frames) if len(frames) > 1 else frames[0]
+        #the batches' label categories differ from the workbook's, concatenating them gives objects
+        for column in LABEL_COLUMNS:
+            if not isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = frame[column].astype('category')
+        return frame
+
+    def _month_passes(self, month, state):
+        if state.start_date is not None and month < state.start_date[:7]:
+            return False
+        if state.end_date is not None and month > state.end_date[:7]:
+            return False
+        return state.months is None or pd.Period(month).strftime('%B') in state.months
+
+    def _covers(self, month, state):
+        #every date of the month passes the filters
+        if state.weeks is not None or state.weekdays is not None or not self._month_passes(month, state):
+            return False
+        period = pd.Period(month)
+        return ((state.start_date is None or state.start_date <= period.start_time.date().isoformat())
+                and (state.end_date is None or state.end_date >= period.end_time.date().isoformat()))
+
+    def _partition_keys(self, state):
+        #the partitions of the state's group whose month can pass its filters, in month order
+        return sorted(key for key in self._partitions if key[1] == state.group and self._month_passes(key[0], state))
+
+    def _partition_frame(self, key):
+        return self.cache.get((key, tuple(self._partitions[key])), lambda: self._read(self._partitions[key]))
+
+    def _partition_frames(self, state):
+        for key in self._partition_keys(state):
+            yield self._partition_frame(key)
+
+    def _mask(self, frame, state, hour, item):
+        mask = key_mask(self.calendar, state, frame[DATE_KEY].to_numpy())
+        selections = {
+            'Time': normalize_selection(hour),
+            'Items': normalize_selection(item),
+        }
+        for column, values in selections.items():
+            if values is not None:
+                mask &= frame[column].isin(values).to_numpy()
+        return mask
+
+    @metrics.phase('filter')
+    def frame(self, state, hour=None, item=None):
+        """Return the filtered rows, in the order of the melted frame, reading only the partitions they can be in."""
+        frames = list(self._partition_frames(state))
+        if not frames:
+            return pd.DataFrame(columns=[DATE_KEY, *LABEL_COLUMNS, *MEASURES])
+        frame = pd.concat(frames) if len(frames) > 1 else frames[0]
+        return frame[self._mask(frame, state, hour, item)].sort_index()
+
+    def frames(self, state, hour=None, item=None, rows=100000):
+        """Yield the filtered rows month by month, rows at a time, holding one partition at a time.
+
+        At least one frame is yielded, an empty one when no row passes the filters.
+        """
+        empty = True
+        for frame in self._partition_frames(state):
+            frame = frame[self._mask(frame, state, hour, item)].sort_index()
+            for start in range(0, len(frame), rows):
+                empty = False
+                yield frame.iloc[start:start + rows]
+        if empty:
+            yield pd.DataFrame(columns=[DATE_KEY, *LABEL_COLUMNS, *MEASURES])
+
+    @metrics.phase('filter')
+    def date_range(self, state, hour=None, item=None):
+        """Return the first and last date of the filtered rows."""
+        keys = self.frame(state, hour, item)[DATE_KEY]
+        first, last = key_dates([keys.min(), keys.max()])
+        return first, last
+
+    @metrics.phase('filter')
+    def unique(self, state, column, hour=None, item=None):
+        """Return the values of a label or calendar column found in the filtered rows, in order of appearance."""
+        frame = self.frame(state, hour, item)
+        if column in CALENDAR_COLUMNS:
+            values = self.calendar[column].reindex(pd.unique(frame[DATE_KEY].to_numpy())).to_numpy()
+        else:
+            values = frame[column]
+        return [str(value) for value in pd.unique(values)]
+
+    def calendar_lookup(self):
+        """Return the date dimension for the clientside cascades, like FilterEngine.calendar_lookup, from the summaries."""
+        first_row = {}
+        group_rows = {}
+        for summary in self._summaries:
+            rows = group_rows.setdefault(summary['group'], {})
+            for date, row in summary['dates'].items():
+                first_row[date] = min(row, first_row.get(date, row))
+                rows[date] = min(row, rows.get(date, row))
+        dates = sorted(first_row, key=first_row.get)
+        position = {date: i for i, date in enumerate(dates)}
+        labels = self.calendar.set_index('Date').loc[pd.to_datetime(dates)]
+        lookup = {
+            'default': DEFAULT_GROUP,
+            'start': min(dates),
+            'end': max(dates),
+            'dates': dates,
+            'labels': {},
+            'codes': {},
+            'groups': {},
+        }
+        for column in CALENDAR_COLUMNS:
+            categories = sorted(labels[column].unique())
+            codes = {value: code for code, value in enumerate(categories)}
+            lookup['labels'][column] = categories
+            lookup['codes'][column] = [codes[value] for value in labels[column]]
+        for name in self.groups:
+            if name not in group_rows:
+                continue
+            found = sorted(group_rows[name], key=group_rows[name].get)
+            lookup['groups'][name] = {
+                'dates': None if found == dates else [position[date] for date in found],
+                'start': pd.Timestamp(min(found)).isoformat(),
+                'end': pd.Timestamp(max(found)).isoformat(),
+            }
+        return lookup
+
+    def _aggregate(self, frame, key, measures, statistic):
+        if frame.empty:
+            return _empty(key, measures)
+        values = frame[measures].astype(np.float64)
+        #grouped by the labels as strings, sorted like the groupbys over the original frame
+        return values.groupby(frame[key].astype(str).rename(key)).agg(statistic).reset_index()
+
+    @metrics.phase('filter')
+    def _sketches(self, state, hour, item, key, measures):
+        #the sketches of the months the filters cover, cut down to the hour or item, and of the other
+        #months' filtered rows
+        selections = {'Time': normalize_selection(hour), 'Items': normalize_selection(item)}
+        sketches = []
+        for partition in self._partition_keys(state):
+            if self._covers(partition[0], state):
+                found = self.cache.get(('sketch', partition, tuple(self._partitions[partition])),
+                                       lambda: sketch(self._partition_frame(partition), ['Items', 'Time'], MEASURES))
+                keep = np.ones(len(found), dtype=bool)
+                for column, values in [*selections.items(), ('Measure', measures)]:
+                    if values is not None:
+                        labels = found[column].cat
+                        keep &= np.isin(labels.codes.to_numpy(), labels.categories.get_indexer(list(values)))
+                found = found[keep]
+            else:
+                frame = self._partition_frame(partition)
+                found = sketch(frame[self._mask(frame, state, hour, item)], [key], measures)
+            if len(found):
+                sketches.append(found)
+        return sketches
+
+    def _quantiles(self, state, hour, item, key, measures, statistic):
+        sketches = self._sketches(state, hour, item, key, measures)
+        if not sketches:
+            return _empty(key, measures)
+        return sketch_quantiles(sketches, key, measures, QUANTILES[statistic])
+
+    @metrics.phase('group')
+    def by_item(self, state, hour, aggregator):
+        """Aggregate the group's items at one hour, like groupby('Items') on the filtered rows."""
+        statistic = aggregator_statistic(aggregator)
+        if statistic in QUANTILES:
+            return self._quantiles(state, hour, None, 'Items', MEASURES, statistic)
+        return self._aggregate(self.frame(state, hour=hour), 'Items', MEASURES, statistic)
+
+    @metrics.phase('group')
+    def by_time(self, state, item, aggregator, measures=MEASURES):
+        """Aggregate one item at every hour, like groupby('Time') on the filtered rows."""
+        statistic = aggregator_statistic(aggregator)
+        if statistic in QUANTILES:
+            return self._quantiles(state, None, item, 'Time', list(measures), statistic)
+        return self._aggregate(self.frame(state, item=item), 'Time', list(measures), statistic)
+
+    @metrics.phase('group')
+    def by_time_windows(self, windows, aggregator):
+        """Aggregate the quantity of several (FilterState, item) windows at every hour, like AggregateCube's, in one groupby.
+
+        The quantiles merge each window's sketches on their own.
+        """
+        statistic = aggregator_statistic(aggregator)
+        if statistic in QUANTILES:
+            answers = [self._quantiles(state, None, item, 'Time', ['Quantity'], statistic).set_index('Time')['Quantity']
+                       for state, item in windows]
+            values = pd.concat(answers, axis=1, keys=range(len(windows))).T.sort_index(axis=1)
+            return list(values.columns), values.to_numpy(np.float64).reshape(len(windows), -1)
+        frames = [self.frame(state, item=item) for state, item in windows]
+        window = np.repeat(np.arange(len(windows)), [len(frame) for frame in frames])
+        if not len(window):
+            return [], np.empty((len(windows), 0))
+        frame = pd.concat(frames)
+        times = frame['Time'].astype(str).to_numpy()
+        values = (frame['Quantity'].astype(np.float64)
+                  .groupby([window, times]).agg(statistic)
+                  .unstack())
+        return list(values.columns), values.reindex(range(len(windows))).to_numpy()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sync_partitions()
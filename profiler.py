@@ -0,0 +1,223 @@
+#profiles of single callback requests, taken on demand in production
+#with QSR_PROFILE set to 'cprofile' (deterministic, every call counted) or 'sampling' (the request's
+#stack read every QSR_PROFILE_INTERVAL seconds, cheap enough for the slow cases), a
+#_dash-update-component request carrying an X-QSR-Profile header whose value is one of the tokens in
+#QSR_PROFILE_TOKENS is profiled from the moment Flask receives it until its response is built:
+#
+#    curl -H 'X-QSR-Profile: <token>' -H 'Content-Type: application/json' -d @request.json \
+#        http://host:8050/_dash-update-component
+#
+#(the body is the one the browser sends, copied from its devtools). The profile lands in
+#QSR_PROFILE_DIR named after the callback's outputs and a digest of its normalised inputs, next to a
+#.json with both in full, and the response names it in an X-QSR-Profile-File header. A .pstats opens
+#with `python -m pstats` or snakeviz, a .folded (one stack per line with its sample count) with
+#flamegraph.pl, inferno or speedscope. `python profiler.py` lists the profiles, `python profiler.py
+#<file>` prints the heaviest functions of one. One request is profiled at a time per worker, the
+#others run as usual. Without the flag or without tokens no hook is installed
+import cProfile
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import flask
+
+import config
+from filters import normalize_date, normalize_group, normalize_selection
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-QSR-Profile'
+MODES = ('cprofile', 'sampling')
+
+#only one profiled request at a time, a second one carrying the header runs unprofiled
+_busy = threading.Lock()
+#the profile of the request the current thread is answering, None outside of them
+_current = threading.local()
+
+
+def output_ids(body):
+    """The outputs of a callback request, as component_id.property strings."""
+    return body.get('output', '').strip('.').split('...')
+
+
+def normalized_inputs(body):
+    """The inputs and states of a callback request in canonical form, the ones left empty dropped.
+
+    Group, dates and multi-value dropdowns are normalised the way the callbacks' FilterState does,
+    so two requests for the same filters carry the same tag however the browser ordered them.
+    """
+    inputs = {}
+    for entry in body.get('inputs', []) + body.get('state', []):
+        #pattern-matching inputs come as lists of entries
+        for item in entry if isinstance(entry, list) else [entry]:
+            component, prop, value = item.get('id'), item.get('property'), item.get('value')
+            if isinstance(component, dict):
+                component = json.dumps(component, sort_keys=True)
+            if component == 'dataset_group':
+                value = normalize_group(value)
+            elif prop in ('start_date', 'end_date'):
+                value = normalize_date(value)
+            elif isinstance(value, list):
+                value = normalize_selection(value)
+            if value is None or value == '':
+                continue
+            inputs[f'{component}.{prop}'] = list(value) if isinstance(value, tuple) else value
+    return dict(sorted(inputs.items()))
+
+
+def profile_name(outputs, inputs):
+    """A file name for a profile, readable from its outputs and unique to its inputs."""
+    components = dict.fromkeys(output.rsplit('.', 1)[0] for output in outputs)
+    readable = re.sub(r'[^A-Za-z0-9_+-]', '_', '+'.join(components))[:80]
+    digest = hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:10]
+    return f'{time.strftime("%Y%m%dT%H%M%S")}-{readable}-{digest}'
+
+
+class StackSampler:
+    """Count the stacks of one thread, read by a background thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval=config.PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='qsr-profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class RequestProfile:
+    """A profiler running over the request of the current thread."""
+
+    def __init__(self, body, mode=config.PROFILE):
+        self.outputs = output_ids(body)
+        self.inputs = normalized_inputs(body)
+        self.mode = mode
+        self.start = time.perf_counter()
+        if mode == 'sampling':
+            self.profiler = StackSampler(threading.get_ident())
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def finish(self, status, directory=config.PROFILE_DIR):
+        """Stop the profiler and write its file and the tags next to it, returning the file's name."""
+        seconds = time.perf_counter() - self.start
+        if self.mode == 'sampling':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        name = profile_name(self.outputs, self.inputs)
+        filename = f'{name}.folded' if self.mode == 'sampling' else f'{name}.pstats'
+        path = os.path.join(directory, filename)
+        if self.mode == 'sampling':
+            self.profiler.dump(path)
+        else:
+            self.profiler.dump_stats(path)
+        with open(os.path.join(directory, f'{name}.json'), 'w') as f:
+            json.dump({'file': filename, 'mode': self.mode, 'outputs': self.outputs, 'inputs': self.inputs,
+                       'seconds': seconds, 'status': status, 'pid': os.getpid()}, f, indent=1, default=str)
+        logger.info('profiled %s in %.3fs to %s', '+'.join(self.outputs), seconds, path)
+        return filename
+
+
+def _stop(status):
+    profile = getattr(_current, 'profile', None)
+    if profile is None:
+        return None
+    _current.profile = None
+    try:
+        return profile.finish(status)
+    finally:
+        _busy.release()
+
+
+def install(server, mode=config.PROFILE, tokens=config.PROFILE_TOKENS):
+    """Profile the callback requests of a Flask server that carry an allowed X-QSR-Profile header."""
+    if not mode:
+        return
+    if mode not in MODES or not tokens:
+        logger.warning('request profiling is off: QSR_PROFILE must be one of %s and QSR_PROFILE_TOKENS set', MODES)
+        return
+
+    @server.before_request
+    def start_profile():
+        request = flask.request
+        if request.headers.get(HEADER) not in tokens or not request.path.endswith('/_dash-update-component'):
+            return
+        if not _busy.acquire(blocking=False):
+            logger.info('another request is being profiled, this one runs unprofiled')
+            return
+        _current.profile = RequestProfile(request.get_json(silent=True) or {}, mode)
+
+    @server.after_request
+    def finish_profile(response):
+        filename = _stop(response.status_code)
+        if filename is not None:
+            response.headers['X-QSR-Profile-File'] = filename
+        return response
+
+    @server.teardown_request
+    def drop_profile(exc):
+        #a request that raised is the one most worth keeping
+        _stop('error')
+
+
+def summarise(path, limit=25):
+    """Print the functions a profile spent the most time in."""
+    if path.endswith('.folded'):
+        own, total = Counter(), 0
+        with open(path) as f:
+            for line in f:
+                stack, count = line.rsplit(' ', 1)
+                own[stack.rsplit(';', 1)[-1]] += int(count)
+                total += int(count)
+        print(f'{total} samples, where they were taken:')
+        for frame, count in own.most_common(limit):
+            print(f'{count:8d} {count / total:6.1%}  {frame}')
+    else:
+        import pstats
+        pstats.Stats(path).sort_stats('cumulative').print_stats(limit)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        summarise(sys.argv[1])
+    else:
+        directory = config.PROFILE_DIR
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json')) if os.path.isdir(directory) else []
+        for name in names:
+            with open(os.path.join(directory, name)) as f:
+                tags = json.load(f)
+            print(f'{tags["file"]}  {tags["seconds"] * 1000:.1f}ms  {tags["status"]}  {json.dumps(tags["inputs"])}')
+        if not names:
+            print(f'no profiles in {directory}')
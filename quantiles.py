@@ -0,0 +1,268 @@
+#the Median and P90 aggregators, without sorting anything at request time
+#The in-memory engines keep every (item, hour) cell's values sorted once, when the data is loaded,
+#each value next to the position of its date: a quantile over any set of dates is then a pass over
+#the cell keeping the values whose date is selected, the k-th of them found by counting, never a
+#sort. The partition engine holds no rows; each partition gets a sketch instead, the counts of its
+#values in logarithmic buckets per (item, hour) cell (a DDSketch). Sketches merge by adding their
+#counts, so the months a filter covers entirely are answered from their partitions' sketches and
+#only the partially covered months read rows; every quantile a sketch gives is within
+#config.QUANTILE_SKETCH_ALPHA of the exact value, relatively. The answers interpolate between the two
+#values around the rank like pandas' quantile. `python quantiles.py` measures both against it
+import numpy as np
+import pandas as pd
+
+import config
+
+#statistic -> the quantile it is
+QUANTILES = {'median': 0.5, 'p90': 0.9}
+
+
+def masked_quantile(values, keep, q):
+    """The q-quantile of the kept values along the last axis of values, which is sorted, NaN where none is kept."""
+    count = keep.sum(axis=-1)
+    position = q * (count - 1)
+    below = np.floor(position).astype(np.int64)
+    #how many values are kept up to each one: the k-th kept value is the first whose rank passes k
+    rank = np.cumsum(keep, axis=-1)
+    last = values.shape[-1] - 1
+    low_at = np.minimum((rank <= below[..., None]).sum(axis=-1), last)
+    high_at = np.minimum((rank <= np.minimum(below + 1, count - 1)[..., None]).sum(axis=-1), last)
+    low = np.take_along_axis(values, low_at[..., None], axis=-1)[..., 0]
+    high = np.take_along_axis(values, high_at[..., None], axis=-1)[..., 0]
+    with np.errstate(invalid='ignore'):
+        return np.where(count > 0, low + (high - low) * (position - below), np.nan)
+
+
+def insertion_points(rows, counts, values):
+    """For every value, how many of the first counts values of its row (sorted along the last axis) are not greater.
+
+    A binary search run on all the values at once; NaN values get an arbitrary point.
+    """
+    low = np.zeros(values.shape, dtype=np.int64)
+    high = np.broadcast_to(counts[:, None], values.shape).astype(np.int64)
+    last = rows.shape[-1] - 1
+    while (low < high).any():
+        active = low < high
+        middle = (low + high) // 2
+        probe = np.take_along_axis(rows, np.minimum(middle, last), axis=-1)
+        after = active & (probe <= values)
+        low = np.where(after, middle + 1, low)
+        high = np.where(active & ~after, middle, high)
+    return low
+
+
+class SortedCells:
+    """The values of every cell sorted once, each with the position of its date, for exact quantiles over any dates.
+
+    A cell's values fill the last axis, padded with NaN given the date past the last one (missing),
+    which no date mask selects.
+    """
+
+    def __init__(self, cells, dates, values, shape, missing):
+        #cells is the flat position in shape of each value's cell and dates the position of its date
+        valid = ~np.isnan(values)
+        cells, dates, values = cells[valid], dates[valid], values[valid]
+        order = np.lexsort((values, cells))
+        cells, dates, values = cells[order], dates[order], values[order]
+        size = int(np.prod(shape))
+        counts = np.bincount(cells, minlength=size)
+        slots = np.arange(len(cells)) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = int(counts.max(initial=0))
+        self.missing = missing
+        self.values = np.full((size, width), np.nan)
+        self.values[cells, slots] = values
+        self.dates = np.full((size, width), missing, dtype=self._dtype(missing))
+        self.dates[cells, slots] = dates
+        self.values = self.values.reshape(tuple(shape) + (width,))
+        self.dates = self.dates.reshape(tuple(shape) + (width,))
+
+    @staticmethod
+    def _dtype(missing):
+        return np.int16 if missing <= np.iinfo(np.int16).max else np.int32
+
+    def concat(self, other):
+        """Return the cells of these dates followed by other's, whose date positions come after them.
+
+        Both are sorted already, so other's values are merged in: each is placed after the values here
+        that are not greater (a binary search per value), the values here fill the slots left in order.
+        Nothing is sorted again, the cost is the copy into the wider arrays.
+        """
+        cells = SortedCells.__new__(SortedCells)
+        cells.missing = self.missing + other.missing
+        dtype = self._dtype(cells.missing)
+        shape = self.values.shape[:-1]
+        size = int(np.prod(shape))
+        old_values = self.values.reshape(size, self.values.shape[-1])
+        old_dates = self.dates.reshape(size, self.dates.shape[-1])
+        new_values = other.values.reshape(size, other.values.shape[-1])
+        new_dates = other.dates.reshape(size, other.dates.shape[-1])
+        old_count = (~np.isnan(old_values)).sum(axis=-1)
+        new_valid = ~np.isnan(new_values)
+        total = old_count + new_valid.sum(axis=-1)
+        width = int(total.max(initial=0))
+        #the slot of every new value: the old values before it, plus the new values before it
+        slots = insertion_points(old_values, old_count, new_values) + np.arange(new_values.shape[-1])
+        rows = np.broadcast_to(np.arange(size)[:, None], new_values.shape)
+        taken = np.zeros((size, width), dtype=bool)
+        taken[rows[new_valid], slots[new_valid]] = True
+        cells.values = np.full((size, width), np.nan)
+        cells.values[rows[new_valid], slots[new_valid]] = new_values[new_valid]
+        cells.dates = np.full((size, width), cells.missing, dtype=dtype)
+        cells.dates[rows[new_valid], slots[new_valid]] = new_dates[new_valid].astype(dtype) + self.missing
+        #row by row, the free slots come in order, like the old values of each row
+        free = ~taken & (np.arange(width) < total[:, None])
+        old_valid = ~np.isnan(old_values)
+        cells.values[free] = old_values[old_valid]
+        cells.dates[free] = old_dates[old_valid]
+        cells.values = cells.values.reshape(shape + (width,))
+        cells.dates = cells.dates.reshape(shape + (width,))
+        return cells
+
+    def quantile(self, date_mask, index, q):
+        """The q-quantile of the values of the dates date_mask selects, for the cells index picks."""
+        return masked_quantile(self.values[index], np.r_[date_mask, False][self.dates[index]], q)
+
+    def windows_quantile(self, date_masks, index, q):
+        """quantile() for several date masks at once, the first axis of index picking the cells of each."""
+        selected = np.concatenate([date_masks, np.zeros((len(date_masks), 1), dtype=bool)], axis=1)
+        dates = self.dates[index]
+        rows = np.arange(len(date_masks)).reshape((-1,) + (1,) * (dates.ndim - 1))
+        return masked_quantile(self.values[index], selected[rows, dates], q)
+
+
+#the bucket of missing values, after every other; zero has bucket 0, negative values negative buckets
+MISSING_BUCKET = np.iinfo(np.int32).max
+#values closer to zero than this share the first bucket
+SMALLEST = 1e-9
+
+
+def _gamma(alpha):
+    return (1 + alpha) / (1 - alpha)
+
+
+def _bucket_offset(alpha):
+    #shifts the bucket indexes so that the first bucket of positive values is 1
+    return 1 - int(np.ceil(np.log(SMALLEST) / np.log(_gamma(alpha))))
+
+
+def buckets(values, alpha=config.QUANTILE_SKETCH_ALPHA):
+    """The sketch bucket of each value: ordered like the values, every value of a bucket within alpha of its middle."""
+    magnitude = np.maximum(np.abs(values), SMALLEST)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.ceil(np.log(magnitude) / np.log(_gamma(alpha))).astype(np.int64) + _bucket_offset(alpha)
+    index = np.where(values < 0, -index, np.where(values > 0, index, 0))
+    return np.where(np.isnan(values), MISSING_BUCKET, index).astype(np.int32)
+
+
+def bucket_values(index, alpha=config.QUANTILE_SKETCH_ALPHA):
+    """The value a bucket stands for, the inverse of buckets()."""
+    gamma = _gamma(alpha)
+    magnitude = 2 * gamma ** (np.abs(index) - _bucket_offset(alpha)) / (gamma + 1)
+    return np.where(index == 0, 0.0, np.sign(index) * magnitude)
+
+
+def sketch(frame, keys, measures, alpha=config.QUANTILE_SKETCH_ALPHA):
+    """Sketch the measures of frame's rows per keys, a frame counting the rows of each (keys, Measure, Bucket).
+
+    Missing values are counted in MISSING_BUCKET, the keys of rows with no value still appear.
+    """
+    #the labels as categories of strings, cheap to select from a cached sketch
+    labels = {key: pd.Categorical(frame[key].astype(str).to_numpy()) for key in keys}
+    parts = [pd.DataFrame({**labels, 'Measure': pd.Categorical([measure] * len(frame), categories=measures),
+                           'Bucket': buckets(frame[measure].to_numpy(np.float64), alpha)})
+             for measure in measures]
+    rows = pd.concat(parts, ignore_index=True)
+    return rows.groupby([*keys, 'Measure', 'Bucket'], sort=False, observed=True).size().rename('Count').reset_index()
+
+
+def sketch_quantiles(sketches, key, measures, q, alpha=config.QUANTILE_SKETCH_ALPHA):
+    """Merge sketches and return the q-quantile of each measure per key, sorted by key like a groupby."""
+    merged = pd.concat(sketches, ignore_index=True)
+    merged = merged.groupby([merged[key].astype(str), merged['Measure'].astype(str), 'Bucket'])['Count'].sum()
+    keys = merged.index.get_level_values(0).to_numpy()
+    names = merged.index.get_level_values(1).to_numpy()
+    index = merged.index.get_level_values(2).to_numpy()
+    #the cells (key, measure) are contiguous runs, their buckets in the order of the values
+    starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]) | (names[1:] != names[:-1])])
+    counts = np.where(index == MISSING_BUCKET, 0, merged.to_numpy())
+    ends = np.cumsum(counts)
+    before = np.r_[0, ends][starts]
+    count = np.add.reduceat(counts, starts)
+    position = q * (count - 1)
+    below = np.floor(position).astype(np.int64)
+    #the bucket holding the k-th value of a cell is the first whose running count passes k
+    low_at = np.minimum(np.searchsorted(ends, before + below, side='right'), len(ends) - 1)
+    high_at = np.minimum(np.searchsorted(ends, before + np.minimum(below + 1, count - 1), side='right'), len(ends) - 1)
+    with np.errstate(invalid='ignore', over='ignore'):
+        low, high = bucket_values(index[low_at], alpha), bucket_values(index[high_at], alpha)
+        values = np.where(count > 0, low + (high - low) * (position - below), np.nan)
+    frame = pd.DataFrame({key: keys[starts], 'Measure': names[starts], 'value': values})
+    frame = frame.pivot(index=key, columns='Measure', values='value')
+    return frame.reindex(columns=list(measures)).rename_axis(columns=None).reset_index()
+
+
+def benchmark(repeat=3, dates=(None, ('2022-03-01', '2022-05-31'), ('2022-07-04', '2022-07-20'))):
+    """Time every engine's Median and P90 against groupby().quantile() on the filtered rows, and measure their errors."""
+    import time
+
+    from cube import MEASURES, AggregateCube
+    from dataset import GROUPS, load_dataset
+    from filters import FilterEngine, FilterState
+    from partitions import PartitionEngine, sync_partitions
+    from wide import WideEngine
+
+    df1, df_, df2, version = load_dataset()
+    sync_partitions()
+    rows = FilterEngine(df2)
+    engines = {'cube': AggregateCube(df2), 'wide': WideEngine(df1), 'partitioned': PartitionEngine()}
+
+    def exact(state, hour, item, key, q):
+        frame = rows.frame(state, hour=hour, item=item)
+        return frame.groupby(frame[key].astype(str))[MEASURES].quantile(q).reset_index()
+
+    queries = []
+    for group, items in GROUPS.items():
+        for date_range in dates:
+            for calendar in ({}, {'month': ['March', 'July']}, {'week': 'Second Week', 'weekday': ['Saturday', 'Sunday']}):
+                start_date, end_date = date_range or (None, None)
+                state = FilterState.from_inputs(group, start_date, end_date, **calendar)
+                queries += [(state, hour, None, 'Items') for hour in engines['cube'].times]
+                queries += [(state, None, item, 'Time') for item in items]
+
+    print(f'{len(queries)} queries per aggregator, the best of {repeat} runs, errors relative to the exact quantile')
+    print(f'{"":<24}{"p50_ms":>10}{"p95_ms":>10}{"max_error":>12}{"mean_error":>12}')
+    for aggregator, q in (('Median', 0.5), ('P90', 0.9)):
+        timings = {name: [] for name in ['groupby', *engines]}
+        errors = {name: [] for name in engines}
+        for state, hour, item, key in queries:
+            for name in timings:
+                best = np.inf
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    if name == 'groupby':
+                        answer = exact(state, hour, item, key, q)
+                    elif key == 'Items':
+                        answer = engines[name].by_item(state, hour, aggregator)
+                    else:
+                        answer = engines[name].by_time(state, item, aggregator)
+                    best = min(best, time.perf_counter() - start)
+                timings[name].append(best * 1000)
+                if name == 'groupby':
+                    expected = answer.set_index(key)[MEASURES]
+                else:
+                    found = answer.set_index(key)[MEASURES].reindex(expected.index).to_numpy(np.float64)
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        error = np.abs(found - expected.to_numpy()) / np.abs(expected.to_numpy())
+                    errors[name].append(error[expected.to_numpy() != 0])
+        for name, samples in timings.items():
+            line = f'{aggregator + " " + name:<24}{np.percentile(samples, 50):>10.2f}{np.percentile(samples, 95):>10.2f}'
+            if name in errors:
+                error = np.concatenate(errors[name])
+                line += f'{np.nanmax(error, initial=0):>12.2e}{np.nanmean(error):>12.2e}'
+            print(line)
+    cache = engines['partitioned'].cache.stats()
+    print(f'partition cache: {cache["partitions"]} entries (frames and sketches), {cache["bytes"] / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    benchmark()
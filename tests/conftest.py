@@ -0,0 +1,64 @@
+#the dashboard's modules sit at the top of the repository, next to app.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from cube import AGGREGATORS
+from dataset import GROUPS
+
+#the filters every engine is checked under: each product group, over the whole data, a range across
+#months and a range inside one, with no calendar filter, months, and a week with weekdays
+DATE_RANGES = [None, ('2022-03-01', '2022-05-31'), ('2022-07-04', '2022-07-20')]
+CALENDARS = [{}, {'month': ['March', 'July']}, {'week': 'Second Week', 'weekday': ['Saturday', 'Sunday']}]
+
+
+@pytest.fixture(scope='session')
+def frames():
+    """(df1, df_, df2) of the workbook, from the dataset cache like the app loads them."""
+    pytest.importorskip('openpyxl')
+    from dataset import load_dataset
+
+    return load_dataset()[:3]
+
+
+@pytest.fixture(scope='session')
+def partitions(frames, tmp_path_factory):
+    """A folder holding the melted frame partitioned on disk, for PartitionEngine."""
+    pytest.importorskip('pyarrow.parquet')
+    from partitions import sync_partitions
+
+    root = str(tmp_path_factory.mktemp('partitions'))
+    sync_partitions(root)
+    return root
+
+
+@pytest.fixture(params=list(GROUPS))
+def group(request):
+    return request.param
+
+
+@pytest.fixture(params=DATE_RANGES, ids=['all-dates', 'march-may', 'july-4-20'])
+def date_range(request):
+    return request.param
+
+
+@pytest.fixture(params=CALENDARS, ids=['no-calendar', 'months', 'week-weekdays'])
+def calendar(request):
+    return request.param
+
+
+@pytest.fixture
+def state(group, date_range, calendar):
+    """The FilterState of a group, a date range and calendar filters, as the dropdowns give them."""
+    from filters import FilterState
+
+    start_date, end_date = date_range or (None, None)
+    return FilterState.from_inputs(group, start_date, end_date, **calendar)
+
+
+@pytest.fixture(params=list(AGGREGATORS))
+def aggregator(request):
+    return request.param
@@ -0,0 +1,31 @@
+import os
+import time
+
+from callback_cache import CallbackCache
+
+
+def _files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.pkl'))
+
+
+def test_get_removes_an_expired_file(tmp_path):
+    cache = CallbackCache(maxsize=4, ttl=60, directory=str(tmp_path))
+    cache.set_version('v1')
+    cache.set('key', 1)
+    (name,) = _files(tmp_path)
+    old = time.time() - 120
+    os.utime(tmp_path / name, (old, old))
+    cache.clear()
+    assert cache.get('key') == (False, None)
+    assert _files(tmp_path) == []
+
+
+def test_the_shared_folder_keeps_at_most_max_files(tmp_path):
+    cache = CallbackCache(maxsize=4, ttl=60, directory=str(tmp_path), max_files=16)
+    cache.set_version('v1')
+    for key in range(100):
+        cache.set(key, key)
+    assert len(_files(tmp_path)) <= 16
+    #the newest result is still shared
+    cache.clear()
+    assert cache.get(99) == (True, 99)
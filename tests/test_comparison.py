@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from comparison import Window, compare
+from conftest import CALENDARS, DATE_RANGES
+from cube import AggregateCube
+from dataset import GROUPS
+from filters import FilterState
+from partitions import PartitionEngine
+from wide import WideEngine
+
+
+@pytest.fixture(scope='module', params=['cube', 'wide', 'partitioned'])
+def engine(request, frames):
+    df1, _, df2 = frames
+    if request.param == 'partitioned':
+        return PartitionEngine(request.getfixturevalue('partitions'))
+    return AggregateCube(df2) if request.param == 'cube' else WideEngine(df1)
+
+
+def test_windows_match_by_time(engine, group, aggregator):
+    """Every window of one by_time_windows pass gets what by_time gives for it alone."""
+    items = GROUPS[group]
+    states = [FilterState.from_inputs(group, *(date_range or (None, None)), **calendar)
+              for date_range in DATE_RANGES for calendar in CALENDARS]
+    #overlapping windows of the group's items, and one of an item from another group
+    windows = [Window(f'window {i}', state, items[i % len(items)]) for i, state in enumerate(states)]
+    windows.append(Window('elsewhere', states[0], 'not an item'))
+    found = compare(engine, windows, aggregator).set_index('Time')
+    for window in windows:
+        expected = engine.by_time(window.state, window.item, aggregator, ['Quantity']).set_index('Time')['Quantity']
+        assert expected.index.isin(found.index).all(), window
+        expected = expected.reindex(found.index).fillna(0)
+        pd.testing.assert_series_equal(expected, found[window.name], check_names=False,
+                                       check_index_type=False, rtol=1e-9)
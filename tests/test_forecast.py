@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from cube import AGGREGATORS
+from filters import FilterEngine
+from forecast import DemandForecast, history_rows
+
+
+@pytest.fixture(scope='module')
+def history(frames):
+    """The rows of the weeks before the workbook's last config.FORECAST_DAYS days."""
+    engine = FilterEngine(frames[2])
+    end = engine.calendar['Date'].iloc[-1] - pd.Timedelta(days=config.FORECAST_DAYS)
+    return history_rows(engine, end), end
+
+
+@pytest.fixture(scope='module')
+def forecast(history):
+    rows, end = history
+    return DemandForecast(rows, end)
+
+
+@pytest.mark.parametrize('aggregator', list(AGGREGATORS))
+def test_every_aggregator_has_hours(forecast, aggregator):
+    assert len(forecast.by_time(forecast.items[0], aggregator)) > 0
+
+
+def test_closed_hours_are_not_forecast(forecast, history):
+    rows, _ = history
+    closed = set(forecast.times) - set(rows.loc[rows['Ticket'].notna(), 'Time'].astype(str))
+    for item in forecast.items:
+        assert closed.isdisjoint(forecast.by_time(item, 'Average')['Time']), item
+
+
+def test_total_is_scaled_to_the_history_days(forecast):
+    mean_day = forecast.by_time(forecast.items[0], 'Average')['Quantity']
+    scaled = forecast.by_time(forecast.items[0], 'Total', history_days=30)['Quantity']
+    assert np.allclose(scaled, mean_day * 30)
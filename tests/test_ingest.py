@@ -0,0 +1,42 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import config
+from dataset import load_dataset, read_manifest
+from ingest import BatchError, ingest
+
+
+def _ingest(path, cache_dir, results):
+    try:
+        results.put(ingest(path, cache_dir=cache_dir))
+    except BatchError:
+        results.put('rejected')
+
+
+def test_concurrent_ingestions_of_the_same_hours_admit_one(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    df1 = load_dataset(config.DATASET_PATH, cache_dir, frames=('df1',))[0]
+    dates = pd.to_datetime(df1['Date'], dayfirst=True)
+    day = df1[dates == dates.max()].copy()
+    day['Date'] = (dates.max() + pd.Timedelta(days=1)).strftime('%d-%m-%Y')
+    #two different files (so two digests) holding the same date and hours
+    paths = []
+    for name, ticket in (('a.csv', 0), ('b.csv', 1)):
+        batch = day.assign(Ticket=day['Ticket'] + ticket)
+        batch.to_csv(tmp_path / name, index=False)
+        paths.append(str(tmp_path / name))
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=_ingest, args=(path, cache_dir, results)) for path in paths]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    outcomes = sorted(str(results.get()) for _ in workers)
+    assert outcomes == sorted([str(len(day)), 'rejected'])
+    assert len(read_manifest(cache_dir)['batches']) == 1
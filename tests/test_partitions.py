@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import config
+from cube import AggregateCube
+from dataset import GROUPS
+from filters import FilterEngine
+from partitions import PartitionEngine
+
+
+@pytest.fixture(scope='module')
+def engines(frames, partitions):
+    """The in-memory FilterEngine and AggregateCube, and the partition engine over the same rows."""
+    df2 = frames[2]
+    return FilterEngine(df2), AggregateCube(df2), PartitionEngine(partitions)
+
+
+def test_calendar_lookups_match(engines):
+    engine, _, partitioned = engines
+    expected, found = engine.calendar_lookup(), partitioned.calendar_lookup()
+    for lookup in (expected, found):
+        for column, codes in lookup['codes'].items():
+            lookup['codes'][column] = [lookup['labels'][column][code] for code in codes]
+        del lookup['labels']
+    assert expected == found
+
+
+@pytest.mark.parametrize('column', ['Time', 'Items'])
+def test_unique_matches_filter_engine(engines, state, column):
+    engine, _, partitioned = engines
+    assert engine.unique(state, column) == partitioned.unique(state, column)
+
+
+def test_aggregates_match_cube(engines, state, aggregator):
+    _, cube, partitioned = engines
+    #the quantiles are sketched, within the sketches' accuracy of the exact ones
+    rtol = config.QUANTILE_SKETCH_ALPHA if aggregator in ('Median', 'P90') else 1e-6
+    pairs = [(cube.by_item(state, hour, aggregator), partitioned.by_item(state, hour, aggregator))
+             for hour in cube.times]
+    pairs += [(cube.by_time(state, item, aggregator), partitioned.by_time(state, item, aggregator))
+              for item in GROUPS[state.group]]
+    for left, right in pairs:
+        pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True),
+                                      check_dtype=False, rtol=rtol)
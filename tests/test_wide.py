@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from cube import MEASURES, aggregator_statistic
+from dataset import DATE_KEY, GROUPS, date_dimension, labelled_rows
+from quantiles import QUANTILES
+from wide import WideEngine
+
+
+@pytest.fixture(scope='module')
+def wide(frames):
+    return WideEngine(frames[0])
+
+
+@pytest.fixture(scope='module')
+def rows(frames):
+    df2 = frames[2]
+    return labelled_rows(df2, date_dimension(df2[DATE_KEY]))
+
+
+def melted_answers(rows, state, keys, aggregator):
+    """Filter the labelled rows of the melted frame and group them by keys, the way the callbacks did before the engines."""
+    rows = rows[rows['Items'].isin(GROUPS[state.group])]
+    if state.start_date is not None:
+        rows = rows[rows['Date'] >= pd.Timestamp(state.start_date)]
+    if state.end_date is not None:
+        rows = rows[rows['Date'] <= pd.Timestamp(state.end_date)]
+    for values, column in ((state.months, 'Month'), (state.weeks, 'Month Weeks'), (state.weekdays, 'Week Days')):
+        if values is not None:
+            rows = rows[rows[column].isin(values)]
+    grouped = rows.groupby(keys)[MEASURES]
+    statistic = aggregator_statistic(aggregator)
+    if statistic in QUANTILES:
+        return grouped.quantile(QUANTILES[statistic])
+    return grouped.agg(statistic)
+
+
+def assert_answers(expected, found, outer, value):
+    #expected is grouped by (outer, key), found is the engine's answer for outer == value
+    key = found.columns[0]
+    found = found.assign(**{key: found[key].astype(str)})
+    if value in expected.index.get_level_values(0):
+        expected = expected.xs(value, level=0).reset_index()
+        pd.testing.assert_frame_equal(expected, found.reset_index(drop=True), check_dtype=False,
+                                      check_names=False, rtol=1e-9)
+    else:
+        assert found.empty, (outer, value)
+
+
+def test_by_item_matches_groupby(wide, rows, state, aggregator):
+    expected = melted_answers(rows, state, ['Time', 'Items'], aggregator)
+    for hour in wide.times:
+        assert_answers(expected, wide.by_item(state, hour, aggregator), 'Time', str(hour))
+
+
+def test_by_time_matches_groupby(wide, rows, state, aggregator):
+    expected = melted_answers(rows, state, ['Items', 'Time'], aggregator)
+    for item in GROUPS[state.group]:
+        assert_answers(expected, wide.by_time(state, item, aggregator), 'Items', item)
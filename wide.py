@@ -0,0 +1,191 @@
+#aggregation engine that works on the workbook's own layout instead of the melted frame
+#df1 is a dense (date, hour) x item matrix. Melting it repeats every row once per item and the
+#callbacks then throw most of those rows away as NaN, so this engine keeps the item quantities
+#as one 2-D NumPy block (rows = date-hour, columns = items) next to the per-row Ticket, Sales and
+#AVS Per Hour, and answers the same queries as cube.AggregateCube with column reductions over the
+#selected rows, and Median and P90 with the cells' values sorted once along the dates like the cube.
+#Select it with QSR_AGGREGATION_ENGINE=wide; tests/test_wide.py checks it against groupby on the melted frame
+import copy
+
+import numpy as np
+import pandas as pd
+
+from cube import MEASURES, _empty, _finish, aggregator_statistic
+from dataset import GROUPS, date_dimension, date_keys
+from filters import date_mask, key_mask
+import metrics
+from quantiles import QUANTILES, SortedCells
+
+
+class WideEngine:
+    """Item quantities as a (date-hour, item) block, built from the wide frame without melting it."""
+
+    def __init__(self, df1, groups=GROUPS):
+        self.groups = groups
+        #the date of every row, and the dimension its calendar filters are resolved on
+        self._date_keys = date_keys(pd.to_datetime(df1['Date'], dayfirst=True))
+        self.calendar = date_dimension(self._date_keys)
+        self._hours = df1['Time'].to_numpy()
+
+        #item columns sorted the way the groupbys sort them
+        self.items = sorted(column for column in df1.columns if column not in ('Date', 'Time', 'Ticket', 'Sales'))
+        self._item_index = {item: i for i, item in enumerate(self.items)}
+        self.block = df1[self.items].to_numpy(np.float64)
+        #item -> group column mapping
+        self.item_group = np.array([
+            next((name for name, members in groups.items() if item in members), '')
+            for item in self.items
+        ])
+        ticket = df1['Ticket'].to_numpy(np.float64)
+        sales = df1['Sales'].to_numpy(np.float64)
+        self.hourly = {'Ticket': ticket, 'Sales': sales, 'AVS Per Hour': sales / ticket}
+        #the hours in the order the groupby reports them
+        self.times = sorted(pd.unique(self._hours))
+        self._sort_cells()
+
+    def _sort_cells(self):
+        self.sorted = self._sorted_cells(self.times)
+
+    def _sorted_cells(self, times):
+        #the values of every (item, hour) cell and of every hour sorted along the dates, for the quantiles
+        dates = np.searchsorted(self.calendar.index, self._date_keys)
+        hours = np.searchsorted(times, self._hours)
+        n_items, n_times, n_dates = len(self.items), len(times), len(self.calendar)
+        cells = (np.arange(n_items)[None, :] * n_times + hours[:, None]).ravel()
+        sorted_cells = {'Quantity': SortedCells(cells, np.repeat(dates, n_items), self.block.ravel(),
+                                                (n_items, n_times), n_dates)}
+        for measure, values in self.hourly.items():
+            sorted_cells[measure] = SortedCells(hours, dates, values, (n_times,), n_dates)
+        return sorted_cells
+
+    def extended(self, df1):
+        """Return an engine over df1, whose first rows are the ones held here, reading only the rows after them."""
+        new = df1.iloc[len(self._date_keys):]
+        if not len(new):
+            return self
+        part = WideEngine(new, self.groups)
+        if part.items != self.items:
+            return WideEngine(df1, self.groups)
+        engine = copy.copy(self)
+        for name in ('_date_keys', '_hours', 'block'):
+            setattr(engine, name, np.concatenate([getattr(self, name), getattr(part, name)]))
+        engine.calendar = date_dimension(np.concatenate([self.calendar.index, part.calendar.index]))
+        engine.hourly = {measure: np.concatenate([values, part.hourly[measure]])
+                         for measure, values in self.hourly.items()}
+        engine.times = sorted(set(self.times) | set(part.times))
+        if engine.times == self.times and part.calendar.index[0] > self.calendar.index[-1]:
+            #new dates at hours held here: the batch's sorted values are merged into the cells
+            batch = part.sorted if part.times == self.times else part._sorted_cells(self.times)
+            engine.sorted = {measure: cells.concat(batch[measure]) for measure, cells in self.sorted.items()}
+        else:
+            engine._sort_cells()
+        return engine
+
+    @metrics.phase('filter')
+    def row_mask(self, state):
+        """Return which date-hour rows pass the date range and calendar filters of a FilterState."""
+        return key_mask(self.calendar, state, self._date_keys)
+
+    def group_items(self, group):
+        return np.flatnonzero(self.item_group == group)
+
+    @staticmethod
+    def _reduce(values, statistic):
+        """Reduce the first axis of values the way a groupby reduces each group, skipping NaN."""
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        total = np.where(valid, values, 0).sum(axis=0)
+        low = np.where(valid, values, np.inf).min(axis=0, initial=np.inf)
+        high = np.where(valid, values, -np.inf).max(axis=0, initial=-np.inf)
+        return _finish(statistic, count, total, low, high)
+
+    @staticmethod
+    def _reduce_by(values, codes, size, statistic):
+        """Reduce values per code (the hour of each row), skipping NaN."""
+        valid = ~np.isnan(values)
+        codes, values = codes[valid], values[valid]
+        count = np.bincount(codes, minlength=size)
+        total = np.bincount(codes, weights=values, minlength=size)
+        low = np.full(size, np.inf)
+        np.minimum.at(low, codes, values)
+        high = np.full(size, -np.inf)
+        np.maximum.at(high, codes, values)
+        return _finish(statistic, count, total, low, high)
+
+    @metrics.phase('group')
+    def by_item(self, state, hour, aggregator):
+        """Aggregate the group's items at one hour, like groupby('Items') on the filtered rows."""
+        statistic = aggregator_statistic(aggregator)
+        rows = np.flatnonzero(self.row_mask(state) & (self._hours == hour))
+        items = self.group_items(state.group)
+        if not len(rows) or not len(items):
+            return _empty('Items', MEASURES)
+        frame = pd.DataFrame({'Items': [self.items[i] for i in items]})
+        if statistic in QUANTILES:
+            t = self.times.index(hour)
+            return self._quantiles(frame, state, statistic, (items, t), (t,))
+        frame['Quantity'] = self._reduce(self.block[np.ix_(rows, items)], statistic)
+        for measure, values in self.hourly.items():
+            #the hour's value is the same for every item
+            frame[measure] = self._reduce(values[rows], statistic)
+        return frame
+
+    @metrics.phase('group')
+    def by_time(self, state, item, aggregator, measures=MEASURES):
+        """Aggregate one item at every hour, like groupby('Time') on the filtered rows."""
+        statistic = aggregator_statistic(aggregator)
+        rows = np.flatnonzero(self.row_mask(state))
+        in_group = item in self._item_index and self.item_group[self._item_index[item]] == state.group
+        if not in_group or not len(rows):
+            return _empty('Time', measures)
+        #position of each selected row's hour in the sorted hours
+        codes = np.searchsorted(self.times, self._hours[rows])
+        present = np.bincount(codes, minlength=len(self.times)) > 0
+        frame = pd.DataFrame({'Time': [time for time, found in zip(self.times, present) if found]})
+        if statistic in QUANTILES:
+            times = np.flatnonzero(present)
+            return self._quantiles(frame, state, statistic, (self._item_index[item], times), (times,), measures)
+        for measure in measures:
+            if measure == 'Quantity':
+                values = self.block[rows, self._item_index[item]]
+            else:
+                values = self.hourly[measure][rows]
+            frame[measure] = self._reduce_by(values, codes, len(self.times), statistic)[present]
+        return frame
+
+    def _quantiles(self, frame, state, statistic, cells, hours, measures=MEASURES):
+        #the measures' quantiles over the dates state keeps, of the item cells and the hours given
+        mask = date_mask(self.calendar, state)
+        for measure in measures:
+            frame[measure] = self.sorted[measure].quantile(mask, cells if measure == 'Quantity' else hours,
+                                                           QUANTILES[statistic])
+        return frame
+
+    @metrics.phase('group')
+    def by_time_windows(self, windows, aggregator):
+        """Aggregate the quantity of several (FilterState, item) windows at every hour in one pass, like AggregateCube's."""
+        statistic = aggregator_statistic(aggregator)
+        masks = np.array([
+            self.row_mask(state) & (item in self._item_index
+                                    and self.item_group[self._item_index[item]] == state.group)
+            for state, item in windows
+        ]).reshape(len(windows), len(self._date_keys))
+        items = np.array([self._item_index.get(item, 0) for _, item in windows], dtype=np.int64)
+        #every selected row labelled with its window, a row in two windows is taken twice
+        window, rows = np.nonzero(masks)
+        size = len(windows) * len(self.times)
+        codes = window * len(self.times) + np.searchsorted(self.times, self._hours[rows])
+        present = (np.bincount(codes, minlength=size) > 0).reshape(len(windows), len(self.times))
+        if statistic in QUANTILES:
+            dates = np.array([
+                date_mask(self.calendar, state) & (item in self._item_index
+                                                   and self.item_group[self._item_index[item]] == state.group)
+                for state, item in windows
+            ]).reshape(len(windows), len(self.calendar))
+            values = self.sorted['Quantity'].windows_quantile(
+                dates, (items[:, None], np.arange(len(self.times))[None, :]), QUANTILES[statistic])
+        else:
+            values = self._reduce_by(self.block[rows, items[window]], codes, size, statistic)
+            values = values.reshape(len(windows), len(self.times))
+        times = np.flatnonzero(present.any(axis=0))
+        return [self.times[t] for t in times], np.where(present, values, np.nan)[:, times]